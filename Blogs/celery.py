@@ -3,6 +3,9 @@ from celery import Celery
 
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "Blogs.settings")
+# prometheus_client writes to it as soon as posts.metrics is imported
+if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+    os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
 
 app = Celery("Blogs")
 app.config_from_object("django.conf:settings", namespace="CELERY")
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import copy
 from datetime import timedelta
 from pathlib import Path
 import os
@@ -29,9 +30,9 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = 'django-insecure-at0nw$4(u8@%iqu-+^#s+tpsny(0wew2b0!(9sjn#^j4*2k0u&'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = env('DEBUG', cast=bool, default=True)
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = env.list('ALLOWED_HOSTS', default=[])
 
 
 # Application definition
@@ -43,6 +44,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'authentication.apps.AuthenticationConfig',
     'posts.apps.PostsConfig',
     'rest_framework',
@@ -56,14 +58,17 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'posts.middleware.PrometheusMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'posts.replicas.ReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'silk.middleware.SilkyMiddleware',
+    'posts.profiling.ProfilingMiddleware',
+    'posts.middleware.QueryCountMiddleware',
 ]
 
 ROOT_URLCONF = 'Blogs.urls'
@@ -98,8 +103,72 @@ DATABASES = {
         'PASSWORD': 'postgres',
         'HOST': 'postgres',
         'PORT': 5432,
+        # Pooled and persistent connections are checked before reuse
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'connect_timeout': env('DB_CONNECT_TIMEOUT', cast=int, default=5),  # Seconds
+        },
     }
 }
+# How connections are reused, DB_CONNECTION_MODE:
+#   pool        a psycopg connection pool per process; for the web workers
+#   persistent  one connection per thread, kept for DB_CONN_MAX_AGE seconds;
+#               for Celery's prefork children, as pools don't survive fork
+#   pgbouncer   persistent connections to PgBouncer in transaction mode,
+#               which can't keep server-side cursors open
+# Each web worker holds up to DB_POOL_MAX_SIZE connections and each Celery
+# child one, so Postgres' max_connections must cover
+# WEB_CONCURRENCY * DB_POOL_MAX_SIZE + CELERY_WORKER_CONCURRENCY.
+DB_CONNECTION_MODE = env('DB_CONNECTION_MODE', default='pool')
+if DB_CONNECTION_MODE == 'pool':
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': env('DB_POOL_MIN_SIZE', cast=int, default=2),
+        'max_size': env('DB_POOL_MAX_SIZE', cast=int, default=10),
+        # Seconds a request waits for a free connection before failing
+        'timeout': env('DB_POOL_TIMEOUT', cast=float, default=10),
+        # Seconds before idle connections above min_size are closed
+        'max_idle': env('DB_POOL_MAX_IDLE', cast=float, default=300),
+        'max_lifetime': env('DB_POOL_MAX_LIFETIME', cast=float, default=3600),
+    }
+elif DB_CONNECTION_MODE in ('persistent', 'pgbouncer'):
+    DATABASES['default']['CONN_MAX_AGE'] = env('DB_CONN_MAX_AGE', cast=int, default=600)  # Seconds
+    DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = DB_CONNECTION_MODE == 'pgbouncer'
+# Profiles go to their own database when one is given, see
+# posts.profiling.ProfilingRouter. Create its tables with
+# `manage.py migrate --database profiling`.
+if env('PROFILING_DATABASE_URL', default=''):
+    DATABASES['profiling'] = env.db_url('PROFILING_DATABASE_URL')
+# Read replicas, DATABASE_REPLICA_URLS: safe requests read from any of
+# them within REPLICA_MAX_LAG seconds of the primary, see posts.replicas.
+# They share the primary's connection settings.
+DATABASE_REPLICAS = []
+for number, url in enumerate(env.list('DATABASE_REPLICA_URLS', default=[]), start=1):
+    alias = f'replica_{number}'
+    DATABASES[alias] = copy.deepcopy(DATABASES['default'])
+    DATABASES[alias].update({
+        key: value for key, value in Env.db_url_config(url).items()
+        if key in ('NAME', 'USER', 'PASSWORD', 'HOST', 'PORT')
+    })
+    # Tests read the rows they write through the primary
+    DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+    DATABASE_REPLICAS.append(alias)
+REPLICA_MAX_LAG = env('REPLICA_MAX_LAG', cast=float, default=5)  # Seconds
+REPLICA_LAG_CHECK_INTERVAL = env('REPLICA_LAG_CHECK_INTERVAL', cast=float, default=5)  # Seconds
+# A replica whose WAL receiver hasn't heard from the primary for this long
+# counts as disconnected; keep it above the primary's wal_sender_timeout / 2,
+# the longest an idle primary waits between keepalives
+REPLICA_RECEIVER_TIMEOUT = env('REPLICA_RECEIVER_TIMEOUT', cast=float, default=60)  # Seconds
+# Users read from the primary for this long after a write
+REPLICA_PIN_SECONDS = env('REPLICA_PIN_SECONDS', cast=int, default=10)  # Seconds
+# Longest a response built from a replica stays in the response cache
+REPLICA_CACHE_TIMEOUT = env('REPLICA_CACHE_TIMEOUT', cast=int, default=30)  # Seconds
+DATABASE_ROUTERS = ['posts.profiling.ProfilingRouter', 'posts.replicas.ReplicaRouter']
+# Monthly partitioning of posts and comments on created_on, see
+# posts.partitioning. Applied by the posts migrations when on; an already
+# migrated database is converted with `manage.py create_partitions --convert`.
+POSTS_PARTITIONING = env('POSTS_PARTITIONING', cast=bool, default=False)
+# Months of partitions kept ready beyond the current one
+PARTITION_MONTHS_AHEAD = env('PARTITION_MONTHS_AHEAD', cast=int, default=3)
 
 
 # Password validation
@@ -173,12 +242,55 @@ SPECTACULAR_SETTINGS = {
     },
 }
 
-SILKY_PYTHON_PROFILER = True
+# Silk records only sampled requests, see posts.profiling.should_profile().
+# Requests matching PROFILING_PATHS or PROFILING_USERS, or sending
+# PROFILING_TOKEN in an X-Profile header, are always recorded.
+PROFILING_SAMPLE_RATE = env('PROFILING_SAMPLE_RATE', cast=float, default=0.01)
+PROFILING_PATHS = env.list('PROFILING_PATHS', default=[])
+PROFILING_USERS = env.list('PROFILING_USERS', default=[])
+PROFILING_TOKEN = env('PROFILING_TOKEN', default='')
+
+
+def _should_profile(request):
+    from posts.profiling import should_profile
+
+    return should_profile(request)
+
+
+SILKY_INTERCEPT_FUNC = _should_profile
+# Wraps silk.middleware.SilkyMiddleware so async views stay off threads
+SILKY_MIDDLEWARE_CLASS = 'posts.profiling.ProfilingMiddleware'
+SILKY_PYTHON_PROFILER = env('SILKY_PYTHON_PROFILER', cast=bool, default=True)
+# Silk trims its tables back to this many requests, oldest first
+SILKY_MAX_RECORDED_REQUESTS = env('SILKY_MAX_RECORDED_REQUESTS', cast=int, default=5000)
+SILKY_MAX_RECORDED_REQUESTS_CHECK_PERCENT = 10
+
+# Adds X-Query-Count to every response, for manage.py loadtest
+QUERY_COUNT_HEADER = env('QUERY_COUNT_HEADER', cast=bool, default=False)
+
+# Prometheus metrics are served at /metrics (see posts.metrics). Under
+# gunicorn/uvicorn set PROMETHEUS_MULTIPROC_DIR to aggregate the workers.
+METRICS_CELERY_QUEUES = env.list('METRICS_CELERY_QUEUES', default=['celery'])
+# Port Celery workers serve their task metrics on; 0 disables it. Set
+# PROMETHEUS_MULTIPROC_DIR too, or the pool processes' samples are missed.
+CELERY_METRICS_PORT = env('CELERY_METRICS_PORT', cast=int, default=0)
 
 
 CELERY_BROKER_URL = "redis://localhost:6379"
 CELERY_RESULT_BACKEND = "django-db"
 CLERY_BROKER_CONNECTION_RETRY_ON_STARTUP = True
+# Prefork children per worker; each holds one database connection
+CELERY_WORKER_CONCURRENCY = env('CELERY_WORKER_CONCURRENCY', cast=int, default=4)
+CELERY_BEAT_SCHEDULE = {
+    'reconcile-comment-counters': {
+        'task': 'reconcile_comment_counters',
+        'schedule': env('COMMENT_COUNTER_RECONCILE_INTERVAL', cast=int, default=3600),  # Seconds
+    },
+    'create-partitions': {
+        'task': 'create_partitions',
+        'schedule': 24 * 3600,  # Seconds
+    },
+}
 
 
 EMAIL_BACKEND = env('EMAIL_BACKEND', default="your_default_email_backend")
@@ -199,4 +311,36 @@ ELASTICSEARCH_DSL = {
 
 ELASTICSEARCH_INDEX_NAMES = {
     'posts.post': 'posts',
-}
\ No newline at end of file
+}
+
+# Search indexing runs through posts.indexing and the flush_search_index
+# Celery task instead of django-elasticsearch-dsl's synchronous signals.
+ELASTICSEARCH_DSL_AUTOSYNC = False
+# Serve /post-search from Postgres full-text search while Elasticsearch is
+# down or SEARCH_MAX_INDEX_LAG seconds behind.
+SEARCH_FALLBACK_ENABLED = env('SEARCH_FALLBACK_ENABLED', cast=bool, default=True)
+SEARCH_HEALTH_CHECK_INTERVAL = env('SEARCH_HEALTH_CHECK_INTERVAL', cast=int, default=10)  # Seconds
+SEARCH_MAX_INDEX_LAG = env('SEARCH_MAX_INDEX_LAG', cast=int, default=300)  # Seconds
+
+REDIS_URL = env('REDIS_URL', default=CELERY_BROKER_URL)
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+        'KEY_PREFIX': 'blog',
+        'OPTIONS': {
+            'socket_connect_timeout': 1,
+            'socket_timeout': 1,
+        },
+    }
+}
+
+FEED_CACHE_TIMEOUT = env('FEED_CACHE_TIMEOUT', cast=int, default=300)  # Seconds
+FRAGMENT_CACHE_TIMEOUT = env('FRAGMENT_CACHE_TIMEOUT', cast=int, default=3600)  # Seconds
+LOOKUP_CACHE_MAX_ENTRIES = env('LOOKUP_CACHE_MAX_ENTRIES', cast=int, default=10000)  # Per lookup, per process
+LOOKUP_CACHE_LOCAL_TIMEOUT = env('LOOKUP_CACHE_LOCAL_TIMEOUT', cast=int, default=60)  # Seconds
+LOOKUP_CACHE_TIMEOUT = env('LOOKUP_CACHE_TIMEOUT', cast=int, default=3600)  # Seconds
+
+SEARCH_INDEX_BATCH_SIZE = env('SEARCH_INDEX_BATCH_SIZE', cast=int, default=500)
+SEARCH_INDEX_FLUSH_DELAY = env('SEARCH_INDEX_FLUSH_DELAY', cast=int, default=2)  # Seconds to coalesce saves
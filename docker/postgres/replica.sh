@@ -0,0 +1,18 @@
+#!/bin/sh
+# Starts a hot standby of the postgres service. The first start clones the
+# primary with pg_basebackup; -R writes the settings to keep following it.
+set -e
+
+if [ ! -s "$PGDATA/PG_VERSION" ]; then
+    until pg_isready --host postgres --port 5432; do
+        sleep 1
+    done
+    rm -rf "$PGDATA"/*
+    PGPASSWORD="$REPLICATION_PASSWORD" pg_basebackup \
+        --host postgres --username replicator --pgdata "$PGDATA" \
+        --wal-method stream --write-recovery-conf --progress
+    chmod 0700 "$PGDATA"
+    chown -R postgres:postgres "$PGDATA"
+fi
+
+exec docker-entrypoint.sh postgres -c hot_standby=on
@@ -1,6 +1,7 @@
 #!/bin/sh
-
-python manage.py makemigrations
-python manage.py migrate
-python manage.py search_index --rebuild
-python manage.py runserver 0.0.0.0:8000
+# Serves the app; migrations and index builds run in release.sh.
+# DJANGO_DEVSERVER=1 runs the autoreloading development server instead.
+if [ -n "$DJANGO_DEVSERVER" ]; then
+    exec python manage.py runserver 0.0.0.0:8000
+fi
+exec gunicorn -c gunicorn.conf.py
@@ -0,0 +1,64 @@
+"""
+gunicorn settings for production: ``gunicorn -c gunicorn.conf.py``.
+
+Every setting can be overridden from the environment. The default worker
+runs Blogs/asgi.py under uvicorn; GUNICORN_WORKER_CLASS=gthread serves
+Blogs/wsgi.py with GUNICORN_THREADS threads per worker instead. Send
+SIGHUP to the master for a graceful reload: new workers are started with
+the new code and the old ones finish their requests first.
+"""
+import multiprocessing
+import os
+import shutil
+
+UVICORN_WORKER = 'uvicorn_worker.UvicornWorker'
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', UVICORN_WORKER)
+wsgi_app = 'Blogs.asgi:application' if worker_class == UVICORN_WORKER else 'Blogs.wsgi:application'
+# gunicorn itself reads WEB_CONCURRENCY too; the default suits CPU-bound
+# Django views, raise it for I/O-heavy workloads.
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+# Only used by the gthread worker; uvicorn workers run one event loop
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+
+# Seconds an idle client connection is kept open. Behind a load balancer
+# this must exceed the balancer's idle timeout.
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+# Restart a worker after this many requests (plus up to the jitter, so the
+# workers don't all restart together), capping slow memory growth.
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 100))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+# Seconds workers get to finish in-flight requests on reload or shutdown
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+# Import the app once in the master so workers fork with it loaded and
+# start faster; reloads then need a full restart to pick up new code.
+preload_app = os.environ.get('GUNICORN_PRELOAD', '').lower() in ('1', 'true', 'yes')
+
+# Set GUNICORN_ACCESS_LOG to an empty string to turn the access log off
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-') or None
+errorlog = '-'
+
+
+def on_starting(server):
+    """
+    Start with an empty Prometheus multi-process directory so samples of
+    a previous run aren't aggregated into the new one.
+    """
+    directory = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if directory:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+
+
+def child_exit(server, worker):
+    """
+    Drop the live gauge samples of a worker that exited, so /metrics stops
+    counting its in-flight requests and connections. The only copy of this
+    hook; posts.metrics reads the directory it maintains.
+    """
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
@@ -1,8 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 class PostsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'posts'
 
     def ready(self):
+        import posts.metrics
         import posts.signals
+        from posts.checks import create_trigram_index
+
+        post_migrate.connect(create_trigram_index, sender=self)
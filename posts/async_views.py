@@ -0,0 +1,264 @@
+"""
+Async versions of the hot read endpoints, served under /api/v3/.
+
+DRF views are sync, so under ASGI each request holds a thread for as long
+as it runs. These are Django async views: the database is read with the
+async ORM, Elasticsearch through AsyncElasticsearch, and only the
+serializers run in a thread, so a worker can keep many slow clients
+waiting at once. Responses match the sync views' keyset-paginated
+(``?pagination=cursor``) output and use the same response cache.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponseNotModified, JsonResponse
+from django.views import View
+from rest_framework.exceptions import APIException, AuthenticationFailed, NotAuthenticated, NotFound, ValidationError
+from rest_framework.request import Request
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+from authentication.models import User
+from posts.caching import POSTS, USERS, ResponseCacheMixin, etag_matches
+from posts.documents import PostDocument
+from posts.indexing import asearch_backend_healthy, get_async_elasticsearch
+from posts.metrics import SEARCH_SECONDS
+from posts.models import Comment, Post
+from posts.pagination import KeysetCursorPagination, SearchRankCursorPagination
+from posts.replicas import is_pinned_request, response_cache_timeout
+from posts.serializers import (
+    CommentSerializer, HomePostSerializer, PostDocumentFallbackSerializer, PostSearchSerializer, PostSerializer,
+)
+from posts.views import document_category_ids, feed_cache_generations
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+async def aauthenticate(request):
+    """
+    The user of the request's JWT, read with the async ORM. Raises
+    NotAuthenticated without a token and AuthenticationFailed for a bad one.
+    """
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    raw_token = authentication.get_raw_token(header) if header else None
+    if raw_token is None:
+        raise NotAuthenticated()
+    try:
+        token = authentication.get_validated_token(raw_token)
+    except (InvalidToken, TokenError) as e:
+        raise AuthenticationFailed(str(e))
+    try:
+        user = await User.objects.aget(**{api_settings.USER_ID_FIELD: token[api_settings.USER_ID_CLAIM]})
+    except (KeyError, User.DoesNotExist):
+        raise AuthenticationFailed("User not found")
+    if not user.is_active:
+        raise AuthenticationFailed("User is inactive")
+    return user
+
+
+class AsyncReadView(View):
+    """
+    Base of the async GET endpoints. Subclasses implement ``get_data()``;
+    setting ``cache_query_params`` caches the response like
+    ResponseCacheMixin does for the sync views.
+    """
+    http_method_names = ['get', 'head', 'options']
+    authentication_required = False
+    cache_query_params = None
+    get_cache_generations = ResponseCacheMixin.get_cache_generations
+    get_response_cache_key = ResponseCacheMixin.get_response_cache_key
+
+    async def get(self, request, **kwargs):
+        request = Request(request)
+        try:
+            if self.authentication_required:
+                request.user = await aauthenticate(request)
+            if self.cache_query_params is None:
+                return self.render(await self.get_data(request, **kwargs))
+            return await self.get_cached(request, **kwargs)
+        except APIException as e:
+            data = e.detail if isinstance(e.detail, (dict, list)) else {'detail': e.detail}
+            response = self.render(data, status=e.status_code)
+            if isinstance(e, (NotAuthenticated, AuthenticationFailed)):
+                response['WWW-Authenticate'] = 'Bearer realm="api"'
+            return response
+
+    async def get_cached(self, request, **kwargs):
+        try:
+            key = await sync_to_async(self.get_response_cache_key)(request)
+            cached = await cache.aget(key)
+        except Exception as e:
+            # The cache is an optimisation; serve uncached if it's down
+            logger.error(f"Response cache unavailable: {e}")
+            return self.render(await self.get_data(request, **kwargs))
+
+        etag = f'"{key.split(":")[1]}"'
+        pinned = is_pinned_request(request)
+        if etag_matches(etag, request.headers.get('If-None-Match')) and not pinned:
+            response = HttpResponseNotModified()
+        elif cached is not None and not pinned:
+            response = self.render(cached)
+        else:
+            data = await self.get_data(request, **kwargs)
+            try:
+                await cache.aset(key, data, response_cache_timeout(settings.FEED_CACHE_TIMEOUT))
+            except Exception as e:
+                logger.error(f"Failed to cache response: {e}")
+            response = self.render(data)
+        response['ETag'] = etag
+        return response
+
+    async def get_data(self, request, **kwargs):
+        raise NotImplementedError
+
+    def render(self, data, status=200):
+        return JsonResponse(data, status=status, encoder=JSONEncoder, safe=False)
+
+    async def serialize(self, serializer_class, instance, request, many=False):
+        # Serializers are sync and may read the lookup caches
+        serializer = serializer_class(instance, many=many, context={'request': request, 'view': self})
+        return await sync_to_async(lambda: serializer.data)()
+
+    async def paginate(self, queryset, request, serializer_class, pagination_class=KeysetCursorPagination):
+        paginator = pagination_class()
+        page = await paginator.apaginate_queryset(queryset, request, view=self)
+        data = await self.serialize(serializer_class, page, request, many=True)
+        return paginator.get_paginated_response(data).data
+
+
+class AsyncPostsListView(AsyncReadView):
+    """
+    The feed, optionally of one ``?author=``.
+    """
+    cache_query_params = ('author', 'page_size', 'cursor')
+
+    def get_cache_generations(self, request):
+        return feed_cache_generations(request)
+
+    async def get_data(self, request, **kwargs):
+        queryset = Post.objects.for_feed()
+        author_username = request.query_params.get('author')
+        if author_username:
+            queryset = queryset.by_author(author_username)
+            if not await queryset.aexists():
+                raise NotFound(f"No posts found for author {author_username}")
+        return await self.paginate(queryset, request, HomePostSerializer)
+
+
+class AsyncPostDetailView(AsyncReadView):
+    """
+    A post with its categories and most recent comments.
+    """
+    authentication_required = True
+
+    async def get_data(self, request, post_id):
+        try:
+            post = await Post.objects.for_detail().aget(id=post_id)
+        except Post.DoesNotExist:
+            raise NotFound("No Post matches the given query.")
+        return await self.serialize(PostSerializer, post, request)
+
+
+class AsyncPostCommentListView(AsyncReadView):
+    """
+    A post's comments, newest first.
+    """
+    authentication_required = True
+
+    async def get_data(self, request, post_id):
+        try:
+            post = await Post.objects.only('created_on').aget(pk=post_id)
+        except Post.DoesNotExist:
+            raise NotFound("No Post matches the given query.")
+        return await self.paginate(Comment.objects.of_post(post), request, CommentSerializer)
+
+
+class AsyncPostSearchView(AsyncReadView):
+    """
+    Search post titles with ``?search=`` and filter with ``?categories=``
+    (or ``?categories__in=``) ids in Elasticsearch, paged with ``?page=``. Like PostDocumentView, it
+    answers from Postgres with the same filters and fields while
+    Elasticsearch is unhealthy.
+    """
+    page_size = 10
+    max_page_size = 100
+
+    async def get(self, request, **kwargs):
+        self.from_database = settings.SEARCH_FALLBACK_ENABLED and not await asearch_backend_healthy()
+        response = await super().get(request, **kwargs)
+        if self.from_database:
+            response['X-Search-Backend'] = 'postgres'
+        return response
+
+    async def get_data(self, request, **kwargs):
+        params = request.query_params
+        try:
+            page = max(int(params.get('page', 1)), 1)
+            page_size = min(max(int(params.get('page_size', self.page_size)), 1), self.max_page_size)
+        except ValueError:
+            raise ValidationError("page and page_size must be integers.")
+        categories = document_category_ids(params)
+
+        text = params.get('search', '').strip()
+        if self.from_database:
+            count, results = await self.search_database(request, text, categories, page, page_size)
+        else:
+            count, results = await self.search_elasticsearch(text, categories, page, page_size)
+
+        url = request.build_absolute_uri()
+        return {
+            'count': count,
+            'next': replace_query_param(url, 'page', page + 1) if page * page_size < count else None,
+            'previous': (
+                None if page == 1 else
+                remove_query_param(url, 'page') if page == 2 else replace_query_param(url, 'page', page - 1)
+            ),
+            'results': results,
+        }
+
+    async def search_elasticsearch(self, text, categories, page, page_size):
+        query = {
+            'bool': {
+                'must': [{'match': {'title': text}}] if text else [{'match_all': {}}],
+                # Any of the categories, like PostDocumentView's filter backend
+                'filter': [{'terms': {'categories.id': categories}}] if categories else [],
+            }
+        }
+        with SEARCH_SECONDS.labels('search').time():
+            result = await get_async_elasticsearch().search(
+                index=PostDocument._index._name,
+                body={'query': query, 'from': (page - 1) * page_size, 'size': page_size},
+            )
+        return result['hits']['total']['value'], [
+            {'title': hit['_source'].get('title'), 'categories': hit['_source'].get('categories', [])}
+            for hit in result['hits']['hits']
+        ]
+
+    async def search_database(self, request, text, categories, page, page_size):
+        queryset = Post.objects.search_documents(text, categories)
+        posts = [post async for post in queryset[(page - 1) * page_size:page * page_size]]
+        results = await self.serialize(PostDocumentFallbackSerializer, posts, request, many=True)
+        return await queryset.acount(), results
+
+
+class AsyncPostTextSearchView(AsyncReadView):
+    """
+    Postgres full-text search, most relevant first.
+    """
+    cache_query_params = ('search', 'page_size', 'cursor')
+
+    def get_cache_generations(self, request):
+        return [POSTS, USERS]
+
+    async def get_data(self, request, **kwargs):
+        text = request.query_params.get('search', '').strip()
+        if not text:
+            raise ValidationError({'search': 'This query parameter is required.'})
+        return await self.paginate(
+            Post.objects.for_feed().search(text), request, PostSearchSerializer,
+            pagination_class=SearchRankCursorPagination,
+        )
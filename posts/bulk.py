@@ -0,0 +1,111 @@
+import json
+from django.db import transaction
+from authentication.models import User
+from posts.caching import POSTS, USERS, invalidate
+from posts.indexing import chunked, enqueue_posts
+from posts.models import Category, Post
+from posts.partitioning import is_partitioned, list_partitions, month_start
+from posts.serializers import PostImportSerializer
+
+# Number of NDJSON rows validated and inserted per transaction.
+IMPORT_BATCH_SIZE = 1000
+
+
+def import_posts(lines, author=None, default_author=None, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Import posts from NDJSON lines.
+
+    Every row is validated on its own and bad rows are reported with their
+    line number instead of aborting the import. Valid rows are written per
+    batch with one bulk_create for the posts and one for the category links.
+    bulk_create does not send post_save, so the new posts are queued for
+    indexing once at the end; Elasticsearch is never called from here.
+
+    ``author`` forces the author of every row (the API uses the requesting
+    user); otherwise a row's ``author`` username is used, falling back to
+    ``default_author``. Rows keep their ``created_on`` and ``updated_on``;
+    with partitioning on, the month of ``created_on`` must have a partition.
+    """
+    report = {'created': 0, 'failed': 0, 'errors': []}
+    created_ids = []
+    months = {month for _, month in list_partitions('posts_post')} if is_partitioned('posts_post') else None
+
+    for batch in chunked(enumerate(lines, start=1), batch_size):
+        created_ids += _import_batch(batch, author, default_author, months, report)
+
+    report['created'] = len(created_ids)
+    report['failed'] = len(report['errors'])
+    if created_ids:
+        # bulk_create sends no post_save, so expire cached feeds here
+        invalidate(POSTS, USERS)
+    enqueue_posts(created_ids)
+    return report
+
+
+def _import_batch(batch, author, default_author, months, report):
+    rows = []
+    for line_number, line in batch:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        line = line.strip()
+        if not line:
+            continue
+
+        try:
+            data = json.loads(line)
+        except ValueError as e:
+            report['errors'].append({'line': line_number, 'errors': {'non_field_errors': [f"Invalid JSON: {e}"]}})
+            continue
+
+        serializer = PostImportSerializer(data=data)
+        if not serializer.is_valid():
+            report['errors'].append({'line': line_number, 'errors': serializer.errors})
+            continue
+        created_on = serializer.validated_data.get('created_on')
+        if created_on and months is not None and month_start(created_on) not in months:
+            errors = {'created_on': [f"No partition holds {created_on:%Y-%m}."]}
+            report['errors'].append({'line': line_number, 'errors': errors})
+            continue
+        rows.append((line_number, serializer.validated_data))
+
+    authors = {}
+    if author is None:
+        usernames = {row['author'] for _, row in rows if row.get('author')}
+        authors = User.objects.in_bulk(usernames, field_name='username')
+
+    posts, post_categories, timestamps = [], [], []
+    for line_number, row in rows:
+        post_author = author or authors.get(row.get('author')) or default_author
+        if post_author is None:
+            report['errors'].append({'line': line_number, 'errors': {'author': [f"Unknown author {row.get('author')!r}."]}})
+            continue
+        posts.append(Post(title=row['title'], body=row['body'], author=post_author))
+        post_categories.append({name.lower() for name in row['categories']})
+        timestamps.append((row.get('created_on'), row.get('updated_on')))
+
+    if not posts:
+        return []
+
+    with transaction.atomic():
+        categories = Category.objects.resolve(set().union(*post_categories))
+        category_ids = {category.name: category.id for category in categories}
+        Post.objects.bulk_create(posts)
+        # bulk_create stamps auto_now(_add) fields itself; bulk_update doesn't
+        dated = []
+        for post, (created_on, updated_on) in zip(posts, timestamps):
+            if created_on:
+                post.created_on, post.updated_on = created_on, updated_on
+                dated.append(post)
+        Post.objects.bulk_update(dated, ['created_on', 'updated_on'])
+
+        Through = Post.categories.through
+        Through.objects.bulk_create(
+            [
+                Through(post_id=post.id, category_id=category_ids[name])
+                for post, names in zip(posts, post_categories)
+                for name in names
+            ],
+            ignore_conflicts=True,
+        )
+
+    return [post.id for post in posts]
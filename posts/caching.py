@@ -0,0 +1,237 @@
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+from django.db import models, transaction
+from rest_framework import serializers
+from rest_framework.fields import SkipField
+from rest_framework.relations import PKOnlyObject
+from posts.metrics import SerializerMetricsMixin
+from posts.replicas import is_pinned_request, response_cache_timeout
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Generation counters. Cache keys embed the current value of every
+# generation their response depends on, so bumping one makes exactly those
+# entries unreachable and they simply expire.
+POSTS = 'posts'            # any post created, edited, deleted or re-categorised
+CATEGORIES = 'categories'  # any category renamed or deleted
+USERS = 'users'            # any username changed
+
+
+def author_generation(username):
+    return f'author:{username.lower()}'
+
+
+def _generation_key(name):
+    return f'gen:{name}'
+
+
+def get_generations(names):
+    """
+    Current value of each generation, in order, with one cache round trip.
+
+    A missing counter (never bumped, or evicted) starts from the clock rather
+    than 0 so it can never collide with keys cached before the eviction.
+    """
+    keys = [_generation_key(name) for name in names]
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            cache.add(key, time.time_ns(), timeout=None)
+            values[key] = cache.get(key)
+    return [values[key] for key in keys]
+
+
+def bump_generations(*names):
+    try:
+        for name in names:
+            key = _generation_key(name)
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.add(key, time.time_ns(), timeout=None)
+    except Exception as e:
+        # Log the error with relevant details
+        logger.error(f"Failed to bump cache generations {names}: {e}")
+
+
+def invalidate(*names):
+    """
+    Bump now so reads inside this transaction miss, and again after commit
+    so a read that cached the old rows while we were committing can't win.
+    """
+    bump_generations(*names)
+    transaction.on_commit(lambda: bump_generations(*names))
+
+
+def etag_matches(etag, if_none_match):
+    """
+    Whether an ``If-None-Match`` header names ``etag``: either ``*`` or one
+    of its tags, compared weakly as RFC 9110 requires for this header, so
+    ``W/"abc"`` matches ``"abc"`` but ``"abcd"`` doesn't.
+    """
+    tags = parse_etags(if_none_match or '')
+    if tags == ['*']:
+        return True
+    return any(tag.removeprefix('W/') == etag for tag in tags)
+
+
+class ResponseCacheMixin:
+    """
+    Caches a list view's response in the shared cache and answers
+    ``If-None-Match`` with 304 without touching the database.
+
+    Views list the query params that shape the response in
+    ``cache_query_params`` and return the generations it depends on from
+    ``get_cache_generations()``. The ETag is derived from the cache key,
+    which already contains those generations, so a matching ETag is
+    checked with a single cache round trip.
+    """
+    cache_query_params = ()
+    cache_timeout = None
+
+    def get_cache_generations(self, request):
+        return [POSTS]
+
+    def get_response_cache_key(self, request):
+        params = sorted(
+            (name, request.query_params.get(name)) for name in self.cache_query_params
+            if name in request.query_params
+        )
+        generations = get_generations(self.get_cache_generations(request))
+        # The host is part of the key because pagination links are absolute
+        raw = repr((type(self).__name__, request.get_host(), params, generations))
+        return 'response:' + hashlib.sha1(raw.encode()).hexdigest()
+
+    def list(self, request, *args, **kwargs):
+        try:
+            key = self.get_response_cache_key(request)
+            cached = cache.get(key)
+        except Exception as e:
+            # The cache is an optimisation; serve uncached if it's down
+            logger.error(f"Response cache unavailable: {e}")
+            return super().list(request, *args, **kwargs)
+
+        etag = f'"{key.split(":")[1]}"'
+        pinned = is_pinned_request(request)
+        if etag_matches(etag, request.headers.get('If-None-Match')) and not pinned:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+        if cached is not None and not pinned:
+            response = Response(cached)
+        else:
+            response = super().list(request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                timeout = response_cache_timeout(self.cache_timeout or settings.FEED_CACHE_TIMEOUT)
+                try:
+                    cache.set(key, response.data, timeout)
+                except Exception as e:
+                    logger.error(f"Failed to cache response: {e}")
+
+        response['ETag'] = etag
+        return response
+
+
+def get_fragments(keys):
+    try:
+        return cache.get_many(keys)
+    except Exception as e:
+        logger.error(f"Fragment cache unavailable: {e}")
+        return {}
+
+
+def set_fragments(fragments):
+    if not fragments:
+        return
+    try:
+        cache.set_many(fragments, settings.FRAGMENT_CACHE_TIMEOUT)
+    except Exception as e:
+        logger.error(f"Failed to cache {len(fragments)} fragments: {e}")
+
+
+class FragmentCacheListSerializer(SerializerMetricsMixin, serializers.ListSerializer):
+    """
+    Serializes a page by fetching every cached fragment with one multi-get
+    and running the child serializer only for the misses.
+    """
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.manager.BaseManager) else data
+        items = list(iterable)
+        self.child.prime_fragments(items)
+        keys = [self.child.get_fragment_key(item) for item in items]
+        cached = get_fragments(keys)
+
+        missing, result = {}, []
+        for item, key in zip(items, keys):
+            fragment = cached.get(key)
+            if fragment is None:
+                fragment = missing[key] = self.child.build_fragment(item)
+            result.append(self.child.complete_fragment(item, fragment))
+        set_fragments(missing)
+        return result
+
+
+class FragmentCacheMixin(SerializerMetricsMixin):
+    """
+    Caches a ModelSerializer's output per object.
+
+    ``get_fragment_parts()`` returns everything the cached fields depend on,
+    starting with the (id, updated_on) pair; an edit produces a new key and
+    the old fragment simply expires. Fields named in ``fragment_exclude``
+    depend on the request or on other cached objects and are rendered on
+    every call.
+    """
+    fragment_exclude = ()
+
+    def prime_fragments(self, instances):
+        """
+        Hook for loading what the keys of a whole page depend on at once.
+        """
+
+    def get_fragment_parts(self, instance):
+        return (instance.pk, instance.updated_on.isoformat())
+
+    def get_fragment_key(self, instance):
+        parts = repr(self.get_fragment_parts(instance))
+        return f'fragment:{type(self).__name__}:{instance.pk}:{hashlib.sha1(parts.encode()).hexdigest()}'
+
+    def _represent(self, instance, fields):
+        ret = {}
+        for field in fields:
+            try:
+                attribute = field.get_attribute(instance)
+            except SkipField:
+                continue
+            check_for_none = attribute.pk if isinstance(attribute, PKOnlyObject) else attribute
+            ret[field.field_name] = None if check_for_none is None else field.to_representation(attribute)
+        return ret
+
+    def build_fragment(self, instance):
+        fields = [field for field in self._readable_fields if field.field_name not in self.fragment_exclude]
+        return self._represent(instance, fields)
+
+    def complete_fragment(self, instance, fragment):
+        if not self.fragment_exclude:
+            return fragment
+        fields = [field for field in self._readable_fields if field.field_name in self.fragment_exclude]
+        extra = self._represent(instance, fields)
+        # Keep the declared field order
+        return {
+            field.field_name: fragment[field.field_name] if field.field_name in fragment else extra[field.field_name]
+            for field in self._readable_fields
+            if field.field_name in fragment or field.field_name in extra
+        }
+
+    def to_representation(self, instance):
+        key = self.get_fragment_key(instance)
+        fragment = get_fragments([key]).get(key)
+        if fragment is None:
+            fragment = self.build_fragment(instance)
+            set_fragments({key: fragment})
+        return self.complete_fragment(instance, fragment)
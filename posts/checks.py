@@ -0,0 +1,64 @@
+"""
+The trigram index behind category substring search (see posts.lookups).
+
+pg_trgm ships with Postgres' contrib, which minimal builds leave out, so
+the index lives outside the model state: migration 0009 and every later
+migrate create it where the extension is available, and the system check
+below warns where it's still missing.
+"""
+from django.core.checks import Tags, Warning, register
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.utils import DatabaseError
+
+TRIGRAM_INDEX = 'category_name_trgm_idx'
+
+CREATE_TRIGRAM_INDEX_SQL = f"""
+    DO $$
+    BEGIN
+        IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+            CREATE EXTENSION IF NOT EXISTS pg_trgm;
+            CREATE INDEX IF NOT EXISTS {TRIGRAM_INDEX} ON posts_category USING gin (name gin_trgm_ops);
+        END IF;
+    END
+    $$;
+"""
+DROP_TRIGRAM_INDEX_SQL = f'DROP INDEX IF EXISTS {TRIGRAM_INDEX}'
+
+
+def create_trigram_index(sender=None, using=DEFAULT_DB_ALIAS, plan=None, **kwargs):
+    """
+    post_migrate receiver: create the index if it's missing and pg_trgm has
+    since been installed. A reversed migration plan leaves it alone.
+    """
+    if plan and any(backwards for _, backwards in plan):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute("SELECT to_regclass('posts_category') IS NOT NULL")
+        if cursor.fetchone()[0]:
+            cursor.execute(CREATE_TRIGRAM_INDEX_SQL)
+
+
+@register(Tags.database)
+def check_trigram_index(app_configs, databases=None, **kwargs):
+    """
+    Run by migrate and ``check --database``, like Django's own database
+    checks.
+    """
+    warnings = []
+    for alias in databases or []:
+        try:
+            with connections[alias].cursor() as cursor:
+                cursor.execute(
+                    "SELECT to_regclass('posts_category') IS NOT NULL, to_regclass(%s) IS NOT NULL", [TRIGRAM_INDEX],
+                )
+                has_table, has_index = cursor.fetchone()
+        except DatabaseError:
+            continue
+        if has_table and not has_index:
+            warnings.append(Warning(
+                f"The {TRIGRAM_INDEX} index is missing from the {alias!r} database, so category "
+                f"substring filters scan posts_category.",
+                hint="Install the pg_trgm extension (postgresql-contrib) and run migrate again.",
+                id='posts.W001',
+            ))
+    return warnings
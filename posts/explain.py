@@ -0,0 +1,220 @@
+"""
+EXPLAIN (ANALYZE, BUFFERS) of every query the read endpoints in
+posts.urls issue, for ``manage.py explain_endpoints``.
+
+Each endpoint is requested in-process through Django's test client, as
+the most recent commenter in the dataset, with the response cache and
+read replicas out of the way so every query reaches the primary. Each
+captured query is then explained, and every table scan is listed with
+the index it used. Sequential scans of large tables are flagged.
+
+Requests run in a transaction that is rolled back. Endpoints without a
+GET, or whose GET doesn't take the route's arguments, are skipped: their
+writes would also queue search-index updates, which a rollback can't
+undo.
+"""
+import inspect
+import json
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern
+from rest_framework_simplejwt.tokens import AccessToken
+from posts import urls
+from posts.middleware import is_app_query
+from posts.models import Comment
+
+# Query strings requested for each route, besides the plain GET of the
+# routes not listed. A `next` cursor link in a response is requested too,
+# so keyset pages after the first are covered. Category search without
+# pagination returns every post of the category, which is rightly a
+# sequential scan. The load-test vocabulary is so small that any of its
+# words matches nearly every post, so text search looks for a word it
+# lacks, as a selective search would on real text.
+VARIANTS = {
+    'v1/posts/': ['?page=20'],
+    'v2/posts/': ['?page=20', '?pagination=cursor&page_size=20', '?author={username}'],
+    'v2/post/': ['?pagination=cursor'],
+    'v2/post/<int:post_id>/comment/': ['?pagination=cursor'],
+    'v2/search/': ['?category={category}&pagination=cursor', '?category_exact={category}&pagination=cursor'],
+    'v2/search/text/': ['?search=replication'],
+    'v3/posts/': ['', '?author={username}'],
+    'v3/search/': ['?search=replication'],
+    'v3/search/text/': ['?search=replication'],
+}
+SCAN_NODES = ('Seq Scan', 'Index Scan', 'Index Only Scan', 'Bitmap Heap Scan', 'Bitmap Index Scan')
+EXPLAINABLE = ('SELECT', 'WITH')
+
+
+class Sample:
+    """
+    The ids and names endpoints are requested with: the newest comment,
+    its author and post, and a category of that post.
+    """
+
+    def __init__(self):
+        comment = Comment.objects.select_related('author', 'post').order_by('-id').first()
+        if comment is None:
+            raise ValueError("No comments to explain with; seed some with --seed-posts.")
+        self.user = comment.author
+        category = comment.post.categories.first()
+        self.values = {
+            'post_id': comment.post_id,
+            'comment_id': comment.id,
+            'id': comment.post_id,
+            'username': self.user.username,
+            'category': category.name if category else '',
+        }
+
+    def path(self, pattern, query):
+        path = str(pattern.pattern)
+        for name, value in self.values.items():
+            path = path.replace(f'<int:{name}>', str(value))
+        return '/api/' + path + query.format(**self.values)
+
+
+def routes():
+    for pattern in urls.urlpatterns:
+        if isinstance(pattern, URLPattern):
+            yield pattern
+
+
+def has_get(pattern):
+    """
+    Whether the route's view answers GET with the route's arguments; some
+    v1 views serve only their other methods on a detail route.
+    """
+    view_class = getattr(pattern.callback, 'view_class', None)
+    if view_class is None or not hasattr(view_class, 'get'):
+        return False
+    try:
+        inspect.signature(view_class.get).bind(None, None, **dict.fromkeys(pattern.pattern.converters))
+    except TypeError:
+        return False
+    return True
+
+
+def scans(plan):
+    """
+    Every scan node of a JSON plan, depth first.
+    """
+    if plan.get('Node Type') in SCAN_NODES:
+        yield plan
+    for child in plan.get('Plans', []):
+        yield from scans(child)
+
+
+def explain(sql):
+    """
+    The JSON plan of ``sql`` executed with ANALYZE and BUFFERS.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}')
+        plan = cursor.fetchone()[0]
+    return (json.loads(plan) if isinstance(plan, str) else plan)[0]
+
+
+def explain_text(sql):
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (ANALYZE, BUFFERS) {sql}')
+        return '\n'.join(line for line, in cursor.fetchall())
+
+
+def request_queries(client, path, headers):
+    """
+    Request ``path`` and return the response and the SQL of the
+    endpoint's own queries.
+    """
+    with CaptureQueriesContext(connection) as context:
+        response = client.get(path, headers=headers)
+        if response.streaming:
+            # A streamed body runs its queries as it's read
+            b''.join(response.streaming_content)
+    return response, [query['sql'] for query in context.captured_queries if is_app_query(query['sql'])]
+
+
+def statement(sql):
+    """
+    The query ``sql`` runs, or None if it isn't one to explain. Async
+    iteration reads through a server-side cursor, whose DECLARE wraps the
+    query.
+    """
+    sql = sql.lstrip()
+    if sql.upper().startswith('DECLARE '):
+        sql = sql.split(' FOR ', 1)[-1]
+    return sql if sql.upper().startswith(EXPLAINABLE) else None
+
+
+def report_scan(scan):
+    relation = scan.get('Relation Name') or ''
+    index = scan.get('Index Name')
+    line = f"{scan['Node Type']}"
+    if index:
+        line += f" using {index}"
+    if relation:
+        line += f" on {relation}"
+    line += f" (rows={scan.get('Actual Rows', 0)} loops={scan.get('Actual Loops', 0)}"
+    if 'Heap Fetches' in scan:
+        line += f" heap_fetches={scan['Heap Fetches']}"
+    return line + ')'
+
+
+def run(stdout, seq_scan_rows=1000, plans=False):
+    """
+    Explain every endpoint and return the sequential scans that read more
+    than ``seq_scan_rows`` rows, as (path, scan description) pairs.
+    """
+    sample = Sample()
+    headers = {'Authorization': f'Bearer {AccessToken.for_user(sample.user)}'}
+    flagged = []
+    local_cache = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+    with override_settings(
+        CACHES=local_cache, DATABASE_REPLICAS=[], PROFILING_SAMPLE_RATE=0, PROFILING_PATHS=[],
+        PROFILING_USERS=[], ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+    ):
+        client = Client(raise_request_exception=False)
+        for pattern in routes():
+            route = str(pattern.pattern)
+            if not has_get(pattern):
+                stdout.write(f"\n/api/{route}: no GET, skipped")
+                continue
+
+            pending = [sample.path(pattern, query) for query in VARIANTS.get(route, [''])]
+            while pending:
+                path = pending.pop(0)
+                # Endpoints sharing a cache key mustn't answer each other
+                cache.clear()
+                with transaction.atomic():
+                    response, queries = request_queries(client, path, headers)
+                    stdout.write(f"\nGET {path}: {response.status_code}, {len(queries)} queries")
+                    for number, sql in enumerate(queries, start=1):
+                        sql = statement(sql)
+                        if sql is None:
+                            continue
+                        plan = explain(sql)
+                        root = plan['Plan']
+                        stdout.write(
+                            f"  {number}. {' '.join(sql.split())[:100]}\n"
+                            f"     {plan['Execution Time']:.2f} ms, "
+                            f"buffers hit={root.get('Shared Hit Blocks', 0)} read={root.get('Shared Read Blocks', 0)}"
+                        )
+                        for scan in scans(root):
+                            description = report_scan(scan)
+                            loops = scan.get('Actual Loops', 1)
+                            rows = (scan.get('Actual Rows', 0) + scan.get('Rows Removed by Filter', 0)) * loops
+                            if scan['Node Type'] == 'Seq Scan' and rows > seq_scan_rows:
+                                description += '  <-- sequential scan'
+                                flagged.append((path, description))
+                            stdout.write(f"     {description}")
+                        if plans:
+                            stdout.write('\n'.join(f'       {line}' for line in explain_text(sql).splitlines()))
+                    transaction.set_rollback(True)
+
+                data = response.json() if response.get('Content-Type', '').startswith('application/json') else None
+                next_link = data.get('next') if isinstance(data, dict) else None
+                if isinstance(next_link, str) and 'cursor=' in next_link and 'cursor=' not in path:
+                    pending.append(next_link.split('testserver', 1)[-1])
+    return flagged
@@ -1,9 +1,33 @@
 import django_filters
+from posts.lookups import category_ids, category_ids_by_name
 from posts.models import Post
 
 class PostFilter(django_filters.FilterSet):
-    category = django_filters.CharFilter(field_name='categories__name', lookup_expr='icontains')
+    category = django_filters.CharFilter(method='filter_category')
+    category_exact = django_filters.CharFilter(method='filter_category_exact')
 
     class Meta:
         model = Post
-        fields = ['category']
+        fields = ['category', 'category_exact']
+
+    def filter_category(self, queryset, name, value):
+        """
+        Posts in any category whose name contains ``value``.
+
+        The matching category ids come from the lookup cache, so only the
+        link table is consulted, and the IN subquery can't return a post
+        twice, so no DISTINCT is needed.
+        """
+        return self._filter_category_ids(queryset, category_ids.get(value.lower()))
+
+    def filter_category_exact(self, queryset, name, value):
+        """
+        Posts in the category named ``value``, resolved to its id once and
+        filtered through the link table's category index.
+        """
+        category_id = category_ids_by_name.get(value.lower())
+        return self._filter_category_ids(queryset, [] if category_id is None else [category_id])
+
+    def _filter_category_ids(self, queryset, ids):
+        links = Post.categories.through.objects.filter(category_id__in=ids)
+        return queryset.filter(id__in=links.values('post_id'))
@@ -0,0 +1,260 @@
+import asyncio
+import time
+import weakref
+from itertools import islice
+import redis
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from elasticsearch import AsyncElasticsearch
+from elasticsearch.helpers import scan
+from elasticsearch_dsl.connections import connections
+from posts.documents import PostDocument
+from posts.metrics import SEARCH_SECONDS
+from posts.models import Post
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Number of posts sent to Elasticsearch in one _bulk request.
+INDEX_CHUNK_SIZE = 500
+
+# Sorted set of post ids waiting to be indexed, scored by when each was first
+# queued. ZADD NX keeps that first score, so saving a post again before the
+# flush collapses into the existing entry and the oldest score is the lag.
+PENDING_KEY = 'search:posts:pending'
+# Set while a flush task is scheduled so a burst of saves schedules only one.
+FLUSH_SCHEDULED_KEY = 'search:posts:flush-scheduled'
+
+_redis = None
+# event loop -> AsyncElasticsearch; aiohttp sessions belong to one loop
+_async_elasticsearch = weakref.WeakKeyDictionary()
+# (checked_at, healthy) of the last search_backend_healthy() probe
+_health = (float('-inf'), True)
+
+
+class IndexingError(Exception):
+    """
+    Elasticsearch rejected some documents of a _bulk request, e.g. with 429
+    or a mapping error. ``post_ids`` are the posts left unsynced.
+    """
+
+    def __init__(self, post_ids, errors):
+        self.post_ids = post_ids
+        super().__init__(f"Failed to index {len(post_ids)} posts: {errors[:5]}")
+
+
+def get_redis():
+    global _redis
+    if _redis is None:
+        _redis = redis.Redis.from_url(settings.REDIS_URL, socket_timeout=1, socket_connect_timeout=1)
+    return _redis
+
+
+def get_async_elasticsearch():
+    """
+    The AsyncElasticsearch client of the running event loop, for the
+    async views in posts.async_views.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_elasticsearch.get(loop)
+    if client is None:
+        client = AsyncElasticsearch(settings.ELASTICSEARCH_DSL['default']['hosts'])
+        _async_elasticsearch[loop] = client
+    return client
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def enqueue_posts(post_ids):
+    """
+    Queue posts for indexing and make sure a flush is scheduled.
+
+    Called from the write path, so failures are logged and never raised;
+    the consistency check in search_index_check repairs anything missed.
+    """
+    post_ids = list(post_ids)
+    if not post_ids:
+        return
+    try:
+        client = get_redis()
+        now = time.time()
+        client.zadd(PENDING_KEY, {str(post_id): now for post_id in post_ids}, nx=True)
+        schedule_flush()
+    except Exception as e:
+        # Log the error with relevant details
+        logger.error(f"Failed to queue {len(post_ids)} posts for indexing: {e}")
+
+
+def enqueue_category_posts(category_id):
+    """
+    Queue every post linked to a category, reading the links in chunks.
+    """
+    Through = Post.categories.through
+    post_ids = Through.objects.filter(category_id=category_id).values_list('post_id', flat=True)
+    for chunk in chunked(post_ids.iterator(chunk_size=INDEX_CHUNK_SIZE), INDEX_CHUNK_SIZE):
+        enqueue_posts(chunk)
+
+
+def schedule_flush(countdown=None):
+    from posts.tasks import flush_search_index
+
+    if countdown is None:
+        countdown = settings.SEARCH_INDEX_FLUSH_DELAY
+    # The key outlives the countdown in case the worker is slow to pick it up
+    if get_redis().set(FLUSH_SCHEDULED_KEY, 1, nx=True, ex=countdown + 60):
+        flush_search_index.apply_async(countdown=countdown)
+
+
+def flush_pending(batch_size=None):
+    """
+    Index one batch of queued posts and return how many were processed.
+
+    Posts that no longer exist are deleted from the index. If the bulk
+    request fails the batch is put back with its original scores, or only
+    the rejected posts if some were indexed, and the error is raised so
+    the task can retry.
+    """
+    client = get_redis()
+    entries = client.zpopmin(PENDING_KEY, batch_size or settings.SEARCH_INDEX_BATCH_SIZE)
+    if not entries:
+        return 0
+
+    post_ids = [int(member) for member, _ in entries]
+    try:
+        sync_posts(post_ids)
+    except IndexingError as e:
+        failed = set(e.post_ids)
+        client.zadd(PENDING_KEY, {member: score for member, score in entries if int(member) in failed}, nx=True)
+        raise
+    except Exception:
+        client.zadd(PENDING_KEY, dict(entries), nx=True)
+        raise
+    return len(post_ids)
+
+
+def sync_posts(post_ids):
+    """
+    Make the index match the database for ``post_ids`` with one _bulk
+    request. Raises IndexingError naming the posts Elasticsearch rejected.
+    """
+    document = PostDocument()
+    posts = list(Post.objects.filter(id__in=post_ids).select_related('author').prefetch_related('categories'))
+    missing = set(post_ids) - {post.id for post in posts}
+
+    actions = list(document._get_actions(posts, 'index'))
+    actions += [
+        {'_op_type': 'delete', '_index': document._index._name, '_id': post_id}
+        for post_id in missing
+    ]
+    with SEARCH_SECONDS.labels('bulk').time():
+        _, errors = document.bulk(actions, raise_on_error=False)
+
+    # Deleting a post that was never indexed is not an error
+    errors = [error for error in errors if error.get('delete', {}).get('status') != 404]
+    if errors:
+        logger.error(f"Failed to index {len(errors)} of {len(actions)} posts: {errors[:5]}")
+        # Each error is {op_type: {'_id': ..., 'status': ..., 'error': ...}}
+        raise IndexingError([int(item['_id']) for error in errors for item in error.values()], errors)
+
+
+def iter_posts_by_id(chunk_size=INDEX_CHUNK_SIZE, using=None):
+    """
+    Yield every post in id order, one keyset page (``id > last``) at a time,
+    read from the ``using`` database if given.
+
+    Unlike OFFSET paging each page is an index range scan, and unlike a
+    server-side cursor no transaction is held open for the whole rebuild.
+    """
+    last_id = 0
+    while True:
+        posts = list(
+            Post.objects.using(using).filter(id__gt=last_id).order_by('id')
+            .select_related('author').prefetch_related('categories')[:chunk_size]
+        )
+        if not posts:
+            return
+        yield from posts
+        last_id = posts[-1].id
+
+
+def indexed_post_ids(index=None):
+    """
+    Every post id currently in the search index, or in ``index``.
+    """
+    document = PostDocument()
+    hits = scan(
+        document._get_connection(),
+        index=index or document._index._name,
+        query={'query': {'match_all': {}}},
+        _source=False,
+    )
+    return {int(hit['_id']) for hit in hits}
+
+
+def find_drift(index=None):
+    """
+    Compare post ids in the database and the index, or in ``index``.
+
+    Returns the ids missing from the index and the ids indexed for posts
+    that no longer exist.
+    """
+    db_ids = set(Post.objects.values_list('id', flat=True).iterator(chunk_size=5000))
+    es_ids = indexed_post_ids(index)
+    return db_ids - es_ids, es_ids - db_ids
+
+
+def queue_stats():
+    """
+    Queue depth and the age in seconds of the oldest queued post.
+    """
+    client = get_redis()
+    depth = client.zcard(PENDING_KEY)
+    oldest = client.zrange(PENDING_KEY, 0, 0, withscores=True)
+    lag = time.time() - oldest[0][1] if oldest else 0.0
+    return {'depth': depth, 'lag_seconds': lag}
+
+
+def search_backend_healthy():
+    """
+    Whether Elasticsearch answers and the indexing queue isn't lagging
+    behind by more than SEARCH_MAX_INDEX_LAG seconds.
+
+    The answer is reused for SEARCH_HEALTH_CHECK_INTERVAL seconds so a
+    dead cluster costs one timed-out ping per interval, not per request.
+    """
+    global _health
+    checked_at, healthy = _health
+    now = time.monotonic()
+    if now - checked_at < settings.SEARCH_HEALTH_CHECK_INTERVAL:
+        return healthy
+
+    try:
+        with SEARCH_SECONDS.labels('ping').time():
+            healthy = connections.get_connection().ping(request_timeout=1)
+    except Exception:
+        healthy = False
+    if healthy:
+        try:
+            healthy = queue_stats()['lag_seconds'] <= settings.SEARCH_MAX_INDEX_LAG
+        except Exception as e:
+            # An unreachable queue says nothing about the index itself
+            logger.error(f"Failed to read the indexing queue lag: {e}")
+    if not healthy:
+        logger.warning("Elasticsearch is unhealthy; search falls back to Postgres")
+    _health = (now, healthy)
+    return healthy
+
+
+async def asearch_backend_healthy():
+    """
+    search_backend_healthy() for async views. While the last answer is
+    fresh it is returned without leaving the event loop.
+    """
+    checked_at, healthy = _health
+    if time.monotonic() - checked_at < settings.SEARCH_HEALTH_CHECK_INTERVAL:
+        return healthy
+    return await sync_to_async(search_backend_healthy)()
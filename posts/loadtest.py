@@ -0,0 +1,387 @@
+"""
+Synthetic dataset and HTTP load generator for the v1/v2 API.
+
+``manage.py seed_loadtest`` fills the database with ``loadtest-`` users,
+posts, categories and comments; ``manage.py loadtest`` replays one of the
+WORKLOADS against a running server and reports latency percentiles, RPS
+and queries per request for every endpoint. Run the server with
+QUERY_COUNT_HEADER=True to get query counts. ``manage.py
+startup_benchmark`` starts a server and measures its cold start and RPS.
+"""
+import json
+import math
+import random
+import shlex
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import urllib3
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from authentication.models import User
+from posts.caching import CATEGORIES, POSTS, USERS, invalidate
+from posts.indexing import chunked
+from posts.models import Category, Comment, Post
+
+# Prefix of every seeded username, email and category name
+PREFIX = 'loadtest-'
+PASSWORD = 'loadtest-password!'
+SEED_BATCH_SIZE = 1000
+WORDS = (
+    'django postgres redis celery search index cache query latency feed '
+    'comment author category python async worker cursor keyset bulk'
+).split()
+
+
+def _sentence(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def seed(users=50, posts=5000, categories=20, comments_per_post=5, batch_size=SEED_BATCH_SIZE, random_seed=0):
+    """
+    Bulk-create a synthetic dataset and return how many rows of each kind
+    were created. Every user's password is PASSWORD. Signals don't fire
+    for bulk_create, so the search index has to be rebuilt afterwards.
+    """
+    rng = random.Random(random_seed)
+    password = make_password(PASSWORD)
+    start = User.objects.filter(username__startswith=PREFIX).count()
+    created_users = User.objects.bulk_create([
+        User(
+            username=f'{PREFIX}{start + index}',
+            email=f'{PREFIX}{start + index}@example.com',
+            first_name='Load',
+            last_name='Test',
+            password=password,
+        )
+        for index in range(users)
+    ], batch_size=batch_size)
+    author_ids = list(User.objects.filter(username__startswith=PREFIX).values_list('id', flat=True))
+
+    Category.objects.bulk_create(
+        [Category(name=f'{PREFIX}{index}') for index in range(categories)],
+        ignore_conflicts=True,
+    )
+    category_ids = list(Category.objects.filter(name__startswith=PREFIX).values_list('id', flat=True))
+
+    Through = Post.categories.through
+    created = {'users': len(created_users), 'posts': 0, 'comments': 0, 'categories': len(category_ids)}
+    for chunk in chunked(range(posts), batch_size):
+        with transaction.atomic():
+            new_posts = Post.objects.bulk_create([
+                Post(title=_sentence(rng, 5), body=_sentence(rng, 60), author_id=rng.choice(author_ids))
+                for _ in chunk
+            ])
+            Through.objects.bulk_create([
+                Through(post_id=post.id, category_id=category_id)
+                for post in new_posts
+                for category_id in rng.sample(category_ids, min(2, len(category_ids)))
+            ], ignore_conflicts=True)
+            comments = Comment.objects.bulk_create([
+                Comment(post=post, author_id=rng.choice(author_ids), content=_sentence(rng, 12))
+                for post in new_posts
+                for _ in range(rng.randint(0, 2 * comments_per_post))
+            ], batch_size=batch_size)
+            Post.objects.filter(id__in=[post.id for post in new_posts]).reconcile_comment_counters()
+        created['posts'] += len(new_posts)
+        created['comments'] += len(comments)
+
+    invalidate(POSTS, CATEGORIES, USERS)
+    return created
+
+
+def clear():
+    """
+    Delete every seeded user (their posts and comments cascade) and category.
+    """
+    deleted, _ = User.objects.filter(username__startswith=PREFIX).delete()
+    deleted += Category.objects.filter(name__startswith=PREFIX).delete()[0]
+    return deleted
+
+
+class Client:
+    """
+    One simulated user: logs in once and keeps its JWT and connection pool.
+    """
+
+    def __init__(self, base_url, http, email):
+        self.base_url = base_url.rstrip('/')
+        self.http = http
+        self.email = email
+        self.token = None
+
+    def request(self, method, path, body=None, auth=True):
+        headers = {'Content-Type': 'application/json'}
+        if auth and self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        return self.http.request(
+            method, self.base_url + path,
+            body=None if body is None else json.dumps(body),
+            headers=headers,
+            retries=False,
+        )
+
+    def login(self):
+        response = self.request('POST', '/api/login/', {'email': self.email, 'password': PASSWORD}, auth=False)
+        if response.status == 200:
+            self.token = json.loads(response.data)['access']
+        return response
+
+
+class Dataset:
+    """
+    Ids and names the workload picks from, read once before the run.
+    """
+
+    def __init__(self):
+        self.emails = list(User.objects.filter(username__startswith=PREFIX).values_list('email', flat=True))
+        self.usernames = [email.split('@')[0] for email in self.emails]
+        self.categories = list(Category.objects.filter(name__startswith=PREFIX).values_list('name', flat=True))
+        self.post_ids = list(
+            Post.objects.filter(author__username__startswith=PREFIX).order_by('-id').values_list('id', flat=True)[:5000]
+        )
+        if not self.emails or not self.post_ids:
+            raise ValueError("No load-test data; run manage.py seed_loadtest first.")
+
+
+def _post_body(rng, data):
+    return {'title': _sentence(rng, 5), 'body': _sentence(rng, 60), 'categories': [{'name': rng.choice(data.categories)}]}
+
+
+# endpoint name -> (method, path(rng, data), body(rng, data) or None)
+ENDPOINTS = {
+    'v1 feed': ('GET', lambda rng, data: f'/api/v1/posts/?page={rng.randint(1, 20)}', None),
+    'v1 post detail': ('GET', lambda rng, data: f'/api/v1/posts/{rng.choice(data.post_ids)}/comments/', None),
+    'v1 create comment': (
+        'POST', lambda rng, data: f'/api/v1/posts/{rng.choice(data.post_ids)}/comments/',
+        lambda rng, data: {'content': _sentence(rng, 12)},
+    ),
+    'v2 feed': ('GET', lambda rng, data: f'/api/v2/posts/?page={rng.randint(1, 20)}', None),
+    'v2 feed cursor': ('GET', lambda rng, data: '/api/v2/posts/?pagination=cursor&page_size=20', None),
+    'v2 author feed': ('GET', lambda rng, data: f'/api/v2/posts/?author={rng.choice(data.usernames)}', None),
+    'v2 category search': ('GET', lambda rng, data: f'/api/v2/search/?category={rng.choice(data.categories)}', None),
+    'v2 text search': ('GET', lambda rng, data: f'/api/v2/search/text/?search={rng.choice(WORDS)}', None),
+    'v2 comments': (
+        'GET', lambda rng, data: f'/api/v2/post/{rng.choice(data.post_ids)}/comment/?pagination=cursor', None,
+    ),
+    'v2 create post': ('POST', lambda rng, data: '/api/v2/post/', _post_body),
+    'v2 create comment': (
+        'POST', lambda rng, data: f'/api/v2/post/{rng.choice(data.post_ids)}/comment/',
+        lambda rng, data: {'content': _sentence(rng, 12)},
+    ),
+    'es search': ('GET', lambda rng, data: f'/post-search?search={rng.choice(WORDS)}', None),
+    'v3 feed': ('GET', lambda rng, data: '/api/v3/posts/?page_size=20', None),
+    'v3 post detail': ('GET', lambda rng, data: f'/api/v3/post/{rng.choice(data.post_ids)}', None),
+    'v3 comments': ('GET', lambda rng, data: f'/api/v3/post/{rng.choice(data.post_ids)}/comment/', None),
+    'v3 search': ('GET', lambda rng, data: f'/api/v3/search/?search={rng.choice(WORDS)}', None),
+    'login': ('POST', None, None),
+}
+
+# Read endpoint -> (sync view, async view) serving the same data
+ASYNC_PAIRS = {
+    'feed': ('v2 feed cursor', 'v3 feed'),
+    'post detail': ('v1 post detail', 'v3 post detail'),
+    'comments': ('v2 comments', 'v3 comments'),
+    'search': ('es search', 'v3 search'),
+}
+
+# profile -> {endpoint name: weight}
+WORKLOADS = {
+    'read-heavy': {
+        'v1 feed': 10, 'v1 post detail': 15, 'v2 feed': 25, 'v2 feed cursor': 10, 'v2 author feed': 10,
+        'v2 category search': 10, 'v2 text search': 10, 'v2 comments': 7, 'v2 create comment': 2, 'login': 1,
+    },
+    'mixed': {
+        'v1 feed': 10, 'v1 post detail': 10, 'v2 feed': 20, 'v2 feed cursor': 5, 'v2 author feed': 5,
+        'v2 category search': 10, 'v2 text search': 5, 'v2 comments': 10, 'v1 create comment': 5,
+        'v2 create comment': 10, 'v2 create post': 8, 'login': 2,
+    },
+    'write-heavy': {
+        'v2 feed': 20, 'v1 post detail': 10, 'v2 comments': 10, 'v1 create comment': 15,
+        'v2 create comment': 20, 'v2 create post': 23, 'login': 2,
+    },
+    'sync-reads': {sync: 1 for sync, _ in ASYNC_PAIRS.values()},
+    'async-reads': {async_: 1 for _, async_ in ASYNC_PAIRS.values()},
+}
+
+
+def percentile(sorted_values, percent):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(percent / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(samples, elapsed):
+    """
+    Per-endpoint statistics from (endpoint, status, seconds, queries) samples.
+    """
+    by_endpoint = {}
+    for endpoint, status, seconds, queries in samples:
+        by_endpoint.setdefault(endpoint, []).append((status, seconds, queries))
+
+    report = {}
+    for endpoint, rows in sorted(by_endpoint.items()):
+        latencies = sorted(seconds * 1000 for _, seconds, _ in rows)
+        queries = [count for _, _, count in rows if count is not None]
+        report[endpoint] = {
+            'requests': len(rows),
+            'errors': sum(1 for status, _, _ in rows if status is None or status >= 400),
+            'rps': round(len(rows) / elapsed, 2),
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+            'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+        }
+    return report
+
+
+def run(base_url, profile='mixed', concurrency=10, duration=30, random_seed=0):
+    """
+    Replay ``profile`` from ``concurrency`` threads for ``duration``
+    seconds and return the run's metadata and per-endpoint statistics.
+    """
+    data = Dataset()
+    weights = WORKLOADS[profile]
+    endpoints, endpoint_weights = list(weights), list(weights.values())
+    http = urllib3.PoolManager(maxsize=concurrency, timeout=urllib3.Timeout(connect=5, read=30))
+    samples, lock = [], threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def worker(index):
+        rng = random.Random(random_seed + index)
+        client = Client(base_url, http, rng.choice(data.emails))
+        client.login()
+        while time.monotonic() < deadline:
+            endpoint = rng.choices(endpoints, endpoint_weights)[0]
+            started = time.perf_counter()
+            try:
+                if endpoint == 'login':
+                    response = client.login()
+                else:
+                    method, path, body = ENDPOINTS[endpoint]
+                    response = client.request(method, path(rng, data), body(rng, data) if body else None)
+                status = response.status
+                queries = response.headers.get('X-Query-Count')
+            except urllib3.exceptions.HTTPError:
+                status, queries = None, None
+            sample = (endpoint, status, time.perf_counter() - started, None if queries is None else int(queries))
+            with lock:
+                samples.append(sample)
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    elapsed = time.monotonic() - started
+
+    return {
+        'started_at': datetime.now(timezone.utc).isoformat(),
+        'base_url': base_url,
+        'profile': profile,
+        'concurrency': concurrency,
+        'duration': round(elapsed, 2),
+        'requests': len(samples),
+        'rps': round(len(samples) / elapsed, 2),
+        'dataset': {
+            'users': len(data.emails),
+            'posts': Post.objects.count(),
+            'comments': Comment.objects.count(),
+            'categories': len(data.categories),
+        },
+        'endpoints': summarize(samples, elapsed),
+    }
+
+
+def compare(baseline, current, threshold=10.0):
+    """
+    Endpoints whose p95 latency or queries per request grew by more than
+    ``threshold`` percent against ``baseline``, as (endpoint, metric, before, after).
+    """
+    regressions = []
+    for endpoint, stats in current['endpoints'].items():
+        before = baseline['endpoints'].get(endpoint)
+        if before is None:
+            continue
+        for metric in ('p95_ms', 'queries_per_request'):
+            old, new = before.get(metric), stats.get(metric)
+            if old is not None and new is not None and new > old * (1 + threshold / 100):
+                regressions.append((endpoint, metric, old, new))
+    return regressions
+
+
+def compare_async(base_url, concurrency=50, duration=30, random_seed=0):
+    """
+    Run the sync-reads and async-reads workloads one after the other at the
+    same concurrency and pair up their statistics per endpoint, as
+    {endpoint: (sync stats, async stats)}.
+    """
+    sync = run(base_url, 'sync-reads', concurrency, duration, random_seed)
+    async_ = run(base_url, 'async-reads', concurrency, duration, random_seed)
+    return {
+        name: (sync['endpoints'].get(sync_endpoint), async_['endpoints'].get(async_endpoint))
+        for name, (sync_endpoint, async_endpoint) in ASYNC_PAIRS.items()
+    }
+
+
+def benchmark_startup(command, base_url, path='/api/v2/posts/', concurrency=10, duration=10, startup_timeout=60):
+    """
+    Start the server with ``command``, time how long it takes to answer
+    ``path``, then request ``path`` from ``concurrency`` threads for
+    ``duration`` seconds. The server is stopped afterwards.
+    """
+    url = base_url.rstrip('/') + path
+    http = urllib3.PoolManager(maxsize=concurrency, timeout=urllib3.Timeout(connect=1, read=30))
+    started = time.monotonic()
+    server = subprocess.Popen(shlex.split(command))
+    try:
+        while True:
+            if server.poll() is not None:
+                raise RuntimeError(f"The server exited with status {server.returncode} before answering.")
+            if time.monotonic() - started > startup_timeout:
+                raise RuntimeError(f"The server didn't answer {url} within {startup_timeout}s.")
+            try:
+                if http.request('GET', url, retries=False).status < 500:
+                    break
+            except urllib3.exceptions.HTTPError:
+                pass
+            time.sleep(0.05)
+        cold_start = time.monotonic() - started
+
+        samples, lock = [], threading.Lock()
+        deadline = time.monotonic() + duration
+
+        def worker(index):
+            while time.monotonic() < deadline:
+                request_started = time.perf_counter()
+                try:
+                    status = http.request('GET', url, retries=False).status
+                except urllib3.exceptions.HTTPError:
+                    status = None
+                with lock:
+                    samples.append((path, status, time.perf_counter() - request_started, None))
+
+        run_started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(worker, range(concurrency)))
+        elapsed = time.monotonic() - run_started
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+    return {
+        'command': command,
+        'cold_start_seconds': round(cold_start, 3),
+        'concurrency': concurrency,
+        'duration': round(elapsed, 2),
+        'requests': len(samples),
+        'rps': round(len(samples) / elapsed, 2),
+        'endpoint': summarize(samples, elapsed)[path],
+    }
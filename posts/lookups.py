@@ -0,0 +1,225 @@
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache
+from authentication.models import User
+from posts.caching import CATEGORIES, USERS, get_generations
+from posts.metrics import LOOKUP_CACHE_LOOKUPS
+from posts.models import Category
+from posts.replicas import primary_reads
+import logging
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    A thread-safe in-process LRU with a per-entry TTL.
+
+    ``maxsize`` bounds memory; the least recently used entry is evicted
+    when it is exceeded. Expired entries are dropped when they are read.
+    """
+
+    def __init__(self, maxsize, timeout):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.timeout)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class LookupCache:
+    """
+    Resolves keys through an in-process LRU, then the shared cache, then
+    ``loader``, which receives the keys missed by both tiers and returns a
+    dict of the ones it found.
+
+    Writers update or drop entries through the signal handlers in
+    posts.signals. When ``generation`` is set, the keys of both tiers embed
+    its current value, so bumping it drops every entry in every process at
+    once; this costs one shared cache round trip per lookup, so callers
+    resolve a page's keys with one get_many() (see AuthorFragmentMixin in
+    posts.serializers) rather than a get() per row. Without it,
+    other processes only see a change once their local entry expires.
+    When the shared cache is down the generation can't be checked, so
+    lookups are loaded from the database.
+    """
+
+    def __init__(self, name, loader, generation=None):
+        self.name = name
+        self.loader = loader
+        self.generation = generation
+        self.local = LRUCache(settings.LOOKUP_CACHE_MAX_ENTRIES, settings.LOOKUP_CACHE_LOCAL_TIMEOUT)
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def _current_generation(self):
+        if self.generation is None:
+            return None
+        generation, = get_generations([self.generation])
+        return generation
+
+    def _shared_prefix(self, generation):
+        if generation is None:
+            return f'lookup:{self.name}:'
+        return f'lookup:{self.name}:{generation}:'
+
+    def _count(self, hits=0, shared_hits=0, misses=0):
+        with self._stats_lock:
+            self.hits += hits
+            self.shared_hits += shared_hits
+            self.misses += misses
+        for tier, count in (('local', hits), ('shared', shared_hits), ('database', misses)):
+            if count:
+                LOOKUP_CACHE_LOOKUPS.labels(self.name, tier).inc(count)
+
+    def _load(self, keys):
+        # Cached for everyone for a long time, so never from a lagging replica
+        with primary_reads():
+            return self.loader(keys)
+
+    def get(self, key):
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys):
+        keys = list(dict.fromkeys(keys))
+        try:
+            generation = self._current_generation()
+        except Exception as e:
+            logger.error(f"Lookup cache {self.name} unavailable: {e}")
+            self._count(misses=len(keys))
+            return self._load(keys)
+
+        found, missing = {}, []
+        for key in keys:
+            value = self.local.get((generation, key), _MISSING)
+            if value is _MISSING:
+                missing.append(key)
+            else:
+                found[key] = value
+        if not missing:
+            self._count(hits=len(found))
+            return found
+
+        prefix = self._shared_prefix(generation)
+        try:
+            shared = cache.get_many([prefix + str(key) for key in missing])
+        except Exception as e:
+            logger.error(f"Lookup cache {self.name} unavailable: {e}")
+            prefix, shared = None, {}
+
+        unloaded = []
+        for key in missing:
+            value = shared.get(prefix + str(key), _MISSING) if prefix else _MISSING
+            if value is _MISSING:
+                unloaded.append(key)
+            else:
+                found[key] = value
+                self.local.set((generation, key), value)
+        self._count(hits=len(keys) - len(missing), shared_hits=len(missing) - len(unloaded), misses=len(unloaded))
+        if not unloaded:
+            return found
+
+        loaded = self._load(unloaded)
+        for key, value in loaded.items():
+            self.local.set((generation, key), value)
+        found.update(loaded)
+        if prefix and loaded:
+            try:
+                cache.set_many({prefix + str(key): value for key, value in loaded.items()}, settings.LOOKUP_CACHE_TIMEOUT)
+            except Exception as e:
+                logger.error(f"Failed to fill lookup cache {self.name}: {e}")
+        return found
+
+    def set(self, key, value):
+        """
+        Write through both tiers, e.g. after a row is saved.
+        """
+        try:
+            generation = self._current_generation()
+            self.local.set((generation, key), value)
+            cache.set(self._shared_prefix(generation) + str(key), value, settings.LOOKUP_CACHE_TIMEOUT)
+        except Exception as e:
+            logger.error(f"Failed to update lookup cache {self.name}: {e}")
+
+    def delete(self, key):
+        try:
+            generation = self._current_generation()
+            self.local.delete((generation, key))
+            cache.delete(self._shared_prefix(generation) + str(key))
+        except Exception as e:
+            logger.error(f"Failed to update lookup cache {self.name}: {e}")
+
+    def clear_local(self):
+        self.local.clear()
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'size': len(self.local),
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+            }
+
+
+def _load_usernames(user_ids):
+    return dict(User.objects.filter(id__in=user_ids).values_list('id', 'username'))
+
+
+def _load_category_ids(terms):
+    # Names are stored lowercase, so a plain LIKE can use the trigram index
+    # where there is one (see posts.checks).
+    # One query per term; filters only ever send a single term.
+    return {
+        term: tuple(Category.objects.filter(name__contains=term).order_by('id').values_list('id', flat=True))
+        for term in terms
+    }
+
+
+def _load_category_ids_by_name(names):
+    return dict(Category.objects.filter(name__in=names).values_list('name', 'id'))
+
+
+# user id -> username. Renames bump USERS, which every process checks.
+usernames = LookupCache('usernames', _load_usernames, generation=USERS)
+# lowercased category search term -> ids of the categories whose name contains it.
+# Any category change can alter any term's result, so the shared tier is
+# versioned by the CATEGORIES generation instead of being updated per key.
+category_ids = LookupCache('category-ids', _load_category_ids, generation=CATEGORIES)
+# exact category name -> id
+category_ids_by_name = LookupCache('category-ids-by-name', _load_category_ids_by_name, generation=CATEGORIES)
@@ -0,0 +1,50 @@
+from datetime import datetime, timezone as dt_timezone
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from posts.caching import POSTS, invalidate
+from posts.partitioning import PARTITIONED_TABLES, detach_partitions, is_partitioned, month_start
+
+
+def month(value):
+    return datetime.strptime(value, '%Y-%m').replace(tzinfo=dt_timezone.utc)
+
+
+class Command(BaseCommand):
+    help = (
+        "Detach the partitions of posts and comments older than --before, "
+        "leaving them as plain tables to dump and drop. The remaining comments and "
+        "the category links of the archived posts are moved out with them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--before', type=month, required=True, metavar='YYYY-MM',
+            help="Detach the months before this one.",
+        )
+        parser.add_argument('--drop', action='store_true', help="Drop the detached partitions.")
+        parser.add_argument(
+            '--concurrently', action='store_true',
+            help="Detach without blocking queries on the tables (DETACH PARTITION ... CONCURRENTLY).",
+        )
+
+    def handle(self, *args, **options):
+        before = options['before']
+        if before > month_start(timezone.now()):
+            raise CommandError("Only past months can be archived.")
+        if not any(is_partitioned(table) for table in PARTITIONED_TABLES):
+            raise CommandError("The tables aren't partitioned.")
+
+        # Comments first: those of the archived months go with their
+        # partitions, and detaching posts archives the rest of their comments
+        for table in reversed(PARTITIONED_TABLES):
+            detached = detach_partitions(
+                table, before, drop=options['drop'], concurrently=options['concurrently'],
+            )
+            action = "Dropped" if options['drop'] else "Detached"
+            for name in detached:
+                self.stdout.write(f"{action} {name}")
+            if not detached:
+                self.stdout.write(f"No partitions of {table} before {before:%Y-%m}")
+
+        # Cached pages may still list the archived posts
+        invalidate(POSTS)
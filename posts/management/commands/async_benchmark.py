@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from posts.loadtest import compare_async
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the sync read endpoints with their async /api/v3/ versions at the "
+        "same concurrency against a running server."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://localhost:8000')
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--duration', type=int, default=30, help="Seconds to run each side for.")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        try:
+            pairs = compare_async(
+                options['base_url'],
+                concurrency=options['concurrency'],
+                duration=options['duration'],
+                random_seed=options['seed'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(f"concurrency {options['concurrency']}, {options['duration']}s per side")
+        self.stdout.write(f"{'endpoint':<14}{'sync rps':>10}{'async rps':>11}{'sync p95':>10}{'async p95':>11}{'errors':>9}")
+        for name, (sync, async_) in pairs.items():
+            if sync is None or async_ is None:
+                self.stdout.write(f"{name:<14}{'no requests':>20}")
+                continue
+            self.stdout.write(
+                f"{name:<14}{sync['rps']:>10}{async_['rps']:>11}{sync['p95_ms']:>10}{async_['p95_ms']:>11}"
+                f"{sync['errors'] + async_['errors']:>9}"
+            )
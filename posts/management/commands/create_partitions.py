@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from posts.partitioning import PARTITIONED_TABLES, ensure_partitions, is_partitioned, list_partitions, partition_tables
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the coming months' partitions of posts and comments. The "
+        "create_partitions Celery task does this daily."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months-ahead', type=int, default=settings.PARTITION_MONTHS_AHEAD)
+        parser.add_argument(
+            '--convert', action='store_true',
+            help="Partition the tables first if they aren't. Locks them while their rows are copied.",
+        )
+
+    def handle(self, *args, **options):
+        if options['convert']:
+            for table in partition_tables():
+                self.stdout.write(f"Partitioned {table}")
+        elif not any(is_partitioned(table) for table in PARTITIONED_TABLES):
+            raise CommandError("The tables aren't partitioned; run with --convert to partition them.")
+
+        for name in ensure_partitions(options['months_ahead']):
+            self.stdout.write(f"Created {name}")
+        for table in PARTITIONED_TABLES:
+            months = [f"{month:%Y-%m}" for _, month in list_partitions(table)]
+            if months:
+                self.stdout.write(f"{table}: {months[0]} to {months[-1]} ({len(months)} partitions)")
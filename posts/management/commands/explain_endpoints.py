@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from posts.explain import run
+from posts.loadtest import clear, seed
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN (ANALYZE, BUFFERS) every query of the read endpoints in posts.urls and list "
+        "the scans and indexes they use. Seed a dataset first with --seed-posts for "
+        "reproducible plans."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed-posts', type=int, default=0, help="Seed this many load-test posts first.")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed of the dataset.")
+        parser.add_argument('--clear', action='store_true', help="Delete the previous load-test data first.")
+        parser.add_argument(
+            '--seq-scan-rows', type=int, default=1000,
+            help="Flag sequential scans reading more rows than this.",
+        )
+        parser.add_argument('--plans', action='store_true', help="Print every full plan too.")
+        parser.add_argument(
+            '--fail-on-seq-scan', action='store_true',
+            help="Exit with an error when a sequential scan is flagged, for CI.",
+        )
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            self.stdout.write(f"Deleted {clear()} rows of previous load-test data.")
+        if options['seed_posts']:
+            created = seed(
+                users=max(options['seed_posts'] // 100, 1),
+                posts=options['seed_posts'],
+                categories=20,
+                random_seed=options['seed'],
+            )
+            self.stdout.write(f"Seeded {created['posts']} posts and {created['comments']} comments.")
+        # Fresh statistics and visibility maps, so plans don't depend on
+        # when autovacuum last ran and index-only scans skip the heap.
+        # VACUUM can't run in a transaction, ANALYZE alone can.
+        command = 'ANALYZE' if connection.in_atomic_block else 'VACUUM ANALYZE'
+        with connection.cursor() as cursor:
+            for table in ('posts_post', 'posts_comment', 'posts_post_categories', 'posts_category', 'authentication_user'):
+                cursor.execute(f'{command} {connection.ops.quote_name(table)}')
+
+        try:
+            flagged = run(self.stdout, seq_scan_rows=options['seq_scan_rows'], plans=options['plans'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if not flagged:
+            self.stdout.write(self.style.SUCCESS("\nNo sequential scans of large tables."))
+            return
+        self.stdout.write(self.style.WARNING(f"\n{len(flagged)} sequential scans of large tables:"))
+        for path, scan in flagged:
+            self.stdout.write(f"  GET {path}: {scan}")
+        if options['fail_on_seq_scan']:
+            raise CommandError("Sequential scans of large tables found.")
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from posts.models import Post
+from posts.serializers import PostExportSerializer
+from posts.streaming import DEFAULT_CHUNK_SIZE, iter_ndjson
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream every post as NDJSON in the format import_posts reads. Timestamps "
+        "survive the round trip; ids don't."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help="File to write to. Defaults to stdout.")
+        parser.add_argument('--author', help="Only export posts by this username.")
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        posts = Post.objects.select_related('author').prefetch_related('categories').order_by('id')
+        if options['author']:
+            posts = posts.filter(author__username=options['author'])
+
+        rows = iter_ndjson(posts, PostExportSerializer, chunk_size=options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                output.writelines(rows)
+        else:
+            for row in rows:
+                self.stdout.write(row, ending='')
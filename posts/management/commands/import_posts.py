@@ -0,0 +1,33 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from authentication.models import User
+from posts.bulk import IMPORT_BATCH_SIZE, import_posts
+
+
+class Command(BaseCommand):
+    help = "Import posts from an NDJSON file, one post per line."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="NDJSON file to read, or '-' for stdin.")
+        parser.add_argument('--author', help="Username used for rows without an author.")
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        default_author = None
+        if options['author']:
+            try:
+                default_author = User.objects.get(username=options['author'])
+            except User.DoesNotExist:
+                raise CommandError(f"No user with username {options['author']!r}.")
+
+        if options['path'] == '-':
+            report = import_posts(sys.stdin, default_author=default_author, batch_size=options['batch_size'])
+        else:
+            with open(options['path'], encoding='utf-8') as lines:
+                report = import_posts(lines, default_author=default_author, batch_size=options['batch_size'])
+
+        for error in report['errors']:
+            self.stderr.write(f"line {error['line']}: {error['errors']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {report['created']} posts, {report['failed']} rows failed."
+        ))
@@ -0,0 +1,59 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from posts.loadtest import WORKLOADS, compare, run
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay a mixed read/write workload against a running server and report "
+        "latency percentiles, RPS and queries per request for each endpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://localhost:8000')
+        parser.add_argument('--profile', choices=sorted(WORKLOADS), default='mixed')
+        parser.add_argument('--concurrency', type=int, default=10)
+        parser.add_argument('--duration', type=int, default=30, help="Seconds to run for.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help="Write the results as JSON to this file.")
+        parser.add_argument('--compare', help="JSON results of an earlier run to check for regressions.")
+        parser.add_argument('--threshold', type=float, default=10.0,
+                            help="Percent increase in p95 latency or queries that counts as a regression.")
+
+    def handle(self, *args, **options):
+        try:
+            results = run(
+                options['base_url'],
+                profile=options['profile'],
+                concurrency=options['concurrency'],
+                duration=options['duration'],
+                random_seed=options['seed'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(
+            f"{results['profile']}: {results['requests']} requests in {results['duration']}s "
+            f"({results['rps']} rps, concurrency {results['concurrency']})"
+        )
+        self.stdout.write(f"{'endpoint':<22}{'requests':>9}{'errors':>8}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'queries':>9}")
+        for endpoint, stats in results['endpoints'].items():
+            queries = '-' if stats['queries_per_request'] is None else stats['queries_per_request']
+            self.stdout.write(
+                f"{endpoint:<22}{stats['requests']:>9}{stats['errors']:>8}{stats['rps']:>9}"
+                f"{stats['p50_ms']:>9}{stats['p95_ms']:>9}{stats['p99_ms']:>9}{queries:>9}"
+            )
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as baseline:
+                regressions = compare(json.load(baseline), results, threshold=options['threshold'])
+            for endpoint, metric, before, after in regressions:
+                self.stderr.write(f"{endpoint}: {metric} {before} -> {after}")
+            if regressions:
+                raise CommandError(f"{len(regressions)} regressions over {options['threshold']}%.")
+            self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
@@ -0,0 +1,157 @@
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils import timezone
+from elasticsearch.helpers import bulk, parallel_bulk
+from posts.documents import PostDocument
+from posts.indexing import INDEX_CHUNK_SIZE, enqueue_posts, find_drift, iter_posts_by_id
+from posts.models import Post
+from posts.replicas import replica_reads
+from posts.tasks import build_search_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the posts search index without downtime: build a new versioned "
+        "index in parallel, then point the alias at it in one atomic step."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help="Parallel _bulk request threads.")
+        parser.add_argument('--chunk-size', type=int, default=INDEX_CHUNK_SIZE)
+        parser.add_argument('--if-missing', action='store_true', help="Only build when the alias doesn't exist yet.")
+        parser.add_argument('--keep-old', action='store_true', help="Keep the previous index after switching.")
+        parser.add_argument(
+            '--queue', action='store_true',
+            help="With --if-missing, queue the build on a Celery worker instead of running it here.",
+        )
+
+    def handle(self, *args, **options):
+        if options['queue']:
+            if not options['if_missing']:
+                raise CommandError("--queue only supports --if-missing builds.")
+            build_search_index.delay()
+            self.stdout.write("Queued a search index build.")
+            return
+
+        client = PostDocument._get_connection()
+        alias = PostDocument._index._name
+
+        if options['if_missing'] and client.indices.exists(index=alias):
+            self.stdout.write(f"'{alias}' already exists, skipping rebuild.")
+            return
+
+        started_at = timezone.now()
+        new_index = f"{alias}-{started_at:%Y%m%d%H%M%S}"
+        # Replicas and refreshes are pointless while the index is unreadable
+        index = PostDocument._index.clone(name=new_index)
+        index.settings(number_of_replicas=0, refresh_interval='-1')
+        index.create()
+        self.stdout.write(f"Building '{new_index}' with {options['workers']} workers")
+
+        # The full scan reads from a replica when one is usable
+        with replica_reads() as database:
+            indexed, failed = self.fill(client, new_index, options['workers'], options['chunk_size'], database)
+
+        client.indices.put_settings(
+            index=new_index,
+            body={'index': {'number_of_replicas': None, 'refresh_interval': None}},
+        )
+        client.indices.refresh(index=new_index)
+
+        # Posts deleted during the build were only removed from the old
+        # index. Compare against the primary before anything searches it.
+        missing, stale = find_drift(index=new_index)
+        if stale:
+            self.remove_stale(client, new_index, stale)
+
+        old_indices = self.switch_alias(client, alias, new_index, keep_old=options['keep_old'])
+        self.stdout.write(self.style.SUCCESS(
+            f"'{alias}' now points at '{new_index}' ({indexed} indexed, {failed} failed)"
+        ))
+        if old_indices and options['keep_old']:
+            self.stdout.write(f"Kept previous indices: {', '.join(old_indices)}")
+
+        # Saves during the build went to the old index; replay them. Read
+        # from the primary, which a replica may not have caught up with.
+        # A replica may also have been up to REPLICA_MAX_LAG behind when the
+        # build started, so saves from just before then are replayed too.
+        replay_from = started_at
+        if database:
+            replay_from -= timedelta(seconds=settings.REPLICA_MAX_LAG)
+        changed = Post.objects.filter(updated_on__gte=replay_from).values_list('id', flat=True)
+        enqueue_posts(missing)
+        enqueue_posts(changed)
+
+    def fill(self, client, index_name, workers, chunk_size, database=None):
+        document = PostDocument()
+        total = Post.objects.using(database).count()
+
+        def actions():
+            # parallel_bulk pulls from this generator on its own thread, so
+            # that thread's database connection is closed when we're done.
+            # Routing doesn't follow it there, hence the explicit database.
+            try:
+                for post in iter_posts_by_id(chunk_size, using=database):
+                    yield {'_index': index_name, '_id': post.pk, '_source': document.prepare(post)}
+            finally:
+                thread_connection = connections[database or DEFAULT_DB_ALIAS]
+                if not thread_connection.in_atomic_block:
+                    thread_connection.close()
+
+        indexed = failed = 0
+        started = time.monotonic()
+        report_every = chunk_size * workers
+        results = parallel_bulk(
+            client, actions(), thread_count=workers, chunk_size=chunk_size, raise_on_error=False,
+        )
+        for ok, info in results:
+            if ok:
+                indexed += 1
+            else:
+                failed += 1
+                self.stderr.write(f"Failed to index: {info}")
+
+            done = indexed + failed
+            if done % report_every == 0 or done == total:
+                elapsed = time.monotonic() - started
+                rate = done / elapsed if elapsed else 0.0
+                eta = (total - done) / rate if rate else 0.0
+                self.stdout.write(f"{done}/{total} posts, {rate:.0f} docs/s, eta {eta:.0f}s")
+
+        return indexed, failed
+
+    def remove_stale(self, client, index_name, post_ids):
+        actions = ({'_op_type': 'delete', '_index': index_name, '_id': post_id} for post_id in post_ids)
+        _, errors = bulk(client, actions, raise_on_error=False)
+        # Already gone is as good as deleted
+        errors = [error for error in errors if error.get('delete', {}).get('status') != 404]
+        if errors:
+            raise CommandError(f"Failed to remove {len(errors)} deleted posts from '{index_name}': {errors[:5]}")
+        self.stdout.write(f"Removed {len(post_ids)} posts deleted during the build")
+
+    def switch_alias(self, client, alias, new_index, keep_old=False):
+        """
+        Point ``alias`` at ``new_index`` in a single _aliases call, so search
+        never sees an empty or missing index. Returns the previous indices.
+        """
+        actions = [{'add': {'index': new_index, 'alias': alias}}]
+        old_indices = []
+
+        if client.indices.exists_alias(name=alias):
+            old_indices = list(client.indices.get_alias(name=alias))
+            for old_index in old_indices:
+                actions.append({'remove': {'index': old_index, 'alias': alias}})
+        elif client.indices.exists(index=alias):
+            # Indices created before the alias existed carry the alias name,
+            # and have to be dropped in the same call to free the name
+            actions.append({'remove_index': {'index': alias}})
+
+        client.indices.update_aliases(body={'actions': actions})
+
+        if not keep_old:
+            for old_index in old_indices:
+                client.indices.delete(index=old_index, ignore_unavailable=True)
+        return old_indices
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from posts.indexing import INDEX_CHUNK_SIZE, IndexingError, chunked, find_drift, sync_posts
+
+
+class Command(BaseCommand):
+    help = "Compare post ids in the database and Elasticsearch, and optionally repair the difference."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help="Index missing posts and delete stale documents.")
+
+    def handle(self, *args, **options):
+        missing, stale = find_drift()
+        self.stdout.write(f"missing from index: {len(missing)}")
+        self.stdout.write(f"stale in index: {len(stale)}")
+
+        if options['fix'] and (missing or stale):
+            # sync_posts indexes ids that exist and deletes the ones that don't
+            failed = []
+            for chunk in chunked(sorted(missing | stale), INDEX_CHUNK_SIZE):
+                try:
+                    sync_posts(chunk)
+                except IndexingError as e:
+                    failed += e.post_ids
+            if failed:
+                raise CommandError(f"Elasticsearch rejected {len(failed)} documents: {sorted(failed)[:20]}")
+            self.stdout.write(self.style.SUCCESS(f"Repaired {len(missing) + len(stale)} documents."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from posts.indexing import queue_stats
+
+
+class Command(BaseCommand):
+    help = "Show how many posts are waiting to be indexed and how long the oldest has waited."
+
+    def handle(self, *args, **options):
+        stats = queue_stats()
+        self.stdout.write(f"depth: {stats['depth']}")
+        self.stdout.write(f"lag_seconds: {stats['lag_seconds']:.1f}")
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from posts.loadtest import SEED_BATCH_SIZE, clear, seed
+
+
+class Command(BaseCommand):
+    help = "Bulk-create a synthetic dataset of loadtest- users, posts, categories and comments."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=5000)
+        parser.add_argument('--categories', type=int, default=20)
+        parser.add_argument('--comments-per-post', type=int, default=5, help="Average comments per post.")
+        parser.add_argument('--batch-size', type=int, default=SEED_BATCH_SIZE)
+        parser.add_argument('--seed', type=int, default=0, help="Random seed, for reproducible datasets.")
+        parser.add_argument('--clear', action='store_true', help="Delete the previous load-test data first.")
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            self.stdout.write(f"Deleted {clear()} rows of previous load-test data.")
+
+        created = seed(
+            users=options['users'],
+            posts=options['posts'],
+            categories=options['categories'],
+            comments_per_post=options['comments_per_post'],
+            batch_size=options['batch_size'],
+            random_seed=options['seed'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {created['users']} users, {created['posts']} posts and {created['comments']} comments "
+            f"in {created['categories']} categories."
+        ))
+        self.stdout.write("Run `manage.py rebuild_search_index` to index the new posts.")
@@ -0,0 +1,46 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from posts.loadtest import benchmark_startup
+
+
+class Command(BaseCommand):
+    help = (
+        "Start the server, report how long it takes to answer its first request, "
+        "then measure requests per second against one endpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--command', default='gunicorn -c gunicorn.conf.py',
+                            help="Command that starts the server, e.g. 'python manage.py runserver --noreload'.")
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+        parser.add_argument('--path', default='/api/v2/posts/')
+        parser.add_argument('--concurrency', type=int, default=10)
+        parser.add_argument('--duration', type=int, default=10, help="Seconds to run for.")
+        parser.add_argument('--timeout', type=int, default=60, help="Seconds to wait for the server to start.")
+        parser.add_argument('--output', help="Write the results as JSON to this file.")
+
+    def handle(self, *args, **options):
+        try:
+            results = benchmark_startup(
+                options['command'],
+                options['base_url'],
+                path=options['path'],
+                concurrency=options['concurrency'],
+                duration=options['duration'],
+                startup_timeout=options['timeout'],
+            )
+        except RuntimeError as e:
+            raise CommandError(str(e))
+
+        stats = results['endpoint']
+        self.stdout.write(f"{results['command']}: answered in {results['cold_start_seconds']}s")
+        self.stdout.write(
+            f"{options['path']}: {results['requests']} requests in {results['duration']}s "
+            f"({results['rps']} rps, concurrency {results['concurrency']}, {stats['errors']} errors) "
+            f"p50 {stats['p50_ms']}ms p95 {stats['p95_ms']}ms p99 {stats['p99_ms']}ms"
+        )
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
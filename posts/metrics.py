@@ -0,0 +1,217 @@
+"""
+Prometheus metrics for the API, the ORM, serializers, search and Celery,
+served at /metrics. Requests are recorded by
+posts.middleware.PrometheusMiddleware.
+
+Under gunicorn or uvicorn workers set PROMETHEUS_MULTIPROC_DIR to an empty
+directory shared by the workers; every process then writes its samples
+there and /metrics aggregates them. gunicorn.conf.py clears the
+directory on start, and its child_exit hook drops the live gauges of
+workers that exit. Without it the metrics of the current process are
+served.
+"""
+import os
+import time
+from celery.signals import task_postrun, task_prerun, worker_init, worker_process_shutdown
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    start_http_server,
+)
+from prometheus_client.core import GaugeMetricFamily
+import logging
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+REQUEST_SECONDS = Histogram(
+    'http_request_duration_seconds', "Request latency by URL name.",
+    ['view', 'method', 'status'], buckets=LATENCY_BUCKETS,
+)
+REQUEST_DB_QUERIES = Histogram(
+    'http_request_db_queries', "Database queries issued per request.",
+    ['view'], buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100),
+)
+REQUEST_DB_SECONDS = Histogram(
+    'http_request_db_seconds', "Time spent in database queries per request.",
+    ['view'], buckets=LATENCY_BUCKETS,
+)
+SERIALIZER_SECONDS = Histogram(
+    'serializer_seconds', "Time spent building serializer output.",
+    ['serializer'], buckets=LATENCY_BUCKETS,
+)
+SEARCH_SECONDS = Histogram(
+    'search_request_seconds', "Latency of Elasticsearch calls.",
+    ['operation'], buckets=LATENCY_BUCKETS,
+)
+LOOKUP_CACHE_LOOKUPS = Counter(
+    'lookup_cache_lookups', "Keys resolved by the lookup caches, by the tier that answered.",
+    ['cache', 'tier'],
+)
+CELERY_TASK_SECONDS = Histogram(
+    'celery_task_seconds', "Celery task runtime.",
+    ['task', 'state'], buckets=(0.01, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+
+# Summed over the live worker processes in multi-process mode
+DB_POOL_CONNECTIONS = Gauge(
+    'db_pool_connections', "Connections in the database pool, open or available.",
+    ['state'], multiprocess_mode='livesum',
+)
+DB_POOL_WAITING = Gauge(
+    'db_pool_waiting_requests', "Requests waiting for a pooled connection.",
+    multiprocess_mode='livesum',
+)
+DB_POOL_REQUESTS = Counter('db_pool_requests', "Connections handed out by the pool.")
+DB_POOL_WAIT_SECONDS = Counter('db_pool_wait_seconds', "Time spent waiting for a pooled connection.")
+DB_POOL_ERRORS = Counter(
+    'db_pool_errors', "Pool failures: timeouts waiting for a connection, failed or lost connections.",
+    ['kind'],
+)
+DB_REPLICA_LAG = Gauge(
+    'db_replica_lag_seconds', "Replication lag of each read replica when last checked.",
+    ['alias'], multiprocess_mode='livemax',
+)
+# get_stats() keys of psycopg_pool counted in DB_POOL_ERRORS
+POOL_ERROR_STATS = {
+    'requests_errors': 'timeout',
+    'connections_errors': 'connect',
+    'connections_lost': 'lost',
+    'returns_bad': 'bad_return',
+}
+
+
+def record_pool_stats():
+    """
+    Copy the counters of this process's connection pool into the metrics.
+    psycopg_pool's pop_stats() resets them, so each is counted once.
+    """
+    pool = connections['default'].pool
+    if pool is None:
+        return
+    stats = pool.pop_stats()
+    DB_POOL_CONNECTIONS.labels('open').set(stats.get('pool_size', 0))
+    DB_POOL_CONNECTIONS.labels('available').set(stats.get('pool_available', 0))
+    DB_POOL_WAITING.set(stats.get('requests_waiting', 0))
+    DB_POOL_REQUESTS.inc(stats.get('requests_num', 0))
+    DB_POOL_WAIT_SECONDS.inc(stats.get('requests_wait_ms', 0) / 1000)
+    for key, kind in POOL_ERROR_STATS.items():
+        if stats.get(key):
+            DB_POOL_ERRORS.labels(kind).inc(stats[key])
+
+
+def get_registry():
+    """
+    The registry to expose: the samples of every worker process in
+    multi-process mode, otherwise this process's.
+    """
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+class QueueCollector:
+    """
+    Queue depths read from Redis at scrape time: Celery's queues and the
+    search indexing queue (see posts.indexing).
+    """
+
+    def collect(self):
+        from posts.indexing import get_redis, queue_stats
+
+        celery_depth = GaugeMetricFamily('celery_queue_depth', "Messages waiting in a Celery queue.", labels=['queue'])
+        try:
+            client = get_redis()
+            for queue in settings.METRICS_CELERY_QUEUES:
+                celery_depth.add_metric([queue], client.llen(queue))
+            stats = queue_stats()
+        except Exception as e:
+            logger.error(f"Failed to read queue depths: {e}")
+            return
+        yield celery_depth
+        yield GaugeMetricFamily('search_index_queue_depth', "Posts waiting to be indexed.", value=stats['depth'])
+        yield GaugeMetricFamily(
+            'search_index_queue_lag_seconds', "Age of the oldest post waiting to be indexed.",
+            value=stats['lag_seconds'],
+        )
+
+
+# Queue depths are shared by every process, so they are read once per
+# scrape instead of being written to the multi-process files.
+_queue_registry = CollectorRegistry()
+_queue_registry.register(QueueCollector())
+
+
+def metrics_view(request):
+    record_pool_stats()
+    output = generate_latest(get_registry()) + generate_latest(_queue_registry)
+    return HttpResponse(output, content_type=CONTENT_TYPE_LATEST)
+
+
+class SerializerMetricsMixin:
+    """
+    Times ``.data`` of a serializer; list serializers are labelled with
+    their child's class name.
+    """
+
+    @property
+    def data(self):
+        child = getattr(self, 'child', None)
+        name = type(child if child is not None else self).__name__
+        with SERIALIZER_SECONDS.labels(name).time():
+            return super().data
+
+
+@task_prerun.connect
+def _task_started(task_id=None, task=None, **kwargs):
+    task.request._metrics_started = time.perf_counter()
+
+
+@task_postrun.connect
+def _task_finished(task_id=None, task=None, state=None, **kwargs):
+    started = getattr(task.request, '_metrics_started', None)
+    if started is not None:
+        CELERY_TASK_SECONDS.labels(task.name, state or 'UNKNOWN').observe(time.perf_counter() - started)
+
+
+@worker_init.connect
+def _serve_worker_metrics(**kwargs):
+    """
+    Celery workers aren't behind /metrics, so they serve their own on
+    CELERY_METRICS_PORT. Tasks run in the pool's child processes while
+    this server runs in the parent, so it needs PROMETHEUS_MULTIPROC_DIR
+    to see their samples; files left by a previous run are removed first.
+    """
+    port = settings.CELERY_METRICS_PORT
+    if not port:
+        return
+    directory = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if directory:
+        own_suffix = f'_{os.getpid()}.db'
+        for name in os.listdir(directory):
+            if not name.endswith(own_suffix):
+                os.remove(os.path.join(directory, name))
+    else:
+        logger.warning("PROMETHEUS_MULTIPROC_DIR isn't set; task metrics of pool processes won't be served")
+    start_http_server(port, registry=get_registry())
+
+
+@worker_process_shutdown.connect
+def _forget_worker_process(pid=None, **kwargs):
+    """
+    Drop the live gauge samples of a pool process that exited.
+    """
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(pid or os.getpid())
@@ -0,0 +1,125 @@
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from posts.metrics import REQUEST_DB_QUERIES, REQUEST_DB_SECONDS, REQUEST_SECONDS, record_pool_stats
+
+# Statements issued by profilers rather than by the view
+PROFILER_PREFIXES = ('EXPLAIN', 'SAVEPOINT', 'RELEASE SAVEPOINT')
+
+
+def is_app_query(sql):
+    return not sql.startswith(PROFILER_PREFIXES) and 'silk_' not in sql
+
+
+def timed_connections():
+    # Reads of safe requests may go to a replica, see posts.replicas
+    return [connections[alias] for alias in ('default', *settings.DATABASE_REPLICAS)]
+
+
+def install_timer(timer):
+    for db in timed_connections():
+        db.execute_wrappers.append(timer)
+
+
+def uninstall_timer(timer):
+    for db in timed_connections():
+        db.execute_wrappers.remove(timer)
+
+
+class QueryTimer:
+    """
+    Execute wrapper counting and timing the queries a request issues.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        if not is_app_query(sql):
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.seconds += time.perf_counter() - started
+
+
+class RequestTimingMiddleware:
+    """
+    Base for middleware that wraps the request in a QueryTimer. Works in
+    both sync and async chains so async views aren't pushed into a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        timer = QueryTimer()
+        started = time.perf_counter()
+        install_timer(timer)
+        try:
+            response = self.get_response(request)
+        finally:
+            uninstall_timer(timer)
+        return self.process(request, response, timer, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        # Connections are per thread and the async ORM runs its queries in
+        # the request's sync thread, so the wrapper is installed there.
+        timer = QueryTimer()
+        started = time.perf_counter()
+        await sync_to_async(install_timer)(timer)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(uninstall_timer)(timer)
+        return self.process(request, response, timer, time.perf_counter() - started)
+
+    def process(self, request, response, timer, elapsed):
+        return response
+
+
+class QueryCountMiddleware(RequestTimingMiddleware):
+    """
+    Reports the number of database queries a request issued in an
+    ``X-Query-Count`` header, for the load-test harness (see
+    posts.loadtest). Enabled with QUERY_COUNT_HEADER; it works without
+    DEBUG because it counts through an execute wrapper.
+    """
+
+    def __init__(self, get_response):
+        if not settings.QUERY_COUNT_HEADER:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def process(self, request, response, timer, elapsed):
+        response['X-Query-Count'] = str(timer.queries)
+        return response
+
+
+class PrometheusMiddleware(RequestTimingMiddleware):
+    """
+    Records the latency, query count and query time of every request in
+    the histograms of posts.metrics, labelled with the URL name, and the
+    state of the connection pool after it.
+    """
+
+    def process(self, request, response, timer, elapsed):
+        match = request.resolver_match
+        view = match.url_name if match and match.url_name else '<unresolved>'
+        REQUEST_SECONDS.labels(view, request.method, response.status_code).observe(elapsed)
+        REQUEST_DB_QUERIES.labels(view).observe(timer.queries)
+        REQUEST_DB_SECONDS.labels(view).observe(timer.seconds)
+        record_pool_stats()
+        return response
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.2 on 2026-10-18 20:41
+
+from django.db import migrations
+from django.db.models.functions import Lower
+
+
+def merge_duplicate_categories(apps, schema_editor):
+    """
+    Lowercase every category name and fold case-insensitive duplicates into
+    the oldest row, moving their post links across, so the unique index can
+    be created.
+    """
+    Category = apps.get_model('posts', 'Category')
+    Through = apps.get_model('posts', 'Post').categories.through
+
+    kept = {}
+    for category in Category.objects.annotate(lower_name=Lower('name')).order_by('id'):
+        if category.lower_name not in kept:
+            kept[category.lower_name] = category
+            if category.name != category.lower_name:
+                Category.objects.filter(pk=category.pk).update(name=category.lower_name)
+            continue
+
+        survivor = kept[category.lower_name]
+        linked = set(Through.objects.filter(category_id=survivor.pk).values_list('post_id', flat=True))
+        Through.objects.filter(category_id=category.pk).exclude(post_id__in=linked).update(category_id=survivor.pk)
+        category.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0004_comment_comment_post_created_on_id_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_categories, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.1.2 on 2026-10-18 21:19
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_comment_counters(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+
+    comments = Comment.objects.filter(post=OuterRef('pk')).order_by()
+    counts = comments.values('post').annotate(count=Count('id')).values('count')
+    latest = comments.order_by('-created_on').values('created_on')[:1]
+    Post.objects.filter(id__in=Comment.objects.values('post_id')).update(
+        comment_count=Coalesce(Subquery(counts), 0),
+        last_commented_on=Subquery(latest),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_category_name_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='last_commented_on',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_comment_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.2 on 2026-10-18 21:32
+
+from django.db import migrations
+from posts.checks import CREATE_TRIGRAM_INDEX_SQL, DROP_TRIGRAM_INDEX_SQL
+
+
+class Migration(migrations.Migration):
+    """
+    The index isn't in the model state: it's created only where pg_trgm is
+    available. See posts.checks.
+    """
+
+    dependencies = [
+        ('posts', '0008_post_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_TRIGRAM_INDEX_SQL, DROP_TRIGRAM_INDEX_SQL),
+    ]
@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.db import migrations
+from posts.partitioning import PARTITIONED_TABLES, is_partitioned, partition_tables, unpartition_table
+
+
+def partition(apps, schema_editor):
+    """
+    Partition posts and comments by month when POSTS_PARTITIONING is on.
+    The tables keep their shape, so the migration state doesn't change.
+    """
+    if settings.POSTS_PARTITIONING:
+        partition_tables(schema_editor.connection.alias)
+
+
+def unpartition(apps, schema_editor):
+    using = schema_editor.connection.alias
+    posts_were_partitioned = is_partitioned('posts_post', using)
+    for table in reversed(PARTITIONED_TABLES):
+        if is_partitioned(table, using):
+            unpartition_table(table, using)
+    if not posts_were_partitioned:
+        return
+
+    # Restore the foreign keys that partitioning posts dropped
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    for model in (Comment, Post.categories.through):
+        field = model._meta.get_field('post')
+        schema_editor.execute(schema_editor._create_fk_sql(model, field, '_fk_%(to_table)s_%(to_column)s'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_category_name_trgm_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition, unpartition),
+    ]
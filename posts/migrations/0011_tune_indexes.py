@@ -0,0 +1,58 @@
+# Generated by Django 5.1.2 on 2026-10-18 22:49
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# The foreign key indexes on posts_comment.post_id and posts_post.author_id
+# are the leading column of comment_post_created_on_id_idx and
+# post_author_created_on_id_idx, which serve every lookup they did. They
+# are dropped by name: altering the fields would also drop and re-add, and
+# so revalidate, the foreign keys, one of which partitioning removes.
+#
+# The link table is Django's own, so its indexes are managed here rather
+# than in model state. Its unique (post_id, category_id) index serves
+# lookups by post; lookups by category get the mirror image, which answers
+# them from the index alone.
+INDEXES_SQL = """
+    CREATE INDEX IF NOT EXISTS post_categories_category_post_idx ON posts_post_categories (category_id, post_id);
+    DROP INDEX IF EXISTS posts_post_categories_category_id_159f5c54;
+    DROP INDEX IF EXISTS posts_post_categories_post_id_0ca7af15;
+    DROP INDEX IF EXISTS posts_comment_post_id_e81436d7;
+    DROP INDEX IF EXISTS posts_post_author_id_fe5487bf;
+"""
+REVERSE_INDEXES_SQL = """
+    CREATE INDEX IF NOT EXISTS posts_post_author_id_fe5487bf ON posts_post (author_id);
+    CREATE INDEX IF NOT EXISTS posts_comment_post_id_e81436d7 ON posts_comment (post_id);
+    CREATE INDEX IF NOT EXISTS posts_post_categories_post_id_0ca7af15 ON posts_post_categories (post_id);
+    CREATE INDEX IF NOT EXISTS posts_post_categories_category_id_159f5c54 ON posts_post_categories (category_id);
+    DROP INDEX IF EXISTS post_categories_category_post_idx;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_partition_posts_and_comments'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(INDEXES_SQL, REVERSE_INDEXES_SQL),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='comment',
+                    name='post',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='comments', to='posts.post'),
+                ),
+                migrations.AlterField(
+                    model_name='post',
+                    name='author',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='user_posts', to=settings.AUTH_USER_MODEL),
+                ),
+            ],
+        ),
+    ]
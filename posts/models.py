@@ -1,44 +1,248 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, SearchVectorField
 from django.db import models
+from django.db.models import F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Cast, Coalesce, Greatest, Lower
 from authentication.models import User
 
 # Create your models here.
 
+# How many of the newest comments are embedded in a post's detail payload.
+RECENT_COMMENTS_LIMIT = 5
+
+# Text search configuration for Post.search_vector and the queries against it.
+SEARCH_CONFIG = 'english'
+
+class CategoryManager(models.Manager):
+    def resolve(self, names):
+        """
+        Return the categories for ``names``, creating the missing ones.
+
+        Names are normalised to lowercase. Existing rows are found with one
+        lookup and the rest are inserted with one bulk_create; conflicts from
+        concurrent writers are ignored and the winners re-read.
+        """
+        names = {name.lower() for name in names}
+        if not names:
+            return []
+
+        categories = list(self.filter(name__in=names))
+        missing = names - {category.name for category in categories}
+        if missing:
+            from posts.signals import invalidate_category_lookups
+
+            self.bulk_create([Category(name=name) for name in missing], ignore_conflicts=True)
+            # bulk_create sends no post_save
+            invalidate_category_lookups(sender=Category)
+            categories += list(self.filter(name__in=missing))
+        return categories
+
+
 class Category(models.Model):
-    name = models.CharField(max_length=30)
+    name = models.CharField(max_length=30, unique=True)
+    
+    objects = CategoryManager()
     
     class  Meta:
         verbose_name = 'Category'
         verbose_name_plural = 'Categories'
+        # Substring search on names (LIKE '%term%') is served by a trigram
+        # index kept outside the model state, see posts.checks
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        self.name = self.name.lower()
+        super().save(*args, **kwargs)
+
+
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """
+        Columns needed by HomePostSerializer. Usernames come from the lookup
+        cache in posts.lookups, so the author table isn't joined.
+        """
+        return self.only(
+            'id', 'title', 'body', 'created_on', 'updated_on', 'author_id',
+            'comment_count', 'last_commented_on',
+        )
+
+    def for_detail(self, comments_limit=RECENT_COMMENTS_LIMIT):
+        """
+        Everything PostSerializer reads: categories and only the newest
+        ``comments_limit`` comments.
+
+        The sliced Prefetch is a single windowed query however many posts
+        are loaded, so popular posts no longer pull every comment.
+        """
+        recent_comments = Comment.objects.order_by('-created_on', '-id')
+        return self.defer('search_vector').prefetch_related(
+            'categories',
+            models.Prefetch('comments', queryset=recent_comments[:comments_limit], to_attr='recent_comments'),
+        )
+
+    def for_owner(self, user):
+        return self.filter(author=user).for_detail()
+
+    def by_author(self, username):
+        """
+        Posts by ``username``, matched case-insensitively.
+
+        LOWER(username) is served by the functional index on User, and
+        filtering on the author id keeps the (author, created_on, id)
+        index usable for the page itself.
+        """
+        authors = User.objects.annotate(username_lower=Lower('username')).filter(username_lower=username.lower())
+        return self.filter(author__in=authors.values('id'))
+
+    def search(self, text):
+        """
+        Posts matching ``text`` (web search syntax: quotes, ``or``, ``-``),
+        annotated with ``rank``. The match uses the GIN index on
+        search_vector; titles weigh more than bodies in the rank.
+
+        ts_rank returns a real; it is widened to double precision so a rank
+        round-trips through a pagination cursor unchanged.
+        """
+        query = SearchQuery(text, search_type='websearch', config=SEARCH_CONFIG)
+        rank = Cast(SearchRank(F('search_vector'), query), models.FloatField())
+        return self.filter(search_vector=query).annotate(rank=rank)
+
+    def search_documents(self, text='', category_ids=()):
+        """
+        The posts PostDocumentView finds in Elasticsearch, found in Postgres:
+        those matching ``text`` most relevant first, or every post newest
+        first without it, limited to any of ``category_ids`` if given.
+        """
+        queryset = self.defer('search_vector').prefetch_related('categories')
+        if category_ids:
+            links = Post.categories.through.objects.filter(category_id__in=category_ids)
+            queryset = queryset.filter(id__in=links.values('post_id'))
+        if text:
+            return queryset.search(text).order_by('-rank', '-id')
+        return queryset.order_by('-created_on', '-id')
+
+    def record_comment(self, created_on):
+        """
+        Count a new comment in one atomic UPDATE. Postgres' GREATEST skips
+        NULL, so the first comment sets last_commented_on.
+        """
+        return self.update(
+            comment_count=F('comment_count') + 1,
+            last_commented_on=Greatest('last_commented_on', Value(created_on, output_field=models.DateTimeField())),
+        )
+
+    def forget_comment(self):
+        """
+        Uncount a comment that has just been deleted; the newest remaining
+        comment is looked up inside the same UPDATE.
+        """
+        return self.update(
+            comment_count=Greatest(F('comment_count') - 1, 0),
+            last_commented_on=_latest_comment_on(),
+        )
+
+    def with_comment_counter_drift(self):
+        """
+        Posts whose counters disagree with their comments.
+        """
+        posts = self.annotate(actual_count=_comment_count(), actual_last=_latest_comment_on())
+        return posts.filter(
+            ~Q(comment_count=F('actual_count'))
+            | Q(last_commented_on__isnull=True, actual_last__isnull=False)
+            | Q(last_commented_on__isnull=False, actual_last__isnull=True)
+            | Q(last_commented_on__lt=F('actual_last'))
+            | Q(last_commented_on__gt=F('actual_last'))
+        )
+
+    def reconcile_comment_counters(self):
+        """
+        Recount the drifted posts in this queryset and return how many were fixed.
+        """
+        post_ids = list(self.with_comment_counter_drift().values_list('id', flat=True))
+        if not post_ids:
+            return 0
+        return Post.objects.filter(id__in=post_ids).update(
+            comment_count=_comment_count(),
+            last_commented_on=_latest_comment_on(),
+        )
+
+
+def _comment_count():
+    counts = Comment.objects.filter(post=OuterRef('pk')).order_by().values('post').annotate(count=models.Count('id'))
+    return Coalesce(Subquery(counts.values('count')), 0)
+
+
+def _latest_comment_on():
+    latest = Comment.objects.filter(post=OuterRef('pk')).order_by('-created_on')
+    return Subquery(latest.values('created_on')[:1])
+
 
 class Post(models.Model):
    title = models.CharField(max_length=200) 
    body = models.TextField()
-   author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='user_posts')
+   # Indexed by post_author_created_on_id_idx, which starts with it.
+   author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='user_posts', db_index=False)
    categories = models.ManyToManyField(Category, related_name='posts')
    created_on = models.DateTimeField(auto_now_add=True)
    updated_on = models.DateTimeField(auto_now=True)
+   # Denormalised from comments; kept by the comment views and repaired by
+   # the reconcile_comment_counters task.
+   comment_count = models.PositiveIntegerField(default=0)
+   last_commented_on = models.DateTimeField(null=True, blank=True)
+   # Maintained by Postgres on every write, so it can't drift from the text.
+   search_vector = models.GeneratedField(
+       expression=(
+           SearchVector('title', weight='A', config=SEARCH_CONFIG)
+           + SearchVector('body', weight='B', config=SEARCH_CONFIG)
+       ),
+       output_field=SearchVectorField(),
+       db_persist=True,
+   )
+   
+   objects = PostQuerySet.as_manager()
    
    class Meta:
        ordering = ['-created_on']
+       indexes = [
+           # Keyset pagination over the feed and a user's own posts.
+           models.Index(fields=['-created_on', '-id'], name='post_created_on_id_idx'),
+           models.Index(fields=['author', '-created_on', '-id'], name='post_author_created_on_id_idx'),
+           GinIndex(fields=['search_vector'], name='post_search_vector_idx'),
+       ]
    
    def __str__(self):
        return f"{self.title} by {self.author}."
    
 
+class CommentQuerySet(models.QuerySet):
+    def of_post(self, post):
+        """
+        Comments on ``post``. A comment is never older than its post, and
+        saying so lets Postgres skip the older months when comments are
+        partitioned (see posts.partitioning).
+        """
+        return self.filter(post=post, created_on__gte=post.created_on)
+
+
 class Comment(models.Model):
-    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments')
+    # Indexed by comment_post_created_on_id_idx, which starts with it.
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments', db_index=False)
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name="user_comments")
     content = models.TextField()
     created_on = models.DateTimeField(auto_now_add=True)
     updated_on = models.DateTimeField(auto_now=True)
+
+    objects = CommentQuerySet.as_manager()
     
     def __str__(self) -> str:
         return f"Comment by {self.author.username} on {self.created_on}"
     
     class Meta:
        ordering = ['-created_on']
+       indexes = [
+           # Keyset pagination over a post's comments.
+           models.Index(fields=['post', '-created_on', '-id'], name='comment_post_created_on_id_idx'),
+       ]
    
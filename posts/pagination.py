@@ -1,6 +1,203 @@
-from rest_framework.pagination import PageNumberPagination
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination, PageNumberPagination, _reverse_ordering
 
 class SmallResultSetPagination(PageNumberPagination):
     page_size = 3 # Number of posts per page
     page_size_query_param = 'page_size'
-    max_page_size = 100
\ No newline at end of file
+    max_page_size = 100
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Cursor pagination keyed on the full (created_on, id) tuple.
+
+    DRF's CursorPagination only filters on the first ordering field and falls
+    back to an OFFSET for ties. Here the cursor carries every ordering value,
+    so each page is a single index range scan and no COUNT(*) is issued.
+    """
+    page_size = 3
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_on', '-id')
+    position_separator = '|'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.get_page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self.set_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        paginate_queryset() for async views, fetching the page with the
+        async ORM.
+        """
+        queryset = self.get_page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self.set_page([obj async for obj in queryset.aiterator()])
+
+    def get_page_queryset(self, queryset, request, view=None):
+        """
+        The queryset of the requested page plus one row, or None if
+        pagination is off.
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            self.reverse, self.current_position = False, None
+        else:
+            self.reverse, self.current_position = self.cursor.reverse, self.cursor.position
+
+        if self.reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if self.current_position is not None:
+            queryset = queryset.filter(self._get_keyset_filter(queryset, self.current_position, self.reverse))
+
+        # Fetch one extra row to find out whether another page follows.
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, results):
+        reverse, current_position = self.reverse, self.current_position
+        self.page = results[:self.page_size]
+
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(self.page[-1], self.ordering)
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = current_position is not None
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = current_position is not None
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if self.page:
+            position = self._get_position_from_instance(self.page[-1], self.ordering)
+        else:
+            position = self.next_position
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if self.page:
+            position = self._get_position_from_instance(self.page[0], self.ordering)
+        else:
+            position = self.previous_position
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for order in ordering:
+            field_name = order.lstrip('-')
+            if isinstance(instance, dict):
+                attr = instance[field_name]
+            else:
+                attr = getattr(instance, field_name)
+            values.append(attr.isoformat() if hasattr(attr, 'isoformat') else str(attr))
+        return self.position_separator.join(values)
+
+    def _get_ordering_field(self, queryset, field_name):
+        # Orderings may name annotations too, e.g. a search rank
+        annotation = queryset.query.annotations.get(field_name)
+        if annotation is not None:
+            return annotation.output_field
+        return queryset.model._meta.get_field(field_name)
+
+    def _get_keyset_filter(self, queryset, position, reverse):
+        """
+        Build ``(a, b) < (x, y)`` as ``a <= x AND (a < x OR (a = x AND b < y))``.
+
+        The leading range on the first column lets Postgres bound the scan of
+        the composite index instead of evaluating the OR row by row.
+        """
+        raw_values = position.split(self.position_separator)
+        if len(raw_values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        fields, values = [], []
+        for order, raw in zip(self.ordering, raw_values):
+            field_name = order.lstrip('-')
+            try:
+                value = self._get_ordering_field(queryset, field_name).to_python(raw)
+            except ValidationError:
+                raise NotFound(self.invalid_cursor_message)
+            if value is None:
+                raise NotFound(self.invalid_cursor_message)
+            lookup = 'lt' if reverse != order.startswith('-') else 'gt'
+            fields.append((field_name, lookup))
+            values.append(value)
+
+        keyset = Q()
+        for index, (field_name, lookup) in enumerate(fields):
+            condition = Q(**{f'{field_name}__{lookup}': values[index]})
+            for (previous_name, _), previous_value in zip(fields[:index], values[:index]):
+                condition &= Q(**{previous_name: previous_value})
+            keyset |= condition
+
+        leading_name, leading_lookup = fields[0]
+        return Q(**{f'{leading_name}__{leading_lookup}e': values[0]}) & keyset
+
+
+class SearchRankCursorPagination(KeysetCursorPagination):
+    """
+    Keyset pagination over search results, most relevant first.
+    """
+    page_size = 10
+    ordering = ('-rank', '-id')
+
+
+class CursorPaginationMixin:
+    """
+    Lets a list view switch to keyset pagination with ``?pagination=cursor``.
+
+    Follow-up pages are detected by the ``cursor`` query parameter, so the
+    ``next``/``previous`` links keep working without repeating the switch.
+    """
+    cursor_pagination_class = KeysetCursorPagination
+
+    def use_cursor_pagination(self):
+        params = self.request.query_params
+        return (
+            params.get('pagination') == 'cursor'
+            or self.cursor_pagination_class.cursor_query_param in params
+        )
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator') and self.use_cursor_pagination():
+            self._paginator = self.cursor_pagination_class()
+        return super().paginator
@@ -0,0 +1,350 @@
+"""
+Optional monthly range partitioning of posts and comments on created_on,
+enabled with POSTS_PARTITIONING.
+
+Reads mostly touch recent rows, so keeping each month in its own table
+keeps the hot indexes small, lets vacuum work month by month and lets old
+months be detached (see the archive_partitions command) instead of
+deleted. Queries bounded on created_on, such as keyset pages of the feed
+and Comment.objects.of_post(), only scan the partitions in range.
+
+Partitions are named ``<table>_pYYYY_MM`` and created ahead of time by
+ensure_partitions(), run daily by the create_partitions task; a row whose
+month has no partition can't be inserted.
+"""
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+
+# In this order: partitioning posts drops the foreign key comments have
+# on it, which comments would otherwise copy.
+PARTITIONED_TABLES = ('posts_post', 'posts_comment')
+PARTITION_KEY = 'created_on'
+
+
+def month_start(moment):
+    return datetime(moment.year, moment.month, 1, tzinfo=dt_timezone.utc)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(table, month):
+    return f'{table}_p{month:%Y_%m}'
+
+
+def is_partitioned(table, using=DEFAULT_DB_ALIAS):
+    with connections[using].cursor() as cursor:
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s))", [table])
+        return cursor.fetchone()[0]
+
+
+def list_partitions(table, using=DEFAULT_DB_ALIAS):
+    """
+    (name, month) of each monthly partition attached to ``table``, oldest
+    first.
+    """
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = to_regclass(%s)
+            """,
+            [table],
+        )
+        names = [name for name, in cursor.fetchall()]
+
+    partitions = []
+    prefix = f'{table}_p'
+    for name in names:
+        if not name.startswith(prefix):
+            continue
+        try:
+            month = datetime.strptime(name[len(prefix):], '%Y_%m').replace(tzinfo=dt_timezone.utc)
+        except ValueError:
+            continue
+        partitions.append((name, month))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def _create_partitions(cursor, quote_name, table, first_month, last_month):
+    created = []
+    month = first_month
+    while month <= last_month:
+        name = partition_name(table, month)
+        cursor.execute("SELECT to_regclass(%s) IS NULL", [name])
+        if cursor.fetchone()[0]:
+            # Bounds are generated here, not user input
+            cursor.execute(
+                f"CREATE TABLE {quote_name(name)} PARTITION OF {quote_name(table)} "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+            )
+            created.append(name)
+        month = add_months(month, 1)
+    return created
+
+
+def ensure_partitions(months_ahead=None, using=DEFAULT_DB_ALIAS):
+    """
+    Create the partitions of the current month and the next
+    ``months_ahead`` (PARTITION_MONTHS_AHEAD) months of every partitioned
+    table. Returns the names of the partitions created.
+    """
+    if months_ahead is None:
+        months_ahead = settings.PARTITION_MONTHS_AHEAD
+    connection = connections[using]
+    this_month = month_start(timezone.now())
+    created = []
+    for table in PARTITIONED_TABLES:
+        if not is_partitioned(table, using):
+            continue
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            created += _create_partitions(
+                cursor, connection.ops.quote_name, table, this_month, add_months(this_month, months_ahead),
+            )
+    return created
+
+
+def _index_definitions(cursor, table):
+    # Indexes not backing a constraint; the primary key is rebuilt apart
+    cursor.execute(
+        """
+        SELECT pg_get_indexdef(indexrelid) FROM pg_index
+        WHERE indrelid = to_regclass(%s)
+        AND NOT EXISTS (SELECT 1 FROM pg_constraint WHERE pg_constraint.conindid = pg_index.indexrelid)
+        """,
+        [table],
+    )
+    # A partitioned table's indexes are defined ON ONLY the parent
+    return [definition.replace(' ON ONLY ', ' ON ', 1) for definition, in cursor.fetchall()]
+
+
+def _foreign_keys(cursor, table):
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = 'f'",
+        [table],
+    )
+    return cursor.fetchall()
+
+
+def _referencing_foreign_keys(cursor, table):
+    cursor.execute(
+        """
+        SELECT pg_class.relname, conname FROM pg_constraint
+        JOIN pg_class ON pg_class.oid = pg_constraint.conrelid
+        WHERE confrelid = to_regclass(%s) AND contype = 'f' AND conparentid = 0
+        """,
+        [table],
+    )
+    return cursor.fetchall()
+
+
+def _stored_columns(cursor, table):
+    cursor.execute(
+        """
+        SELECT column_name FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = %s AND is_generated = 'NEVER'
+        ORDER BY ordinal_position
+        """,
+        [table],
+    )
+    return [column for column, in cursor.fetchall()]
+
+
+def _rebuild(cursor, quote_name, table, renamed_to, partitioned):
+    """
+    Move the rows of ``table`` into a new table of the same name and
+    shape, partitioned by month or not, keeping its indexes, foreign keys
+    and id sequence.
+    """
+    indexes = _index_definitions(cursor, table)
+    foreign_keys = _foreign_keys(cursor, table)
+    columns = ', '.join(quote_name(column) for column in _stored_columns(cursor, table))
+    cursor.execute(
+        "SELECT pg_get_serial_sequence(%s, 'id'), attidentity <> '' FROM pg_attribute "
+        "WHERE attrelid = to_regclass(%s) AND attname = 'id'",
+        [table, table],
+    )
+    sequence, identity = cursor.fetchone()
+
+    cursor.execute(f'ALTER TABLE {quote_name(table)} RENAME TO {quote_name(renamed_to)}')
+    create = (
+        f'CREATE TABLE {quote_name(table)} '
+        f'(LIKE {quote_name(renamed_to)} INCLUDING DEFAULTS INCLUDING GENERATED INCLUDING CONSTRAINTS)'
+    )
+    if not identity:
+        # The new table's default keeps drawing from the sequence, which
+        # would otherwise be dropped with the old table
+        cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY NONE')
+    if partitioned:
+        cursor.execute(f'{create} PARTITION BY RANGE ({quote_name(PARTITION_KEY)})')
+        cursor.execute(f'SELECT min({quote_name(PARTITION_KEY)}) FROM {quote_name(renamed_to)}')
+        this_month = month_start(timezone.now())
+        oldest, = cursor.fetchone()
+        _create_partitions(
+            cursor, quote_name, table, min(month_start(oldest), this_month) if oldest else this_month,
+            add_months(this_month, settings.PARTITION_MONTHS_AHEAD),
+        )
+    else:
+        cursor.execute(create)
+    cursor.execute(f'INSERT INTO {quote_name(table)} ({columns}) SELECT {columns} FROM {quote_name(renamed_to)}')
+    cursor.execute(f'SELECT last_value, is_called FROM {sequence}')
+    position = cursor.fetchone()
+    cursor.execute(f'DROP TABLE {quote_name(renamed_to)}')
+
+    # Partitioned tables can't have identity columns before Postgres 17,
+    # so they draw ids from a plain sequence; plain tables get back the
+    # identity column Django creates. Either way ids carry on from where
+    # they were.
+    if partitioned and not identity:
+        cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY {quote_name(table)}.id')
+    elif partitioned:
+        sequence = quote_name(f'{table}_id_seq')
+        cursor.execute(f'CREATE SEQUENCE {sequence} OWNED BY {quote_name(table)}.id')
+        cursor.execute(f"ALTER TABLE {quote_name(table)} ALTER id SET DEFAULT nextval('{sequence}')")
+        cursor.execute('SELECT setval(%s, %s, %s)', [sequence, *position])
+    elif not identity:
+        cursor.execute(f'ALTER TABLE {quote_name(table)} ALTER id DROP DEFAULT')
+        cursor.execute(f'DROP SEQUENCE {sequence}')
+        cursor.execute(f'ALTER TABLE {quote_name(table)} ALTER id ADD GENERATED BY DEFAULT AS IDENTITY')
+        cursor.execute("SELECT setval(pg_get_serial_sequence(%s, 'id'), %s, %s)", [table, *position])
+
+    # Primary keys of partitioned tables must include the partition key
+    primary_key = f'id, {quote_name(PARTITION_KEY)}' if partitioned else 'id'
+    cursor.execute(f'ALTER TABLE {quote_name(table)} ADD CONSTRAINT {quote_name(table + "_pkey")} PRIMARY KEY ({primary_key})')
+    for definition in indexes:
+        cursor.execute(definition)
+    for name, definition in foreign_keys:
+        cursor.execute(f'ALTER TABLE {quote_name(table)} ADD CONSTRAINT {quote_name(name)} {definition}')
+
+
+def partition_table(table, using=DEFAULT_DB_ALIAS):
+    """
+    Rebuild ``table`` partitioned by month on created_on, with partitions
+    from its oldest row to PARTITION_MONTHS_AHEAD months from now.
+
+    Postgres can't partition a table in place, so the rows are copied and
+    the table is locked meanwhile: run it in a maintenance window. The id
+    alone is no longer unique to the database, so foreign keys referencing
+    the table are dropped; Django's on_delete still cascades.
+    """
+    connection = connections[using]
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        # Rows written earlier in the transaction mustn't leave deferred
+        # foreign key checks pending on the tables being replaced
+        cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        for referencing, name in _referencing_foreign_keys(cursor, table):
+            cursor.execute(
+                f'ALTER TABLE {connection.ops.quote_name(referencing)} DROP CONSTRAINT {connection.ops.quote_name(name)}'
+            )
+        _rebuild(cursor, connection.ops.quote_name, table, f'{table}_unpartitioned', partitioned=True)
+
+
+def partition_tables(using=DEFAULT_DB_ALIAS):
+    """
+    Partition whichever of PARTITIONED_TABLES aren't yet. Returns their
+    names.
+    """
+    tables = [table for table in PARTITIONED_TABLES if not is_partitioned(table, using)]
+    for table in tables:
+        partition_table(table, using)
+    return tables
+
+
+def unpartition_table(table, using=DEFAULT_DB_ALIAS):
+    """
+    Undo partition_table(): move the rows of every attached partition back
+    into a plain table. The foreign keys partition_table() dropped aren't
+    restored here; migration 0010 restores them when reversed.
+    """
+    connection = connections[using]
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        _rebuild(cursor, connection.ops.quote_name, table, f'{table}_partitioned', partitioned=False)
+
+
+# Rows outside posts_post that refer to a post, as (table, column). They
+# have no foreign key to a partitioned posts_post, so archiving a month of
+# posts has to deal with them itself.
+POST_DEPENDENTS = (('posts_post_categories', 'post_id'), ('posts_comment', 'post_id'))
+
+
+def _archive_dependents(cursor, quote_name, partition, drop):
+    """
+    Remove the rows referring to the posts of ``partition`` from the live
+    tables, first copying them into ``<partition>_<table>`` tables next to
+    it unless it's to be dropped. Returns the ids of its posts.
+
+    Adds to the archive tables left by an earlier run that failed before
+    detaching the partition.
+    """
+    cursor.execute(f'SELECT id FROM {quote_name(partition)}')
+    post_ids = [post_id for post_id, in cursor.fetchall()]
+    for table, column in POST_DEPENDENTS:
+        rows = f'{quote_name(table)} WHERE {quote_name(column)} IN (SELECT id FROM {quote_name(partition)})'
+        if not drop:
+            archive = quote_name(f'{partition}_{table.removeprefix("posts_")}')
+            cursor.execute(f'CREATE TABLE IF NOT EXISTS {archive} AS SELECT * FROM {quote_name(table)} WITH NO DATA')
+            cursor.execute(f'INSERT INTO {archive} SELECT * FROM {rows}')
+        cursor.execute(f'DELETE FROM {rows}')
+    return post_ids
+
+
+def _detach_pending(cursor, partition):
+    cursor.execute("SELECT inhdetachpending FROM pg_inherits WHERE inhrelid = to_regclass(%s)", [partition])
+    return cursor.fetchone()[0]
+
+
+def detach_partitions(table, before, drop=False, concurrently=False, using=DEFAULT_DB_ALIAS):
+    """
+    Detach the partitions of ``table`` holding only rows older than
+    ``before``, and drop them if ``drop``. Detached partitions stay in the
+    database as plain tables, ready to be dumped. CONCURRENTLY doesn't
+    block queries on the table but can't run inside a transaction.
+    Returns the names of the partitions detached.
+
+    Detaching posts also removes their comments still attached, such as
+    those written after ``before``, and their category links, kept in
+    plain tables beside the partition unless it's dropped, and queues the
+    posts so they're deleted from the search index. They're removed in the
+    same transaction as the detach. With CONCURRENTLY they're removed just
+    before it and again after it, and running again after a failure in
+    between finishes the detach.
+    """
+    from posts.indexing import enqueue_posts
+
+    connection = connections[using]
+    quote_name = connection.ops.quote_name
+    detached = []
+    with connection.cursor() as cursor:
+        for name, month in list_partitions(table, using):
+            if add_months(month, 1) > before:
+                continue
+            detach = f'ALTER TABLE {quote_name(table)} DETACH PARTITION {quote_name(name)}'
+            if _detach_pending(cursor, name):
+                # Left by an interrupted DETACH ... CONCURRENTLY
+                detach += ' FINALIZE'
+            elif concurrently:
+                detach += ' CONCURRENTLY'
+
+            if concurrently:
+                if table == 'posts_post':
+                    with transaction.atomic(using=using):
+                        _archive_dependents(cursor, quote_name, name, drop)
+                cursor.execute(detach)
+            with transaction.atomic(using=using):
+                # With CONCURRENTLY, this only moves the rows written
+                # since the first pass
+                post_ids = _archive_dependents(cursor, quote_name, name, drop) if table == 'posts_post' else []
+                if not concurrently:
+                    cursor.execute(detach)
+                if drop:
+                    cursor.execute(f'DROP TABLE {quote_name(name)}')
+                if post_ids:
+                    transaction.on_commit(lambda post_ids=post_ids: enqueue_posts(post_ids), using=using)
+            detached.append(name)
+    return detached
@@ -0,0 +1,109 @@
+"""
+Decides which requests django-silk records, so profiling can stay on in
+production. Silk calls should_profile() through SILKY_INTERCEPT_FUNC;
+unsampled requests skip Silk's recording and python profiler entirely.
+"""
+import hmac
+import random
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+
+# Requests carrying this header with PROFILING_TOKEN as its value are
+# always profiled.
+PROFILE_HEADER = 'X-Profile'
+# Database alias Silk's tables live in when PROFILING_DATABASE_URL is set
+PROFILING_DATABASE = 'profiling'
+
+
+def should_profile(request):
+    # Decided once per request, so sampling isn't repeated when both
+    # ProfilingMiddleware and Silk ask
+    if not hasattr(request, '_should_profile'):
+        request._should_profile = _should_profile(request)
+    return request._should_profile
+
+
+def _should_profile(request):
+    token = settings.PROFILING_TOKEN
+    if token and hmac.compare_digest(request.headers.get(PROFILE_HEADER, ''), token):
+        return True
+    if request.path.startswith(tuple(settings.PROFILING_PATHS)):
+        return True
+    if settings.PROFILING_USERS and _request_username(request) in settings.PROFILING_USERS:
+        return True
+    return random.random() < settings.PROFILING_SAMPLE_RATE
+
+
+def _request_username(request):
+    """
+    The requesting user's username, without a database query for JWT
+    clients: the user id is read from the token and resolved through the
+    username lookup cache.
+    """
+    from authentication.tokens import jwt_user_id
+    from posts.lookups import usernames
+
+    user_id = jwt_user_id(request)
+    if user_id is not None:
+        return usernames.get(user_id)
+
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user.username
+    return None
+
+
+class ProfilingMiddleware:
+    """
+    Silk's middleware, made safe for async chains. SilkyMiddleware is
+    sync-only, so in front of an async view it would move every request
+    into a thread; here only the requests should_profile() picks go
+    through Silk, the rest are awaited directly.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        from silk.middleware import SilkyMiddleware
+
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+            self.silk = sync_to_async(SilkyMiddleware(async_to_sync(get_response)))
+        else:
+            self.silk = SilkyMiddleware(get_response)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.silk(request)
+
+    async def __acall__(self, request):
+        # Resolving PROFILING_USERS may query the database
+        profile = await sync_to_async(should_profile)(request) if settings.PROFILING_USERS else should_profile(request)
+        if profile:
+            return await self.silk(request)
+        return await self.get_response(request)
+
+
+class ProfilingRouter:
+    """
+    Keeps Silk's tables in the ``profiling`` database when one is
+    configured, so recording profiles never writes to the primary.
+    """
+
+    def _profiling_database(self):
+        return PROFILING_DATABASE if PROFILING_DATABASE in settings.DATABASES else None
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == 'silk':
+            return self._profiling_database()
+        return None
+
+    db_for_write = db_for_read
+
+    def allow_migrate(self, db, app_label, **hints):
+        if self._profiling_database() is None:
+            return None
+        return (app_label == 'silk') == (db == PROFILING_DATABASE)
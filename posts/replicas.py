@@ -0,0 +1,268 @@
+"""
+Sends the reads of safe (GET/HEAD/OPTIONS) requests to the read replicas
+in DATABASE_REPLICAS, keeping writes and everything outside requests on
+the primary.
+
+Replicas lag behind the primary, so:
+
+- a user who just wrote is pinned to the primary for REPLICA_PIN_SECONDS
+  and reads their own writes. Users are recognised by the user id claim
+  of their JWT or by their session, without a database query;
+- a replica lagging more than REPLICA_MAX_LAG seconds, or unreachable, is
+  skipped until its next check, and reads fall back to the primary when
+  no replica is usable.
+
+Code that must see the latest rows regardless, such as the shared lookup
+caches, reads inside ``primary_reads()``.
+"""
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DatabaseError, connections
+from authentication.tokens import jwt_user_id
+from posts.metrics import DB_REPLICA_LAG
+import logging
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Read from the primary whatever the request: Silk reads back rows it has
+# just written, and a session must be readable right after login.
+PRIMARY_APPS = ('silk', 'sessions')
+
+# Whether the replica is receiving WAL, and the seconds it is behind the
+# primary. A replica that has replayed everything it received is current
+# even if the primary has been idle since its last transaction, but only
+# while its WAL receiver is streaming and has heard from the primary
+# within REPLICA_RECEIVER_TIMEOUT: a disconnected replica stops receiving
+# and replaying alike. Reading pg_stat_wal_receiver needs the
+# pg_read_all_stats role.
+LAG_SQL = """
+    SELECT
+        NOT pg_is_in_recovery() OR EXISTS (
+            SELECT 1 FROM pg_stat_wal_receiver
+            WHERE status = 'streaming' AND last_msg_receipt_time > now() - make_interval(secs => %s)
+        ),
+        CASE
+            WHEN NOT pg_is_in_recovery() THEN 0
+            WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+        END
+"""
+
+# The alias reads go to; None is the primary
+_read_database = ContextVar('read_database', default=None)
+# alias -> (time.monotonic() of the check, lag in seconds or None if down)
+_lag_checks = {}
+
+
+def read_database():
+    return _read_database.get()
+
+
+def replica_lag(alias):
+    """
+    The replication lag of ``alias`` in seconds, or None if it can't be
+    queried. Measured at most once per REPLICA_LAG_CHECK_INTERVAL per
+    process.
+    """
+    now = time.monotonic()
+    checked = _lag_checks.get(alias)
+    if checked is None or now - checked[0] >= settings.REPLICA_LAG_CHECK_INTERVAL:
+        checked = _lag_checks[alias] = (now, _measure_lag(alias))
+    return checked[1]
+
+
+def _measure_lag(alias):
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute(LAG_SQL, [settings.REPLICA_RECEIVER_TIMEOUT])
+            receiving, lag = cursor.fetchone()
+    except DatabaseError as e:
+        logger.error(f"Replica {alias} unavailable: {e}")
+        return None
+    if receiving:
+        lag = float(lag or 0)
+    else:
+        # Stale by an unknown amount, so behind any REPLICA_MAX_LAG
+        logger.warning(f"Replica {alias} isn't streaming from the primary")
+        lag = float('inf')
+    DB_REPLICA_LAG.labels(alias).set(lag)
+    return lag
+
+
+def pick_replica():
+    """
+    A random replica within REPLICA_MAX_LAG of the primary, or None when
+    there is none and reads should stay on the primary.
+    """
+    usable = []
+    for alias in settings.DATABASE_REPLICAS:
+        lag = replica_lag(alias)
+        if lag is not None and lag <= settings.REPLICA_MAX_LAG:
+            usable.append(alias)
+    return random.choice(usable) if usable else None
+
+
+@contextmanager
+def replica_reads():
+    """
+    Route the reads inside the block to a replica, if one is usable.
+    Yields the alias picked, or None for the primary.
+    """
+    token = _read_database.set(pick_replica())
+    try:
+        yield _read_database.get()
+    finally:
+        _read_database.reset(token)
+
+
+@contextmanager
+def primary_reads():
+    token = _read_database.set(None)
+    try:
+        yield
+    finally:
+        _read_database.reset(token)
+
+
+def response_cache_timeout(timeout):
+    """
+    How long to cache a response built from the current read database.
+    A replica may still have served rows from before the write that bumped
+    the response's generations, so its responses are kept no longer than
+    REPLICA_CACHE_TIMEOUT.
+    """
+    if _read_database.get() is None:
+        return timeout
+    return min(timeout, settings.REPLICA_CACHE_TIMEOUT)
+
+
+def _pin_key(user_id):
+    return f'replica:pin:{user_id}'
+
+
+def request_user_id(request):
+    """
+    The id of the requesting user from their JWT, or their session when
+    there is no token. Neither needs a database query for JWT clients.
+    """
+    user_id = jwt_user_id(request)
+    if user_id is None and hasattr(request, 'session'):
+        user_id = request.session.get(SESSION_KEY)
+    return user_id
+
+
+def pin_to_primary(user_id):
+    try:
+        cache.set(_pin_key(user_id), True, settings.REPLICA_PIN_SECONDS)
+    except Exception as e:
+        logger.error(f"Failed to pin user {user_id} to the primary: {e}")
+
+
+def is_pinned(user_id):
+    try:
+        return cache.get(_pin_key(user_id)) is not None
+    except Exception as e:
+        # Without the cache we can't tell who just wrote; keep users
+        # consistent rather than fast
+        logger.error(f"Replica pins unavailable: {e}")
+        return True
+
+
+def is_pinned_request(request):
+    """
+    Whether the request reads from the primary because its user just
+    wrote. Cached responses may predate the write, so such requests
+    shouldn't be answered from the response cache.
+    """
+    return getattr(request, '_replica_pinned', False)
+
+
+class ReplicaMiddleware:
+    """
+    Routes the reads of safe requests to a replica and pins users to the
+    primary after an unsafe request. Responses streamed after the view
+    returns read from the primary.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = _read_database.set(self.route(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            _read_database.reset(token)
+        self.pin_writer(request, response)
+        return response
+
+    async def __acall__(self, request):
+        # Checking pins and replica lag is sync I/O, done in one hop
+        token = _read_database.set(await sync_to_async(self.route)(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            _read_database.reset(token)
+        if request.method not in SAFE_METHODS:
+            await sync_to_async(self.pin_writer)(request, response)
+        return response
+
+    def route(self, request):
+        if request.method not in SAFE_METHODS:
+            return None
+        user_id = request_user_id(request)
+        if user_id is not None and is_pinned(user_id):
+            request._replica_pinned = True
+            return None
+        return pick_replica()
+
+    def pin_writer(self, request, response):
+        if request.method in SAFE_METHODS or response.status_code >= 400:
+            return
+        user_id = request_user_id(request)
+        if user_id is not None:
+            pin_to_primary(user_id)
+
+
+class ReplicaRouter:
+    """
+    Sends reads to the database ReplicaMiddleware, replica_reads() or
+    primary_reads() picked, and keeps the replicas out of migrations.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in PRIMARY_APPS:
+            return None
+        return _read_database.get()
+
+    def db_for_write(self, model, **hints):
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        databases = {'default', *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
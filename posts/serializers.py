@@ -1,31 +1,94 @@
+from django.urls import reverse
+from django.utils import timezone
+from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
-from posts.models import Category, Comment, Post
+from posts.caching import FragmentCacheListSerializer, FragmentCacheMixin
+from posts.lookups import usernames
+from posts.models import RECENT_COMMENTS_LIMIT, Category, Comment, Post
 from django_elasticsearch_dsl_drf.serializers import DocumentSerializer
 from posts.documents import PostDocument
 
 
 
 
-class HomePostSerializer(serializers.ModelSerializer):
-    author = serializers.ReadOnlyField(source='author.username')
+@extend_schema_field(str)
+class AuthorUsernameField(serializers.ReadOnlyField):
+    """
+    Renders ``author_id`` as the author's username via the lookup cache,
+    so the author row never has to be joined or fetched.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = 'author_id'
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        # Serializers that primed the page's usernames answer from those
+        return getattr(self.parent, 'get_username', usernames.get)(value)
+
+
+class AuthorFragmentMixin(FragmentCacheMixin):
+    """
+    The author's username is part of the fragment key. prime_fragments()
+    resolves a page's usernames with one lookup and keeps them in the
+    context, which nested serializers share, so the lookup cache's
+    generation is read once per page instead of once per row.
+    """
+
+    def get_author_ids(self, instances):
+        return [instance.author_id for instance in instances]
+
+    def prime_fragments(self, instances):
+        known = self.context.setdefault('usernames', {})
+        missing = [author_id for author_id in self.get_author_ids(instances) if author_id not in known]
+        if missing:
+            found = usernames.get_many(missing)
+            known.update((author_id, found.get(author_id)) for author_id in missing)
+
+    def get_username(self, author_id):
+        known = self.context.get('usernames', {})
+        return known[author_id] if author_id in known else usernames.get(author_id)
+
+    def get_fragment_parts(self, instance):
+        return super().get_fragment_parts(instance) + (self.get_username(instance.author_id),)
+
+
+class HomePostSerializer(AuthorFragmentMixin, serializers.ModelSerializer):
+    author = AuthorUsernameField()
     
     class Meta:
         model = Post
-        fields = ['title', 'body', 'author', 'created_on', 'updated_on']
+        fields = ['title', 'body', 'author', 'created_on', 'updated_on', 'comment_count', 'last_commented_on']
+        list_serializer_class = FragmentCacheListSerializer
 
+    def get_fragment_parts(self, instance):
+        return super().get_fragment_parts(instance) + (instance.comment_count, instance.last_commented_on)
 
-class CommentSerializer(serializers.ModelSerializer):
-    author = serializers.ReadOnlyField(source='author.username')
+
+class PostSearchSerializer(HomePostSerializer):
+    rank = serializers.FloatField(read_only=True)
+    # The rank belongs to the query, not the post
+    fragment_exclude = ('rank',)
+
+    class Meta(HomePostSerializer.Meta):
+        fields = ['id'] + HomePostSerializer.Meta.fields + ['rank']
+
+
+class CommentSerializer(AuthorFragmentMixin, serializers.ModelSerializer):
+    author = AuthorUsernameField()
 
     class Meta:
         model = Comment
         fields = ['id', 'content', 'author', 'created_on']
+        list_serializer_class = FragmentCacheListSerializer
 
 
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = ['id', 'name']
+        # Existing names are reused by PostSerializer, not rejected
+        extra_kwargs = {'name': {'validators': []}}
 
     def create(self, validated_data):
         # Create a new category instance
@@ -33,24 +96,55 @@ class CategorySerializer(serializers.ModelSerializer):
         return category
 
 
-class PostSerializer(serializers.ModelSerializer):
-    author = serializers.ReadOnlyField(source='author.username')
-    comments = CommentSerializer(many=True, read_only=True)
+class PostSerializer(AuthorFragmentMixin, serializers.ModelSerializer):
+    author = AuthorUsernameField()
+    comments = serializers.SerializerMethodField()
+    comments_count = serializers.IntegerField(source='comment_count', read_only=True)
+    comments_url = serializers.SerializerMethodField()
     categories = CategorySerializer(many=True, required=True)
+    # Comments come from their own fragments; the URL depends on the request
+    fragment_exclude = ('comments', 'comments_url')
     
     class Meta:
         model = Post
-        fields = ['id','title', 'body', 'author', 'categories', 'comments']
+        fields = ['id','title', 'body', 'author', 'categories', 'comments', 'comments_count', 'last_commented_on', 'comments_url']
+        list_serializer_class = FragmentCacheListSerializer
+
+    def get_author_ids(self, instances):
+        # The embedded comments' authors too, so they're primed with the page
+        return super().get_author_ids(instances) + [
+            comment.author_id for instance in instances for comment in getattr(instance, 'recent_comments', ())
+        ]
+
+    def get_fragment_parts(self, instance):
+        categories = tuple((category.id, category.name) for category in instance.categories.all())
+        return super().get_fragment_parts(instance) + (
+            categories, instance.comment_count, instance.last_commented_on,
+        )
+
+    @extend_schema_field(CommentSerializer(many=True))
+    def get_comments(self, obj):
+        """
+        Only the newest comments are embedded; the rest are behind comments_url.
+        Posts loaded with Post.objects.for_detail() already carry them.
+        """
+        comments = getattr(obj, 'recent_comments', None)
+        if comments is None:
+            comments = Comment.objects.of_post(obj).order_by('-created_on', '-id')[:RECENT_COMMENTS_LIMIT]
+        return CommentSerializer(comments, many=True, context=self.context).data
+
+    def get_comments_url(self, obj) -> str:
+        url = reverse('post-comment-create-list', kwargs={'post_id': obj.id}) + '?pagination=cursor'
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
         
     def create(self, validated_data):
         categories_data = validated_data.pop('categories', [])
         post = Post.objects.create(**validated_data)
 
-        for category_data in categories_data:
-            # Normalize category name to lowercase
-            category_data['name'] = category_data['name'].lower()  
-            category, created = Category.objects.get_or_create(**category_data)
-            post.categories.add(category)
+        # Resolve every category name in bulk and link them in one insert
+        categories = Category.objects.resolve(category['name'] for category in categories_data)
+        post.categories.add(*categories)
 
         return post
     
@@ -62,15 +156,55 @@ class PostSerializer(serializers.ModelSerializer):
         # Update categories
         if 'categories' in validated_data:
             categories_data = validated_data.pop('categories')
-            # Clear existing categories and add new ones
-            instance.categories.clear()
-            for category_data in categories_data:
-                category_data['name'] = category_data['name'].lower()
-                category, created = Category.objects.get_or_create(**category_data)
-                instance.categories.add(category)
+            # set() only removes and adds the links that actually changed
+            categories = Category.objects.resolve(category['name'] for category in categories_data)
+            instance.categories.set(categories)
 
         instance.save()
         return instance
+
+
+
+class PostImportSerializer(serializers.Serializer):
+    """
+    One NDJSON row of a bulk import. Categories are plain names.
+
+    ``created_on`` and ``updated_on`` are kept when given, so exported posts
+    keep their history; ``updated_on`` defaults to ``created_on``. The
+    exported ``id`` is ignored and imported posts get new ones.
+    """
+    title = serializers.CharField(max_length=200)
+    body = serializers.CharField()
+    author = serializers.CharField(max_length=30, required=False)
+    categories = serializers.ListField(child=serializers.CharField(max_length=30), default=list)
+    created_on = serializers.DateTimeField(required=False)
+    updated_on = serializers.DateTimeField(required=False)
+
+    def validate(self, data):
+        created_on, updated_on = data.get('created_on'), data.get('updated_on')
+        if updated_on and not created_on:
+            raise serializers.ValidationError({'updated_on': "Requires created_on."})
+        if created_on and created_on > timezone.now():
+            raise serializers.ValidationError({'created_on': "Can't be in the future."})
+        if created_on:
+            data['updated_on'] = updated_on or created_on
+            if data['updated_on'] < created_on:
+                raise serializers.ValidationError({'updated_on': "Can't be before created_on."})
+            if data['updated_on'] > timezone.now():
+                raise serializers.ValidationError({'updated_on': "Can't be in the future."})
+        return data
+
+
+class PostExportSerializer(serializers.ModelSerializer):
+    """
+    Mirrors PostImportSerializer so an export can be imported again.
+    """
+    author = serializers.ReadOnlyField(source='author.username')
+    categories = serializers.SlugRelatedField(slug_field='name', many=True, read_only=True)
+
+    class Meta:
+        model = Post
+        fields = ['id', 'title', 'body', 'author', 'categories', 'created_on', 'updated_on']
         
         
 class PostDocumentSerializer(DocumentSerializer):
@@ -82,3 +216,17 @@ class PostDocumentSerializer(DocumentSerializer):
             'categories'
         )
 
+
+class PostDocumentFallbackSerializer(serializers.ModelSerializer):
+    """
+    A post in the shape PostDocumentSerializer gives its document, for
+    search results served by Postgres.
+    """
+    categories = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Post
+        fields = ('title', 'categories')
+
+    def get_categories(self, post):
+        return [{'id': category.id, 'category': category.name} for category in post.categories.all()]
@@ -1,7 +1,11 @@
-from django.db.models.signals import post_save, post_delete
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_delete
 from django.dispatch import receiver
-from django_elasticsearch_dsl.registries import registry
-from posts.models import Post
+from authentication.models import User
+from posts.caching import CATEGORIES, POSTS, USERS, author_generation, invalidate
+from posts.indexing import enqueue_category_posts, enqueue_posts
+from posts.lookups import category_ids, category_ids_by_name, usernames
+from posts.models import Category, Post
 import logging
 
 # Set up a logger
@@ -10,21 +14,92 @@ logger = logging.getLogger(__name__)
 @receiver(post_save, sender=Post)
 def update_document(sender, instance, **kwargs):
     """
-    Update the Elasticsearch document for the updated Post instance.
+    Queue the updated Post instance for indexing once the transaction commits.
+    The write never waits on Elasticsearch; see posts.tasks.flush_search_index.
     """
-    try:
-        registry.update(instance)
-    except Exception as e:
-        # Log the error with relevant details
-        logger.error(f"Failed to update Elasticsearch document for Post ID {instance.id}: {e}")
+    invalidate(POSTS, author_generation(usernames.get(instance.author_id)))
+    transaction.on_commit(lambda: enqueue_posts([instance.id]))
 
 @receiver(post_delete, sender=Post)
 def delete_document(sender, instance, **kwargs):
     """
-    Delete the Elasticsearch document for the deleted Post instance.
+    Queue the deleted Post instance; the flush removes ids missing from the DB.
     """
-    try:
-        registry.delete(instance)
-    except Exception as e:
-        # Log the error with relevant details
-        logger.error(f"Failed to delete Elasticsearch document for Article ID {instance.id}: {e}")
\ No newline at end of file
+    username = usernames.get(instance.author_id)
+    if username is None:
+        # The author is being deleted too; their feed is gone either way
+        invalidate(POSTS)
+    else:
+        invalidate(POSTS, author_generation(username))
+    post_id = instance.id
+    transaction.on_commit(lambda: enqueue_posts([post_id]))
+
+@receiver(m2m_changed, sender=Post.categories.through)
+def update_categories_document(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    PostDocument embeds categories, so adding or removing one reindexes the
+    posts on the changed side of the relation: the post itself, or the
+    posts given to category.posts.add()/remove()/clear().
+    """
+    if action == 'pre_clear' and reverse:
+        # The links are gone by post_clear, so remember them now
+        instance._cleared_post_ids = list(instance.posts.values_list('id', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        post_ids = [instance.id]
+    elif action == 'post_clear':
+        post_ids = getattr(instance, '_cleared_post_ids', [])
+    else:
+        post_ids = list(pk_set)
+    invalidate(POSTS)
+    transaction.on_commit(lambda: enqueue_posts(post_ids))
+
+@receiver(post_save, sender=Category)
+def update_category_documents(sender, instance, created, **kwargs):
+    """
+    A renamed category changes every document that embeds it.
+    """
+    if created:
+        return
+    category_id = instance.id
+    transaction.on_commit(lambda: enqueue_category_posts(category_id))
+
+@receiver(pre_delete, sender=Category)
+def delete_category_documents(sender, instance, **kwargs):
+    """
+    Deleting a category cascades to its links without an m2m_changed signal,
+    so the affected posts are collected before the rows disappear.
+    """
+    invalidate_category_lookups(sender)
+    post_ids = list(instance.posts.values_list('id', flat=True))
+    transaction.on_commit(lambda: enqueue_posts(post_ids))
+
+@receiver(post_save, sender=Category)
+def invalidate_category_lookups(sender, **kwargs):
+    """
+    A new or renamed category can change which categories any search term
+    or name matches, so every cached term and name is dropped.
+    """
+    invalidate(CATEGORIES)
+    category_ids.clear_local()
+    category_ids_by_name.clear_local()
+
+@receiver(post_save, sender=User)
+def invalidate_author_responses(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Cached feeds show usernames. Logins only save last_login, so saves that
+    can't have touched the username are ignored.
+    """
+    if update_fields is not None and 'username' not in update_fields:
+        return
+    if not created:
+        invalidate(USERS)
+    # After the bump, so the new name is cached under the new generation
+    usernames.set(instance.id, instance.username)
+
+@receiver(post_delete, sender=User)
+def forget_username(sender, instance, **kwargs):
+    usernames.delete(instance.id)
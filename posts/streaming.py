@@ -0,0 +1,81 @@
+import json
+from itertools import islice
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from rest_framework.parsers import BaseParser
+from rest_framework.utils.encoders import JSONEncoder
+
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+DEFAULT_CHUNK_SIZE = 500
+
+
+def wants_ndjson(request):
+    """
+    Streaming is opt-in with ``?stream=ndjson``.
+    """
+    return request.query_params.get('stream') == 'ndjson'
+
+
+def iter_ndjson(queryset, serializer_class, chunk_size=DEFAULT_CHUNK_SIZE, context=None):
+    """
+    Yield one JSON document per row, reading the queryset chunk by chunk.
+
+    ``iterator(chunk_size=...)`` keeps a server-side cursor open instead of
+    caching the whole result, and any ``prefetch_related`` lookups are run
+    once per chunk, so memory stays flat however many rows match.
+    """
+    rows = queryset.iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        for item in serializer_class(chunk, many=True, context=context).data:
+            yield json.dumps(item, cls=JSONEncoder) + '\n'
+
+
+async def aiter_ndjson(queryset, serializer_class, chunk_size=DEFAULT_CHUNK_SIZE, context=None):
+    """
+    iter_ndjson() for ASGI, yielding one chunk of lines at a time.
+
+    Django has to read a sync iterator to the end before serving it under
+    ASGI, while this one is read with ``aiterator()`` as the client takes
+    it. Serializers may still query the database, so they run in a thread.
+    """
+    def serialize(chunk):
+        items = serializer_class(chunk, many=True, context=context).data
+        return ''.join(json.dumps(item, cls=JSONEncoder) + '\n' for item in items)
+
+    chunk = []
+    async for row in queryset.aiterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield await sync_to_async(serialize)(chunk)
+            chunk = []
+    if chunk:
+        yield await sync_to_async(serialize)(chunk)
+
+
+def stream_ndjson(request, queryset, serializer_class, chunk_size=DEFAULT_CHUNK_SIZE, context=None):
+    """
+    Stream the queryset as NDJSON, through aiter_ndjson() when ``request``
+    came in over ASGI.
+    """
+    if isinstance(getattr(request, '_request', request), ASGIRequest):
+        rows = aiter_ndjson(queryset, serializer_class, chunk_size=chunk_size, context=context)
+    else:
+        rows = iter_ndjson(queryset, serializer_class, chunk_size=chunk_size, context=context)
+    return StreamingHttpResponse(rows, content_type=NDJSON_CONTENT_TYPE)
+
+
+class NDJSONParser(BaseParser):
+    """
+    Hands the view the request body as a lazy iterator of lines, so large
+    uploads are never decoded into one in-memory document.
+    """
+    media_type = NDJSON_CONTENT_TYPE
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if stream is None:
+            return iter(())
+        return iter(stream.readline, b'')
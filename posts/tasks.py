@@ -0,0 +1,90 @@
+from celery import shared_task
+from django.core.management import call_command
+from elasticsearch.exceptions import ConnectionError, TransportError
+from redis.exceptions import RedisError
+from posts.indexing import FLUSH_SCHEDULED_KEY, IndexingError, chunked, flush_pending, get_redis, schedule_flush
+from posts.caching import POSTS, invalidate
+from posts.models import Post
+from posts.partitioning import ensure_partitions
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Batches handled by one task run before handing over to a fresh task, so a
+# large backlog doesn't pin a worker.
+MAX_BATCHES_PER_RUN = 20
+
+# Posts checked per reconciliation query, keeping each UPDATE's locks short.
+RECONCILE_CHUNK_SIZE = 1000
+
+
+@shared_task(
+    name="flush_search_index",
+    autoretry_for=(ConnectionError, TransportError, RedisError, IndexingError),
+    retry_backoff=True,
+    retry_backoff_max=300,
+    retry_jitter=True,
+    max_retries=10,
+)
+def flush_search_index():
+    # Saves arriving from now on schedule the next flush themselves
+    get_redis().delete(FLUSH_SCHEDULED_KEY)
+
+    processed = 0
+    for _ in range(MAX_BATCHES_PER_RUN):
+        flushed = flush_pending()
+        if not flushed:
+            break
+        processed += flushed
+    else:
+        schedule_flush(countdown=0)
+
+    logger.info("Indexed %s queued posts", processed)
+    return processed
+
+
+@shared_task(name="reconcile_comment_counters")
+def reconcile_comment_counters():
+    """
+    Repair Post.comment_count and last_commented_on wherever they have
+    drifted from the comments, e.g. after comments were written outside
+    the API.
+    """
+    post_ids = Post.objects.order_by('id').values_list('id', flat=True)
+    fixed = 0
+    for chunk in chunked(post_ids.iterator(chunk_size=RECONCILE_CHUNK_SIZE), RECONCILE_CHUNK_SIZE):
+        fixed += Post.objects.filter(id__in=chunk).reconcile_comment_counters()
+
+    if fixed:
+        invalidate(POSTS)
+        logger.warning("Repaired comment counters on %s posts", fixed)
+    return fixed
+
+
+@shared_task(name="create_partitions")
+def create_partitions():
+    """
+    Keep PARTITION_MONTHS_AHEAD months of partitions ready for new posts
+    and comments. Does nothing unless the tables are partitioned.
+    """
+    created = ensure_partitions()
+    if created:
+        logger.info("Created partitions %s", ", ".join(created))
+    return created
+
+
+@shared_task(
+    name="build_search_index",
+    autoretry_for=(ConnectionError, TransportError),
+    retry_backoff=True,
+    retry_backoff_max=300,
+    retry_jitter=True,
+    max_retries=10,
+)
+def build_search_index():
+    """
+    Build the search index if it doesn't exist yet, off the release step
+    so a deploy never waits on Elasticsearch. Retried while the cluster is
+    still starting.
+    """
+    call_command('rebuild_search_index', if_missing=True)
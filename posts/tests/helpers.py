@@ -0,0 +1,61 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from posts.middleware import is_app_query
+
+
+def app_queries(captured_queries):
+    """
+    Drop the profiler's own bookkeeping (Silk's EXPLAINs, the savepoints it
+    wraps its writes in, and silk_* writes) so only the queries issued by the
+    endpoint are counted.
+    """
+    return [
+        query['sql'] for query in captured_queries if is_app_query(query['sql'])
+    ]
+
+
+class QueryCountAssertionsMixin:
+    """
+    Assertions for APITestCase classes that guard against N+1 regressions.
+    """
+
+    def assertConstantQueries(self, url, expected, page_sizes=(1, 5, 20), data=None):
+        """
+        Request ``url`` once per page size and assert every request issues
+        exactly ``expected`` queries, however many rows end up on the page.
+        """
+        for page_size in page_sizes:
+            params = dict(data or {}, page_size=page_size)
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            queries = app_queries(context.captured_queries)
+            self.assertEqual(
+                len(queries), expected,
+                f"{url} issued {len(queries)} queries with page_size={page_size}:\n" + "\n".join(queries),
+            )
+
+
+def seed_posts(author, posts, categories, comments, commenter=None):
+    """
+    Create ``posts`` posts by ``author``, each linked to ``categories``
+    categories and carrying ``comments`` comments, with bulk inserts.
+    Counters are reconciled so the rows look like they came through the API.
+    """
+    from posts.models import Category, Comment, Post
+
+    names = [f'{author.username}-category-{index}' for index in range(categories)]
+    linked = [Category.objects.create(name=name) for name in names]
+    created = Post.objects.bulk_create([
+        Post(title=f'{author.username} post {index}', body='Body', author=author) for index in range(posts)
+    ])
+    Through = Post.categories.through
+    Through.objects.bulk_create([
+        Through(post_id=post.id, category_id=category.id) for post in created for category in linked
+    ])
+    Comment.objects.bulk_create([
+        Comment(post=post, author=commenter or author, content=f'Comment {index}')
+        for post in created for index in range(comments)
+    ])
+    Post.objects.filter(id__in=[post.id for post in created]).reconcile_comment_counters()
+    return created
@@ -0,0 +1,155 @@
+from unittest import mock
+from asgiref.sync import sync_to_async
+from django.test import override_settings
+from django.urls import reverse
+from prometheus_client import REGISTRY
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+from authentication.models import User
+from posts.caching import CATEGORIES, POSTS, USERS, bump_generations
+from posts.models import Category, Post
+from posts.tests.helpers import seed_posts
+
+
+class AsyncReadViewsTest(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(
+            email='async@test.com',
+            first_name='Async',
+            last_name='Doe',
+            username='async',
+            password='password123',
+        )
+        self.posts = seed_posts(self.author, 5, 2, 4)
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.author)}'}
+
+    def test_feed_matches_the_sync_cursor_feed(self):
+        sync = self.client.get(reverse('post-list'), {'pagination': 'cursor', 'page_size': 2})
+        response = self.client.get(reverse('async-post-list'), {'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['results'], sync.json()['results'])
+
+        second = self.client.get(response.json()['next'])
+        self.assertEqual(
+            [post['title'] for post in second.json()['results']],
+            [post.title for post in sorted(self.posts, key=lambda post: post.id, reverse=True)[2:4]],
+        )
+
+    def test_feed_is_cached_with_etags(self):
+        url = reverse('async-post-list')
+        first = self.client.get(url)
+        self.assertIn('ETag', first)
+        cached = self.client.get(url, HTTP_IF_NONE_MATCH=f'W/{first["ETag"]}, "other"')
+        self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+        containing = self.client.get(url, HTTP_IF_NONE_MATCH=f'"stale-{first["ETag"][1:]}')
+        self.assertEqual(containing.status_code, status.HTTP_200_OK)
+
+    def test_unknown_author_is_not_found(self):
+        response = self.client.get(reverse('async-post-list'), {'author': 'nobody'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(response.json(), {'detail': 'No posts found for author nobody'})
+
+    def test_post_detail_matches_the_sync_view(self):
+        post = self.posts[0]
+        sync = self.client.get(reverse('post-comment-list-create', kwargs={'post_id': post.id}), **self.auth)
+        response = self.client.get(reverse('async-post-detail', kwargs={'post_id': post.id}), **self.auth)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), sync.json())
+
+    def test_reads_need_a_valid_token(self):
+        url = reverse('async-post-detail', kwargs={'post_id': self.posts[0].id})
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.get(url, HTTP_AUTHORIZATION='Bearer not-a-token')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response['WWW-Authenticate'], 'Bearer realm="api"')
+
+    def test_missing_post_is_not_found(self):
+        for name in ('async-post-detail', 'async-post-comment-list'):
+            response = self.client.get(reverse(name, kwargs={'post_id': 0}), **self.auth)
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND, name)
+
+    def test_comments_match_the_sync_cursor_list(self):
+        post = self.posts[0]
+        sync = self.client.get(
+            reverse('post-comment-create-list', kwargs={'post_id': post.id}), {'pagination': 'cursor'}, **self.auth,
+        )
+        response = self.client.get(reverse('async-post-comment-list', kwargs={'post_id': post.id}), **self.auth)
+        self.assertEqual(response.json()['results'], sync.json()['results'])
+
+    @override_settings(SEARCH_FALLBACK_ENABLED=True)
+    def test_search_queries_elasticsearch(self):
+        hits = {'hits': {'total': {'value': 3}, 'hits': [
+            {'_source': {'title': 'async post 0', 'categories': [{'id': 1, 'category': 'async-category-0'}]}},
+        ]}}
+        client = mock.Mock(search=mock.AsyncMock(return_value=hits))
+        with mock.patch('posts.async_views.asearch_backend_healthy', mock.AsyncMock(return_value=True)), \
+                mock.patch('posts.async_views.get_async_elasticsearch', return_value=client):
+            response = self.client.get(
+                reverse('async-post-search'), {'search': 'async', 'categories': [1, 2], 'page_size': 1},
+            )
+            self.client.get(reverse('async-post-search'), {'categories__in': '1__2'})
+
+        data = response.json()
+        self.assertEqual(data['count'], 3)
+        self.assertEqual(data['results'][0]['title'], 'async post 0')
+        self.assertIn('page=2', data['next'])
+        self.assertIsNone(data['previous'])
+        first, second = [call.kwargs['body'] for call in client.search.call_args_list]
+        # One terms filter: posts in any of the categories, like PostDocumentView
+        self.assertEqual(first['query']['bool']['filter'], [{'terms': {'categories.id': [1, 2]}}])
+        self.assertEqual(second['query']['bool']['filter'], first['query']['bool']['filter'])
+        self.assertEqual((first['from'], first['size']), (0, 1))
+
+    @override_settings(SEARCH_FALLBACK_ENABLED=True)
+    def test_fallback_category_filter_matches_the_sync_view(self):
+        first, second = Category.objects.create(name='first'), Category.objects.create(name='second')
+        for title, categories in [('in first', [first]), ('in second', [second]), ('in both', [first, second])]:
+            Post.objects.create(title=title, body='Body', author=self.author).categories.set(categories)
+
+        for params in ({'categories': [first.id, second.id]}, {'categories__in': f'{first.id}__{second.id}'}):
+            with self.subTest(params=params), \
+                    mock.patch('posts.views.search_backend_healthy', return_value=False), \
+                    mock.patch('posts.async_views.asearch_backend_healthy', mock.AsyncMock(return_value=False)):
+                sync = self.client.get('/post-search', params).json()
+                response = self.client.get(reverse('async-post-search'), params).json()
+            self.assertEqual([post['title'] for post in response['results']], ['in both', 'in second', 'in first'])
+            self.assertEqual(response['results'], sync)
+
+    @override_settings(SEARCH_FALLBACK_ENABLED=True)
+    def test_search_falls_back_to_postgres(self):
+        with mock.patch('posts.async_views.asearch_backend_healthy', mock.AsyncMock(return_value=False)):
+            response = self.client.get(reverse('async-post-search'), {'search': 'async'})
+        self.assertEqual(response['X-Search-Backend'], 'postgres')
+        data = response.json()
+        self.assertEqual(data['count'], 5)
+        category = self.posts[0].categories.order_by('id').first()
+        self.assertIn({'id': category.id, 'category': category.name}, data['results'][0]['categories'])
+        self.assertEqual(set(data['results'][0]), {'title', 'categories'})
+
+        # Like Elasticsearch: no search lists every post, filtered by category
+        other = Post.objects.create(title='Uncategorised', body='Body', author=self.author)
+        with mock.patch('posts.async_views.asearch_backend_healthy', mock.AsyncMock(return_value=False)):
+            everything = self.client.get(reverse('async-post-search'), {'page_size': 2}).json()
+            filtered = self.client.get(reverse('async-post-search'), {'categories': category.id}).json()
+        self.assertEqual(everything['count'], 6)
+        self.assertEqual(everything['results'][0]['title'], other.title)
+        self.assertIn('page=2', everything['next'])
+        self.assertEqual(filtered['count'], 5)
+
+
+class AsyncMiddlewareTest(APITestCase):
+    async def test_queries_of_async_views_are_recorded(self):
+        author = await User.objects.acreate(username='asyncmw', email='asyncmw@test.com')
+        await Post.objects.acreate(title='Async', body='Body', author=author)
+        # A cached response would issue no queries
+        await sync_to_async(bump_generations)(POSTS, CATEGORIES, USERS)
+        before = REGISTRY.get_sample_value('http_request_db_queries_count', {'view': 'async-post-list'}) or 0
+        queries = REGISTRY.get_sample_value('http_request_db_queries_sum', {'view': 'async-post-list'}) or 0
+
+        response = await self.async_client.get(reverse('async-post-list'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(REGISTRY.get_sample_value('http_request_db_queries_count', {'view': 'async-post-list'}), before + 1)
+        self.assertGreater(REGISTRY.get_sample_value('http_request_db_queries_sum', {'view': 'async-post-list'}), queries)
+
@@ -0,0 +1,272 @@
+import json
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from django.utils import timezone
+from posts import loadtest
+from authentication.models import User
+from posts.documents import PostDocument
+from posts.models import Category, Post
+
+
+class ImportExportPostsCommandTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='legacy@test.com',
+            first_name='Legacy',
+            last_name='Doe',
+            username='legacy',
+            password='password123',
+        )
+        self.other = User.objects.create_user(
+            email='other@test.com',
+            first_name='Other',
+            last_name='Doe',
+            username='other',
+            password='password123',
+        )
+
+    def write_ndjson(self, rows):
+        handle = tempfile.NamedTemporaryFile('w', suffix='.ndjson', delete=False)
+        with handle:
+            for row in rows:
+                handle.write((row if isinstance(row, str) else json.dumps(row)) + "\n")
+        return handle.name
+
+    def test_import_posts(self):
+        path = self.write_ndjson([
+            {'title': 'One', 'body': 'Body', 'author': 'other', 'categories': ['Go']},
+            {'title': 'Two', 'body': 'Body', 'categories': ['go', 'Rust']},
+            {'title': 'Three', 'body': 'Body', 'author': 'nobody'},
+        ])
+        out, err = StringIO(), StringIO()
+        call_command('import_posts', path, author='legacy', batch_size=2, stdout=out, stderr=err)
+
+        self.assertIn('Imported 3 posts, 0 rows failed.', out.getvalue())
+        self.assertEqual(Post.objects.get(title='One').author, self.other)
+        self.assertEqual(Post.objects.get(title='Two').author, self.user)
+        self.assertEqual(Post.objects.get(title='Three').author, self.user)
+        self.assertEqual(sorted(Category.objects.values_list('name', flat=True)), ['go', 'rust'])
+
+    def test_import_without_default_author_reports_unknown(self):
+        path = self.write_ndjson([{'title': 'One', 'body': 'Body', 'author': 'nobody'}])
+        out, err = StringIO(), StringIO()
+        call_command('import_posts', path, stdout=out, stderr=err)
+        self.assertIn('Imported 0 posts, 1 rows failed.', out.getvalue())
+        self.assertIn('line 1', err.getvalue())
+
+    def test_export_round_trips_through_import(self):
+        post = Post.objects.create(title='Exported', body='Body', author=self.user)
+        post.categories.add(Category.objects.create(name='elixir'))
+        created_on = post.created_on - timedelta(seconds=1)
+        Post.objects.filter(pk=post.pk).update(created_on=created_on)
+
+        out = StringIO()
+        call_command('export_posts', stdout=out)
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['author'], 'legacy')
+        self.assertEqual(rows[0]['categories'], ['elixir'])
+
+        path = self.write_ndjson(rows)
+        call_command('import_posts', path, stdout=StringIO(), stderr=StringIO())
+        imported = Post.objects.exclude(pk=post.pk).get(title='Exported', author=self.user)
+        self.assertEqual((imported.created_on, imported.updated_on), (created_on, post.updated_on))
+
+
+class RebuildSearchIndexCommandTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='rebuild@test.com',
+            first_name='Rebuild',
+            last_name='Doe',
+            username='rebuild',
+            password='password123',
+        )
+        self.posts = [Post.objects.create(title=f'Post {index}', body='Body', author=self.user) for index in range(5)]
+
+        self.client = mock.MagicMock()
+        self.client.indices.exists_alias.return_value = True
+        self.client.indices.get_alias.return_value = {'posts-old': {'aliases': {'posts': {}}}}
+        for patcher in (
+            mock.patch.object(PostDocument, '_get_connection', return_value=self.client),
+            mock.patch('elasticsearch_dsl.Index.create'),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.enqueue_posts = self.start_patch('posts.management.commands.rebuild_search_index.enqueue_posts')
+        self.bulk = self.start_patch('posts.management.commands.rebuild_search_index.bulk', return_value=(0, []))
+        # The new index holds what the build sent, see fake_parallel_bulk
+        self.scan = self.start_patch('posts.indexing.scan', return_value=[{'_id': str(post.id)} for post in self.posts])
+
+    def start_patch(self, target, **kwargs):
+        patcher = mock.patch(target, **kwargs)
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def rebuild(self, **options):
+        def fake_parallel_bulk(client, actions, **kwargs):
+            for action in actions:
+                yield True, {}
+
+        with mock.patch('posts.management.commands.rebuild_search_index.parallel_bulk', fake_parallel_bulk):
+            call_command('rebuild_search_index', stdout=StringIO(), **options)
+
+    def enqueued(self):
+        return {post_id for call in self.enqueue_posts.call_args_list for post_id in call.args[0]}
+
+    def test_builds_new_index_and_switches_alias(self):
+        sent = []
+
+        def fake_parallel_bulk(client, actions, **kwargs):
+            for action in actions:
+                sent.append(action)
+                yield True, {}
+
+        with mock.patch('posts.management.commands.rebuild_search_index.parallel_bulk', fake_parallel_bulk):
+            call_command('rebuild_search_index', chunk_size=2, workers=2, stdout=StringIO())
+
+        self.assertEqual([action['_id'] for action in sent], [post.id for post in self.posts])
+        new_index = sent[0]['_index']
+        self.assertTrue(new_index.startswith('posts-'))
+
+        self.client.indices.update_aliases.assert_called_once_with(body={'actions': [
+            {'add': {'index': new_index, 'alias': 'posts'}},
+            {'remove': {'index': 'posts-old', 'alias': 'posts'}},
+        ]})
+        self.client.indices.delete.assert_called_once_with(index='posts-old', ignore_unavailable=True)
+
+    def test_posts_deleted_during_the_build_are_removed_before_switching(self):
+        deleted = self.posts.pop()
+        deleted_id = deleted.id
+        deleted.delete()
+        # The build read the post, then it was deleted from the old index only
+        self.scan.return_value = [{'_id': str(post.id)} for post in self.posts] + [{'_id': str(deleted_id)}]
+        self.client.indices.update_aliases.side_effect = lambda **kwargs: self.assertTrue(self.bulk.called)
+
+        self.rebuild()
+
+        new_index = self.scan.call_args.kwargs['index']
+        self.assertTrue(new_index.startswith('posts-'))
+        self.assertEqual(list(self.bulk.call_args.args[1]), [
+            {'_op_type': 'delete', '_index': new_index, '_id': deleted_id},
+        ])
+        self.client.indices.update_aliases.assert_called_once()
+
+    def test_posts_missing_from_the_new_index_are_replayed(self):
+        self.scan.return_value = [{'_id': str(post.id)} for post in self.posts[1:]]
+        self.rebuild()
+        self.bulk.assert_not_called()
+        self.assertEqual(self.enqueued(), {self.posts[0].id})
+
+    def test_a_replica_build_replays_saves_from_before_it_started(self):
+        # Saved just before the build, possibly not yet on the replica
+        Post.objects.filter(id=self.posts[0].id).update(updated_on=timezone.now() - timedelta(seconds=2))
+        Post.objects.exclude(id=self.posts[0].id).update(updated_on=timezone.now() - timedelta(hours=1))
+
+        with mock.patch('posts.management.commands.rebuild_search_index.replica_reads') as replica_reads:
+            replica_reads.return_value.__enter__.return_value = None
+            self.rebuild()
+        self.assertEqual(self.enqueued(), set())
+
+        with mock.patch('posts.management.commands.rebuild_search_index.replica_reads') as replica_reads:
+            replica_reads.return_value.__enter__.return_value = 'default'
+            with self.settings(REPLICA_MAX_LAG=5):
+                self.rebuild()
+        self.assertEqual(self.enqueued(), {self.posts[0].id})
+
+    def test_if_missing_skips_existing_alias(self):
+        self.client.indices.exists.return_value = True
+        out = StringIO()
+        call_command('rebuild_search_index', if_missing=True, stdout=out)
+        self.assertIn('already exists', out.getvalue())
+        self.client.indices.update_aliases.assert_not_called()
+
+    def test_queue_hands_the_build_to_celery(self):
+        with mock.patch('posts.management.commands.rebuild_search_index.build_search_index') as task:
+            call_command('rebuild_search_index', if_missing=True, queue=True, stdout=StringIO())
+        task.delay.assert_called_once_with()
+        self.client.indices.exists.assert_not_called()
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_search_index', queue=True, stdout=StringIO())
+
+
+class LoadTestCommandsTest(TestCase):
+    def test_seed_loadtest(self):
+        out = StringIO()
+        call_command('seed_loadtest', users=3, posts=7, categories=2, comments_per_post=2, batch_size=3, stdout=out)
+
+        self.assertIn('Created 3 users, 7 posts', out.getvalue())
+        self.assertEqual(Post.objects.filter(author__username__startswith=loadtest.PREFIX).count(), 7)
+        self.assertFalse(Post.objects.with_comment_counter_drift().exists())
+        self.assertTrue(User.objects.get(username=f'{loadtest.PREFIX}0').check_password(loadtest.PASSWORD))
+
+        call_command('seed_loadtest', users=1, posts=1, clear=True, stdout=StringIO())
+        self.assertEqual(User.objects.filter(username__startswith=loadtest.PREFIX).count(), 1)
+
+    def test_explain_endpoints(self):
+        out = StringIO()
+        call_command('explain_endpoints', seed_posts=30, stdout=out)
+
+        report = out.getvalue()
+        self.assertIn('Seeded 30 posts', report)
+        self.assertIn('GET /api/v2/post/?pagination=cursor: 200', report)
+        # Which index a plan uses depends on the table sizes; some does
+        self.assertRegex(report, r'Index (Only )?Scan using \w+ on posts_')
+        self.assertIn('GET /api/v1/posts/bulk/: 200', report)
+        self.assertIn('No sequential scans of large tables.', report)
+
+        with self.assertRaisesMessage(CommandError, 'Sequential scans of large tables found.'):
+            call_command('explain_endpoints', seq_scan_rows=0, fail_on_seq_scan=True, stdout=StringIO())
+
+    def test_summarize_and_compare(self):
+        samples = [('v2 feed', 200, seconds / 1000, 2) for seconds in range(1, 101)]
+        samples.append(('v2 feed', 500, 0.2, None))
+        report = loadtest.summarize(samples, elapsed=10)['v2 feed']
+        self.assertEqual(report['requests'], 101)
+        self.assertEqual(report['errors'], 1)
+        self.assertEqual(report['p50_ms'], 51.0)
+        self.assertEqual(report['p99_ms'], 100.0)
+        self.assertEqual(report['queries_per_request'], 2)
+
+        baseline = {'endpoints': {'v2 feed': dict(report)}}
+        slower = {'endpoints': {'v2 feed': dict(report, p95_ms=report['p95_ms'] * 2)}}
+        self.assertEqual(loadtest.compare(baseline, baseline), [])
+        self.assertEqual(loadtest.compare(baseline, slower)[0][:2], ('v2 feed', 'p95_ms'))
+
+
+    def test_async_benchmark_pairs_matching_endpoints(self):
+        stats = {'requests': 10, 'errors': 0, 'rps': 5.0, 'p50_ms': 1, 'p95_ms': 2, 'p99_ms': 3, 'queries_per_request': 2}
+        results = {
+            'sync-reads': {'endpoints': {sync: stats for sync, _ in loadtest.ASYNC_PAIRS.values()}},
+            'async-reads': {'endpoints': {async_: dict(stats, rps=9.0) for _, async_ in loadtest.ASYNC_PAIRS.values()}},
+        }
+        with mock.patch.object(loadtest, 'run', side_effect=lambda url, profile, *args: results[profile]):
+            out = StringIO()
+            call_command('async_benchmark', concurrency=5, duration=1, stdout=out)
+        self.assertIn('concurrency 5', out.getvalue())
+        self.assertRegex(out.getvalue(), r'feed\s+5.0\s+9.0')
+
+    def test_startup_benchmark(self):
+        out = StringIO()
+        call_command(
+            'startup_benchmark',
+            command='python -m http.server 8799 --bind 127.0.0.1',
+            base_url='http://127.0.0.1:8799',
+            path='/',
+            concurrency=2,
+            duration=1,
+            stdout=out,
+        )
+        self.assertIn('answered in', out.getvalue())
+        self.assertIn('0 errors', out.getvalue())
+
+    def test_startup_benchmark_reports_a_server_that_exits(self):
+        with self.assertRaisesMessage(CommandError, 'exited with status 1'):
+            call_command('startup_benchmark', command='python -c "raise SystemExit(1)"',
+                         base_url='http://127.0.0.1:8798', stdout=StringIO())
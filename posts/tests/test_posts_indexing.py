@@ -0,0 +1,135 @@
+from io import StringIO
+from unittest import mock
+from django.core.management import call_command
+from django.test import TestCase
+from elasticsearch.exceptions import ConnectionError
+from redis.exceptions import RedisError
+from authentication.models import User
+from posts import indexing
+from posts.documents import PostDocument
+from posts.models import Category, Post
+
+
+class SearchIndexQueueTest(TestCase):
+    def setUp(self):
+        try:
+            indexing.get_redis().ping()
+        except RedisError:
+            self.skipTest("Redis is not available")
+
+        # Keep test entries away from the real queue
+        patcher = mock.patch.multiple(
+            indexing,
+            PENDING_KEY='test:search:posts:pending',
+            FLUSH_SCHEDULED_KEY='test:search:posts:flush-scheduled',
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(indexing.get_redis().delete, 'test:search:posts:pending', 'test:search:posts:flush-scheduled')
+
+        apply_async = mock.patch('posts.tasks.flush_search_index.apply_async')
+        self.apply_async = apply_async.start()
+        self.addCleanup(apply_async.stop)
+
+        self.user = User.objects.create_user(
+            email='index@test.com',
+            first_name='Index',
+            last_name='Doe',
+            username='index',
+            password='password123',
+        )
+        with self.captureOnCommitCallbacks(execute=False):
+            self.post = Post.objects.create(title='Indexed', body='Body', author=self.user)
+
+    def test_repeated_saves_are_coalesced(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.title = 'Indexed again'
+            self.post.save()
+
+        self.assertEqual(indexing.queue_stats()['depth'], 1)
+        self.apply_async.assert_called_once()
+
+    def test_flush_indexes_existing_and_deletes_missing(self):
+        indexing.enqueue_posts([self.post.id, 999999])
+        with mock.patch.object(PostDocument, 'bulk', return_value=(1, [])) as bulk:
+            self.assertEqual(indexing.flush_pending(), 2)
+
+        actions = {action['_id']: action for action in bulk.call_args.args[0]}
+        self.assertEqual(actions[self.post.id]['_op_type'], 'index')
+        self.assertEqual(actions[self.post.id]['_source']['title'], 'Indexed')
+        self.assertEqual(actions[999999]['_op_type'], 'delete')
+        self.assertEqual(indexing.queue_stats()['depth'], 0)
+
+    def test_failed_flush_requeues_batch(self):
+        indexing.enqueue_posts([self.post.id])
+        with mock.patch.object(PostDocument, 'bulk', side_effect=ConnectionError('N/A', 'down', None)):
+            with self.assertRaises(ConnectionError):
+                indexing.flush_pending()
+        self.assertEqual(indexing.queue_stats()['depth'], 1)
+
+    def test_rejected_documents_are_requeued(self):
+        other = Post.objects.create(title='Other', body='Body', author=self.user)
+        indexing.enqueue_posts([self.post.id, other.id])
+        rejected = {'index': {'_id': str(other.id), 'status': 429, 'error': {'type': 'es_rejected_execution_exception'}}}
+        with mock.patch.object(PostDocument, 'bulk', return_value=(1, [rejected])):
+            with self.assertRaises(indexing.IndexingError):
+                indexing.flush_pending()
+        self.assertEqual(self.queued_ids(), {other.id})
+
+    def queued_ids(self):
+        return {int(member) for member in indexing.get_redis().zrange(indexing.PENDING_KEY, 0, -1)}
+
+    def test_category_links_queue_the_post(self):
+        category = Category.objects.create(name='search')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.categories.add(category)
+        self.assertEqual(self.queued_ids(), {self.post.id})
+
+    def test_reverse_clear_queues_linked_posts(self):
+        category = Category.objects.create(name='search')
+        self.post.categories.add(category)
+        with self.captureOnCommitCallbacks(execute=True):
+            category.posts.clear()
+        self.assertEqual(self.queued_ids(), {self.post.id})
+
+    def test_category_rename_queues_only_its_posts(self):
+        category = Category.objects.create(name='search')
+        self.post.categories.add(category)
+        with self.captureOnCommitCallbacks(execute=False):
+            Post.objects.create(title='Unrelated', body='Body', author=self.user)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            category.name = 'searching'
+            category.save()
+        self.assertEqual(self.queued_ids(), {self.post.id})
+
+    def test_category_delete_queues_its_posts(self):
+        category = Category.objects.create(name='search')
+        self.post.categories.add(category)
+        with self.captureOnCommitCallbacks(execute=True):
+            category.delete()
+        self.assertEqual(self.queued_ids(), {self.post.id})
+
+
+class SearchIndexCheckCommandTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='check@test.com',
+            first_name='Check',
+            last_name='Doe',
+            username='check',
+            password='password123',
+        )
+        self.post = Post.objects.create(title='Unindexed', body='Body', author=self.user)
+
+    def test_reports_and_fixes_drift(self):
+        out = StringIO()
+        with mock.patch('posts.indexing.indexed_post_ids', return_value={424242}), \
+                mock.patch('posts.management.commands.search_index_check.sync_posts') as sync_posts:
+            call_command('search_index_check', fix=True, stdout=out)
+
+        self.assertIn('missing from index: 1', out.getvalue())
+        self.assertIn('stale in index: 1', out.getvalue())
+        sync_posts.assert_called_once_with(sorted([self.post.id, 424242]))
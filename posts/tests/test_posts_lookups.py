@@ -0,0 +1,133 @@
+from unittest import mock
+from django.core.cache.backends.redis import RedisCacheClient
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from authentication.models import User
+from posts.caching import CATEGORIES, USERS, get_generations
+from posts.lookups import LRUCache, LookupCache, _load_category_ids, _load_usernames, category_ids, usernames
+from posts.models import Category, Post
+from posts.serializers import HomePostSerializer, PostSerializer
+from posts.tests.helpers import app_queries, seed_posts
+
+
+class LRUCacheTest(TestCase):
+    def test_evicts_least_recently_used(self):
+        lru = LRUCache(maxsize=2, timeout=60)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertEqual(lru.get('a'), 1)
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(len(lru), 2)
+
+    def test_expired_entries_are_dropped(self):
+        lru = LRUCache(maxsize=2, timeout=60)
+        with mock.patch('posts.lookups.time.monotonic', return_value=0):
+            lru.set('a', 1)
+        with mock.patch('posts.lookups.time.monotonic', return_value=61):
+            self.assertIsNone(lru.get('a'))
+        self.assertEqual(len(lru), 0)
+
+
+class PageLookupTest(TestCase):
+    def setUp(self):
+        authors = [
+            User.objects.create_user(
+                email=f'page{index}@test.com', first_name='Page', last_name='Doe',
+                username=f'page{index}', password='password123',
+            )
+            for index in range(10)
+        ]
+        for author in authors:
+            seed_posts(author, 5, 0, 1, commenter=authors[0])
+
+    def serialize(self, serializer_class, queryset):
+        with mock.patch.object(RedisCacheClient, 'get_client', autospec=True, side_effect=RedisCacheClient.get_client) \
+                as get_client, mock.patch('posts.lookups.get_generations', side_effect=get_generations) as generations:
+            data = serializer_class(list(queryset), many=True).data
+        return data, get_client.call_count, generations.call_count
+
+    def test_a_warm_page_makes_a_fixed_number_of_cache_round_trips(self):
+        queryset = Post.objects.for_feed()[:50]
+        HomePostSerializer(list(queryset), many=True).data
+        data, round_trips, generations = self.serialize(HomePostSerializer, queryset)
+        self.assertEqual(len(data), 50)
+        # The USERS generation, then every fragment in one multi-get
+        self.assertEqual((round_trips, generations), (2, 1))
+
+    def test_embedded_comments_reuse_the_page_usernames(self):
+        queryset = Post.objects.for_detail()[:50]
+        PostSerializer(list(queryset), many=True).data
+        data, _, generations = self.serialize(PostSerializer, queryset)
+        self.assertEqual(data[0]['comments'][0]['author'], 'page0')
+        self.assertEqual(generations, 1)
+
+
+class LookupCacheTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='lookup@test.com',
+            first_name='Lookup',
+            last_name='Doe',
+            username='lookup',
+            password='password123',
+        )
+
+    def test_saved_users_are_written_through(self):
+        hits = usernames.hits
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(usernames.get(self.user.id), 'lookup')
+        self.assertEqual(app_queries(context.captured_queries), [])
+        self.assertEqual(usernames.hits, hits + 1)
+
+        self.user.username = 'renamed'
+        self.user.save()
+        self.assertEqual(usernames.get(self.user.id), 'renamed')
+
+    def test_misses_are_loaded_in_one_query(self):
+        other = User.objects.create_user(
+            email='other@test.com',
+            first_name='Other',
+            last_name='Doe',
+            username='other',
+            password='password123',
+        )
+        usernames.clear_local()
+        with mock.patch('posts.lookups.cache.get_many', return_value={}):
+            with CaptureQueriesContext(connection) as context:
+                found = usernames.get_many([self.user.id, other.id])
+        self.assertEqual(found, {self.user.id: 'lookup', other.id: 'other'})
+        self.assertEqual(len(app_queries(context.captured_queries)), 1)
+
+    def test_new_category_is_found_by_cached_term(self):
+        django = Category.objects.create(name='django')
+        self.assertEqual(category_ids.get('djan'), (django.id,))
+        rest = Category.objects.create(name='djangorest')
+        self.assertEqual(category_ids.get('djan'), (django.id, rest.id))
+
+    def test_resolved_categories_invalidate_terms(self):
+        self.assertEqual(category_ids.get('flask'), ())
+        created, = Category.objects.resolve(['Flask'])
+        self.assertEqual(category_ids.get('flask'), (created.id,))
+
+    def test_changes_reach_other_processes_at_once(self):
+        # Another worker: the same lookups, with its own local tier
+        other_usernames = LookupCache('usernames', _load_usernames, generation=USERS)
+        other_category_ids = LookupCache('category-ids', _load_category_ids, generation=CATEGORIES)
+        django = Category.objects.create(name='django')
+        self.assertEqual(other_usernames.get(self.user.id), 'lookup')
+        self.assertEqual(other_category_ids.get('djan'), (django.id,))
+
+        self.user.username = 'renamed'
+        self.user.save()
+        django.name = 'flask'
+        django.save()
+
+        self.assertEqual(other_usernames.get(self.user.id), 'renamed')
+        self.assertEqual(other_category_ids.get('djan'), ())
+
+    def test_shared_cache_outage_loads_from_the_database(self):
+        with mock.patch('posts.lookups.get_generations', side_effect=ConnectionError):
+            self.assertEqual(usernames.get(self.user.id), 'lookup')
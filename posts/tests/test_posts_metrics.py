@@ -0,0 +1,134 @@
+import os
+import tempfile
+from unittest import mock
+from django.urls import reverse
+from prometheus_client import REGISTRY
+from prometheus_client.multiprocess import MultiProcessCollector
+from rest_framework.test import APITestCase
+from authentication.models import User
+from posts.lookups import usernames
+from posts.metrics import (
+    QueueCollector, _forget_worker_process, _serve_worker_metrics, _task_finished, _task_started, get_registry,
+    record_pool_stats,
+)
+from posts.tests.helpers import seed_posts
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class MetricsTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='metrics@test.com',
+            first_name='Metrics',
+            last_name='Doe',
+            username='metrics',
+            password='password123',
+        )
+        seed_posts(self.user, 3, 1, 1)
+
+    def test_requests_are_recorded_by_url_name(self):
+        labels = {'view': 'post-list', 'method': 'GET', 'status': '200'}
+        before = sample('http_request_duration_seconds_count', **labels)
+        queries_before = sample('http_request_db_queries_sum', view='post-list')
+
+        with self.settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}):
+            self.client.get(reverse('post-list'))
+
+        self.assertEqual(sample('http_request_duration_seconds_count', **labels), before + 1)
+        self.assertGreater(sample('http_request_db_queries_sum', view='post-list'), queries_before)
+
+    def test_lookup_cache_tiers_are_counted(self):
+        usernames.clear_local()
+        before = {tier: sample('lookup_cache_lookups_total', cache='usernames', tier=tier) for tier in
+                  ('local', 'shared', 'database')}
+        usernames.get(self.user.id)
+        usernames.get(self.user.id)
+        after = {tier: sample('lookup_cache_lookups_total', cache='usernames', tier=tier) for tier in before}
+        # Saving the user wrote it through to the shared cache
+        self.assertEqual(after['shared'], before['shared'] + 1)
+        self.assertEqual(after['local'], before['local'] + 1)
+        self.assertEqual(after['database'], before['database'])
+        self.assertIn(b'lookup_cache_lookups_total{cache="usernames"', self.client.get('/metrics').content)
+
+    def test_serializer_time_is_recorded(self):
+        before = sample('serializer_seconds_count', serializer='HomePostSerializer')
+        with self.settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}):
+            self.client.get(reverse('post-list'))
+        self.assertEqual(sample('serializer_seconds_count', serializer='HomePostSerializer'), before + 1)
+
+    def test_unresolved_paths_share_a_label(self):
+        before = sample('http_request_duration_seconds_count', view='<unresolved>', method='GET', status='404')
+        self.client.get('/no-such-page/')
+        self.assertEqual(
+            sample('http_request_duration_seconds_count', view='<unresolved>', method='GET', status='404'),
+            before + 1,
+        )
+
+    def test_metrics_endpoint_exposes_queue_depths(self):
+        redis = mock.Mock(llen=mock.Mock(return_value=4))
+        stats = {'depth': 2, 'lag_seconds': 1.5}
+        with mock.patch('posts.indexing.get_redis', return_value=redis), \
+                mock.patch('posts.indexing.queue_stats', return_value=stats):
+            response = self.client.get('/metrics')
+
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('celery_queue_depth{queue="celery"} 4.0', body)
+        self.assertIn('search_index_queue_depth 2.0', body)
+        self.assertIn('# TYPE http_request_duration_seconds histogram', body)
+
+    def test_unreachable_redis_skips_the_queue_depths(self):
+        with mock.patch('posts.indexing.get_redis', side_effect=ConnectionError):
+            self.assertEqual(list(QueueCollector().collect()), [])
+
+    def test_task_runtime_is_recorded(self):
+        task = mock.Mock(request=mock.Mock(spec=[]))
+        task.name = 'welcome_email'
+        before = sample('celery_task_seconds_count', task='welcome_email', state='SUCCESS')
+        _task_started(task=task)
+        _task_finished(task=task, state='SUCCESS')
+        self.assertEqual(sample('celery_task_seconds_count', task='welcome_email', state='SUCCESS'), before + 1)
+
+    def test_celery_serves_the_pool_processes_metrics(self):
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch.dict(os.environ, {'PROMETHEUS_MULTIPROC_DIR': directory}), \
+                self.settings(CELERY_METRICS_PORT=9808), \
+                mock.patch('posts.metrics.start_http_server') as start_http_server:
+            for name in ('histogram_1.db', f'gauge_livesum_{os.getpid()}.db'):
+                open(os.path.join(directory, name), 'w').close()
+            _serve_worker_metrics()
+            # Files of a previous run are removed, the worker's own kept
+            self.assertEqual(os.listdir(directory), [f'gauge_livesum_{os.getpid()}.db'])
+            registry = start_http_server.call_args.kwargs['registry']
+            self.assertIsInstance(next(iter(registry._collector_to_names)), MultiProcessCollector)
+
+            with mock.patch('posts.metrics.multiprocess.mark_process_dead') as mark_process_dead:
+                _forget_worker_process(pid=1234, exitcode=0)
+            mark_process_dead.assert_called_once_with(1234)
+
+    def test_multiprocess_mode_aggregates_the_workers_files(self):
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch.dict(os.environ, {'PROMETHEUS_MULTIPROC_DIR': directory}):
+            registry = get_registry()
+        self.assertIsNot(registry, REGISTRY)
+        self.assertIsInstance(next(iter(registry._collector_to_names)), MultiProcessCollector)
+
+    def test_pool_stats_are_recorded(self):
+        self.client.get(reverse('post-list'))
+        self.assertGreaterEqual(sample('db_pool_connections', state='open'), 1)
+
+        pool = mock.Mock(pop_stats=mock.Mock(return_value={
+            'pool_size': 4, 'pool_available': 1, 'requests_waiting': 2,
+            'requests_num': 10, 'requests_wait_ms': 1500, 'requests_errors': 1,
+        }))
+        requests = sample('db_pool_requests_total')
+        timeouts = sample('db_pool_errors_total', kind='timeout')
+        with mock.patch('posts.metrics.connections', {'default': mock.Mock(pool=pool)}):
+            record_pool_stats()
+        self.assertEqual(sample('db_pool_connections', state='available'), 1)
+        self.assertEqual(sample('db_pool_waiting_requests'), 2)
+        self.assertEqual(sample('db_pool_requests_total'), requests + 10)
+        self.assertEqual(sample('db_pool_errors_total', kind='timeout'), timeouts + 1)
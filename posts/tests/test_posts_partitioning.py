@@ -0,0 +1,174 @@
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import TestCase
+from django.utils import timezone
+from authentication.models import User
+from posts.models import Category, Comment, Post
+from posts.pagination import KeysetCursorPagination
+from posts.partitioning import (
+    add_months, detach_partitions, ensure_partitions, is_partitioned, list_partitions, month_start,
+    partition_name, partition_tables, unpartition_table,
+)
+
+
+class PartitioningTest(TestCase):
+    """
+    Partitioning is DDL, which Postgres rolls back with the test's
+    transaction like any other change.
+    """
+
+    def setUp(self):
+        # With POSTS_PARTITIONING on, the migrations partitioned them already
+        for table in ('posts_comment', 'posts_post'):
+            if is_partitioned(table):
+                unpartition_table(table)
+
+        self.user = User.objects.create_user(
+            email='partitioned@test.com',
+            first_name='Partitioned',
+            last_name='Doe',
+            username='partitioned',
+            password='password123',
+        )
+        self.this_month = month_start(timezone.now())
+        self.old_post = Post.objects.create(title='Old', body='From months ago', author=self.user)
+        Post.objects.filter(pk=self.old_post.pk).update(created_on=add_months(self.this_month, -3))
+        self.old_post.refresh_from_db()
+        self.comment = Comment.objects.create(post=self.old_post, author=self.user, content='First')
+        Comment.objects.filter(pk=self.comment.pk).update(created_on=self.old_post.created_on + timedelta(days=1))
+
+        self.assertEqual(partition_tables(), ['posts_post', 'posts_comment'])
+
+    def test_rows_are_kept_and_ids_continue(self):
+        self.assertTrue(is_partitioned('posts_post'))
+        self.assertTrue(is_partitioned('posts_comment'))
+        self.assertEqual(list(Post.objects.values_list('title', flat=True)), ['Old'])
+        self.assertEqual(Comment.objects.get().content, 'First')
+
+        post = Post.objects.create(title='New', body='Searchable text', author=self.user)
+        self.assertGreater(post.pk, self.old_post.pk)
+        self.assertEqual(list(Post.objects.search('searchable').values_list('pk', flat=True)), [post.pk])
+
+    def test_partitions_span_the_oldest_row_to_months_ahead(self):
+        with self.settings(PARTITION_MONTHS_AHEAD=3):
+            months = [month for _, month in list_partitions('posts_post')]
+            self.assertEqual(months[0], add_months(self.this_month, -3))
+            self.assertEqual(months[-1], add_months(self.this_month, 3))
+
+            self.assertEqual(ensure_partitions(), [])
+            self.assertEqual(
+                ensure_partitions(months_ahead=4),
+                [partition_name('posts_post', add_months(self.this_month, 4)),
+                 partition_name('posts_comment', add_months(self.this_month, 4))],
+            )
+
+    def test_bounded_queries_are_pruned(self):
+        old_partition = partition_name('posts_comment', add_months(self.this_month, -3))
+        new_post = Post.objects.create(title='New', body='Body', author=self.user)
+        plan = Comment.objects.filter(post=new_post).order_by('-created_on').explain()
+        self.assertIn(old_partition, plan)
+        plan = Comment.objects.of_post(new_post).order_by('-created_on').explain()
+        self.assertNotIn(old_partition, plan)
+
+        # A feed page after a cursor skips the months ahead of it
+        future_partition = partition_name('posts_post', add_months(self.this_month, 1))
+        paginator = KeysetCursorPagination()
+        keyset = paginator._get_keyset_filter(
+            Post.objects.all(), f'{timezone.now().isoformat()}|{new_post.pk}', reverse=False,
+        )
+        plan = Post.objects.filter(keyset).order_by('-created_on', '-id')[:4].explain()
+        self.assertNotIn(future_partition, plan)
+
+    def test_detach_old_partitions(self):
+        category = Category.objects.create(name='Archived')
+        self.old_post.categories.add(category)
+        late_comment = Comment.objects.create(post=self.old_post, author=self.user, content='Late')
+
+        with patch('posts.indexing.enqueue_posts') as enqueue_posts, self.captureOnCommitCallbacks(execute=True):
+            detached = detach_partitions('posts_post', add_months(self.this_month, -2))
+        partition = partition_name('posts_post', add_months(self.this_month, -3))
+        self.assertEqual(detached, [partition])
+        self.assertFalse(Post.objects.filter(pk=self.old_post.pk).exists())
+        enqueue_posts.assert_called_once_with([self.old_post.pk])
+
+        # The post's dependents leave the live tables for tables beside it
+        self.assertFalse(Post.categories.through.objects.exists())
+        self.assertFalse(Comment.objects.filter(post_id=self.old_post.pk).exists())
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT category_id FROM {partition}_post_categories')
+            self.assertEqual(cursor.fetchall(), [(category.pk,)])
+            cursor.execute(f'SELECT id FROM {partition}_comment ORDER BY id')
+            self.assertEqual(cursor.fetchall(), [(self.comment.pk,), (late_comment.pk,)])
+
+    def fail_detach(self):
+        def execute(execute, sql, params, many, context):
+            if 'DETACH PARTITION' in sql:
+                raise DatabaseError("canceling statement due to lock timeout")
+            return execute(sql, params, many, context)
+        return connection.execute_wrapper(execute)
+
+    def archived_comments(self, partition):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT id FROM {partition}_comment ORDER BY id')
+            return [comment_id for comment_id, in cursor.fetchall()]
+
+    def test_failed_detach_keeps_the_dependents(self):
+        partition = partition_name('posts_post', add_months(self.this_month, -3))
+        with patch('posts.indexing.enqueue_posts') as enqueue_posts, self.captureOnCommitCallbacks(execute=True):
+            with self.fail_detach(), self.assertRaises(DatabaseError):
+                detach_partitions('posts_post', add_months(self.this_month, -2))
+        enqueue_posts.assert_not_called()
+        self.assertTrue(Post.objects.filter(pk=self.old_post.pk).exists())
+        self.assertEqual(list(Comment.objects.values_list('pk', flat=True)), [self.comment.pk])
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT to_regclass(%s)', [f'{partition}_comment'])
+            self.assertIsNone(cursor.fetchone()[0])
+
+        with patch('posts.indexing.enqueue_posts') as enqueue_posts, self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(detach_partitions('posts_post', add_months(self.this_month, -2)), [partition])
+        enqueue_posts.assert_called_once_with([self.old_post.pk])
+        self.assertEqual(self.archived_comments(partition), [self.comment.pk])
+
+    def test_rerun_finishes_a_failed_concurrent_detach(self):
+        partition = partition_name('posts_post', add_months(self.this_month, -3))
+        with patch('posts.indexing.enqueue_posts') as enqueue_posts, self.captureOnCommitCallbacks(execute=True):
+            with self.fail_detach(), self.assertRaises(DatabaseError):
+                detach_partitions('posts_post', add_months(self.this_month, -2), concurrently=True)
+        enqueue_posts.assert_not_called()
+        # Archived ahead of the detach, which didn't happen
+        self.assertTrue(Post.objects.filter(pk=self.old_post.pk).exists())
+        self.assertFalse(Comment.objects.exists())
+        self.assertEqual(self.archived_comments(partition), [self.comment.pk])
+
+        # Written before the rerun; tests can't detach CONCURRENTLY, being
+        # inside a transaction
+        late_comment = Comment.objects.create(post=self.old_post, author=self.user, content='Late')
+        with patch('posts.indexing.enqueue_posts') as enqueue_posts, self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(detach_partitions('posts_post', add_months(self.this_month, -2)), [partition])
+        enqueue_posts.assert_called_once_with([self.old_post.pk])
+        self.assertFalse(Post.objects.filter(pk=self.old_post.pk).exists())
+        self.assertFalse(Comment.objects.exists())
+        self.assertEqual(self.archived_comments(partition), [self.comment.pk, late_comment.pk])
+
+    def test_archive_command(self):
+        self.old_post.categories.add(Category.objects.create(name='Archived'))
+        Comment.objects.create(post=self.old_post, author=self.user, content='Late')
+        out = StringIO()
+        with patch('posts.indexing.enqueue_posts') as enqueue_posts, self.captureOnCommitCallbacks(execute=True):
+            call_command('archive_partitions', '--before', f'{self.this_month:%Y-%m}', '--drop', stdout=out)
+        self.assertIn(f"Dropped {partition_name('posts_comment', add_months(self.this_month, -3))}", out.getvalue())
+        self.assertFalse(Comment.objects.exists())
+        self.assertFalse(Post.categories.through.objects.exists())
+        enqueue_posts.assert_called_once_with([self.old_post.pk])
+
+    def test_unpartition(self):
+        for table in ('posts_comment', 'posts_post'):
+            unpartition_table(table)
+            self.assertFalse(is_partitioned(table))
+        post = Post.objects.create(title='New', body='Body', author=self.user)
+        self.assertGreater(post.pk, self.old_post.pk)
+        self.assertEqual(Comment.objects.get().post, self.old_post)
+        self.assertEqual(Post.objects.filter(created_on__lt=timezone.now() - timedelta(days=31)).count(), 1)
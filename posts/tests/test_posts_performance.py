@@ -0,0 +1,166 @@
+import gc
+import os
+import statistics
+import time
+from unittest import mock, skipUnless
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from authentication.models import User
+from posts.caching import POSTS, author_generation, bump_generations
+from posts.models import PostQuerySet
+from posts.serializers import AuthorUsernameField
+from posts.tests.helpers import app_queries, seed_posts
+
+# (posts, categories per post, comments per post); each scale grows one
+# dimension of the base so a query that depends on it shows up.
+SCALES = {
+    'base': (2, 1, 1),
+    'posts': (12, 1, 1),
+    'categories': (2, 5, 1),
+    'comments': (2, 1, 12),
+}
+
+# Median milliseconds per request at the largest scale, checked with
+# PERF_BUDGETS=1. Generous enough for a laptop running the test database.
+BUDGETS_MS = {
+    'v1 feed': 150,
+    'v1 mine': 150,
+    'v1 post detail': 150,
+    'v2 feed': 150,
+    'v2 feed cursor': 150,
+    'v2 author feed': 150,
+    'v2 mine': 150,
+    'v2 post detail': 150,
+    'v2 comments': 150,
+    'v2 comment detail': 100,
+    'v2 category search': 150,
+    'v2 exact category': 150,
+    'v2 text search': 150,
+}
+BENCHMARK_RUNS = 7
+
+
+def endpoints(author, posts):
+    """
+    endpoint name -> (path, query params, authenticate as the author)
+    """
+    post = posts[0]
+    comment = post.comments.order_by('id').first()
+    page = {'page_size': 20}
+    return {
+        'v1 feed': ('/api/v1/posts/', page, True),
+        'v1 mine': ('/api/v1/post/', page, True),
+        'v1 post detail': (reverse('post-comment-list-create', kwargs={'post_id': post.id}), {}, True),
+        'v2 feed': (reverse('post-list'), page, False),
+        'v2 feed cursor': (reverse('post-list'), dict(page, pagination='cursor'), False),
+        'v2 author feed': (reverse('post-list'), dict(page, author=author.username), False),
+        'v2 mine': ('/api/v2/post/', page, True),
+        'v2 post detail': (reverse('post-retrieve-update-destroy', kwargs={'post_id': post.id}), {}, True),
+        'v2 comments': (reverse('post-comment-create-list', kwargs={'post_id': post.id}), page, True),
+        'v2 comment detail': (reverse('post-comment-retrieve-update-delete', kwargs={
+            'post_id': post.id, 'comment_id': comment.id,
+        }), {}, True),
+        'v2 category search': (reverse('search-posts-by-category'), {'category': f'{author.username}-category'}, False),
+        'v2 exact category': (reverse('search-posts-by-category'), {'category_exact': f'{author.username}-category-0'}, False),
+        'v2 text search': (reverse('post-text-search'), dict(page, search=author.username), False),
+    }
+
+
+class EndpointScalingTest(APITestCase):
+    """
+    Every list and detail endpoint must issue the same number of queries
+    however many posts, categories and comments it renders.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.scales = {}
+        for name, (posts, categories, comments) in SCALES.items():
+            author = User.objects.create_user(
+                email=f'perf-{name}@test.com',
+                first_name='Perf',
+                last_name=name,
+                username=f'perf{name}',
+                password='password123',
+            )
+            cls.scales[name] = (author, seed_posts(author, posts, categories, comments))
+
+    def request(self, author, path, params, authenticate):
+        self.client.force_authenticate(user=author if authenticate else None)
+        # Bumping the post generations misses the response cache while the
+        # lookups, versioned by CATEGORIES and USERS, stay warm
+        bump_generations(POSTS, author_generation(author.username))
+        return self.client.get(path, params)
+
+    def count_queries(self, author, path, params, authenticate):
+        # The first request fills the lookup caches
+        self.request(author, path, params, authenticate)
+        # Cached fragments would hide queries made while serializing
+        with mock.patch('posts.caching.get_fragments', return_value={}), \
+                CaptureQueriesContext(connection) as context:
+            response = self.request(author, path, params, authenticate)
+        self.assertEqual(response.status_code, 200, f"{path}: {response.data}")
+        return app_queries(context.captured_queries)
+
+    def query_counts(self):
+        """
+        endpoint -> scale -> the queries it issued.
+        """
+        counts = {}
+        for scale, (author, posts) in self.scales.items():
+            for endpoint, request in endpoints(author, posts).items():
+                counts.setdefault(endpoint, {})[scale] = self.count_queries(author, *request)
+        return counts
+
+    def test_query_count_is_independent_of_dataset_size(self):
+        counts = self.query_counts()
+        for endpoint, by_scale in counts.items():
+            with self.subTest(endpoint=endpoint):
+                base = by_scale['base']
+                for scale, queries in by_scale.items():
+                    self.assertEqual(
+                        len(queries), len(base),
+                        f"{endpoint} issued {len(queries)} queries at scale {scale!r} "
+                        f"and {len(base)} at 'base':\n" + "\n".join(queries),
+                    )
+
+    def test_a_missing_prefetch_is_caught(self):
+        # Without the windowed prefetch each post loads its own comments
+        def for_detail(queryset, comments_limit=None):
+            return queryset.defer('search_vector').prefetch_related('categories')
+
+        with mock.patch.object(PostQuerySet, 'for_detail', for_detail):
+            counts = self.query_counts()
+        self.assertGreater(len(counts['v1 mine']['posts']), len(counts['v1 mine']['base']))
+
+    def test_a_query_per_row_in_a_cached_field_is_caught(self):
+        def to_representation(field, author_id):
+            return User.objects.only('username').get(pk=author_id).username
+
+        with mock.patch.object(AuthorUsernameField, 'to_representation', to_representation):
+            counts = self.query_counts()
+        self.assertGreater(len(counts['v2 author feed']['posts']), len(counts['v2 author feed']['base']))
+
+    @skipUnless(os.environ.get('PERF_BUDGETS'), "set PERF_BUDGETS=1 to check time budgets")
+    def test_endpoints_meet_time_budgets(self):
+        """
+        Deterministic benchmark mode: fixed data, a warm-up request, the
+        garbage collector paused and the median of BENCHMARK_RUNS requests.
+        """
+        author, posts = self.scales['posts']
+        for endpoint, request in endpoints(author, posts).items():
+            self.request(author, *request)
+            timings = []
+            gc.disable()
+            try:
+                for _ in range(BENCHMARK_RUNS):
+                    started = time.perf_counter()
+                    self.request(author, *request)
+                    timings.append((time.perf_counter() - started) * 1000)
+            finally:
+                gc.enable()
+            median = statistics.median(timings)
+            with self.subTest(endpoint=endpoint):
+                self.assertLessEqual(median, BUDGETS_MS[endpoint], f"{endpoint} took {median:.1f}ms")
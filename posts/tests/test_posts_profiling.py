@@ -0,0 +1,62 @@
+from unittest import mock
+from django.test import RequestFactory, TestCase, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from authentication.models import User
+from posts.models import Post
+from posts.profiling import PROFILING_DATABASE, ProfilingRouter, should_profile
+from silk.models import Request
+
+
+@override_settings(PROFILING_SAMPLE_RATE=0, PROFILING_PATHS=[], PROFILING_USERS=[], PROFILING_TOKEN='')
+class ShouldProfileTest(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.user = User.objects.create_user(
+            email='profiled@test.com',
+            first_name='Profiled',
+            last_name='Doe',
+            username='profiled',
+            password='password123',
+        )
+
+    def test_unsampled_requests_are_skipped(self):
+        self.assertFalse(should_profile(self.factory.get('/api/v2/posts/')))
+
+    @override_settings(PROFILING_SAMPLE_RATE=1)
+    def test_sample_rate(self):
+        self.assertTrue(should_profile(self.factory.get('/api/v2/posts/')))
+
+    @override_settings(PROFILING_TOKEN='secret')
+    def test_header_opt_in_needs_the_token(self):
+        self.assertTrue(should_profile(self.factory.get('/api/v2/posts/', HTTP_X_PROFILE='secret')))
+        self.assertFalse(should_profile(self.factory.get('/api/v2/posts/', HTTP_X_PROFILE='guess')))
+
+    @override_settings(PROFILING_PATHS=['/api/v2/search/'])
+    def test_path_trigger(self):
+        self.assertTrue(should_profile(self.factory.get('/api/v2/search/text/')))
+        self.assertFalse(should_profile(self.factory.get('/api/v2/posts/')))
+
+    @override_settings(PROFILING_USERS=['profiled'])
+    def test_user_trigger_reads_the_jwt(self):
+        token = AccessToken.for_user(self.user)
+        request = self.factory.get('/api/v2/post/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertTrue(should_profile(request))
+        request = self.factory.get('/api/v2/post/', HTTP_AUTHORIZATION='Bearer not-a-token')
+        self.assertFalse(should_profile(request))
+
+
+class ProfilingRouterTest(TestCase):
+    def test_without_profiling_database_everything_stays_on_default(self):
+        router = ProfilingRouter()
+        self.assertIsNone(router.db_for_write(Request))
+        self.assertIsNone(router.allow_migrate('default', 'silk'))
+
+    def test_silk_is_routed_to_the_profiling_database(self):
+        router = ProfilingRouter()
+        with mock.patch.object(ProfilingRouter, '_profiling_database', return_value=PROFILING_DATABASE):
+            self.assertEqual(router.db_for_write(Request), PROFILING_DATABASE)
+            self.assertIsNone(router.db_for_read(Post))
+            self.assertTrue(router.allow_migrate(PROFILING_DATABASE, 'silk'))
+            self.assertFalse(router.allow_migrate('default', 'silk'))
+            self.assertFalse(router.allow_migrate(PROFILING_DATABASE, 'posts'))
+            self.assertTrue(router.allow_migrate('default', 'posts'))
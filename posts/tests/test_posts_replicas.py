@@ -0,0 +1,118 @@
+from unittest import mock
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from authentication.models import User
+from posts import replicas
+from posts.models import Post
+from posts.replicas import (
+    ReplicaMiddleware, ReplicaRouter, is_pinned_request, pick_replica, primary_reads, read_database,
+    replica_lag, replica_reads, response_cache_timeout,
+)
+from silk.models import Request
+
+
+@override_settings(
+    DATABASE_REPLICAS=['replica_1', 'replica_2'], REPLICA_MAX_LAG=5, REPLICA_LAG_CHECK_INTERVAL=5,
+    REPLICA_PIN_SECONDS=10, REPLICA_CACHE_TIMEOUT=30,
+)
+class ReplicaRoutingTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.user = User.objects.create_user(
+            email='replica@test.com',
+            first_name='Replica',
+            last_name='Doe',
+            username='replica',
+            password='password123',
+        )
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.user)}'}
+        self.lags = {'replica_1': 0.1, 'replica_2': 0.2}
+        patcher = mock.patch('posts.replicas.replica_lag', side_effect=lambda alias: self.lags[alias])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def serve(self, request, status=200):
+        """
+        Run ``request`` through ReplicaMiddleware and return the database
+        the view read from.
+        """
+        seen = []
+
+        def view(request):
+            seen.append(read_database())
+            return HttpResponse(status=status)
+
+        ReplicaMiddleware(view)(request)
+        return seen[0]
+
+    def test_safe_requests_read_from_a_replica(self):
+        self.assertIn(self.serve(self.factory.get('/api/v2/posts/')), ['replica_1', 'replica_2'])
+        self.assertIsNone(read_database())
+
+    def test_writes_stay_on_the_primary(self):
+        self.assertIsNone(self.serve(self.factory.post('/api/v2/post/', **self.auth)))
+
+    def test_writer_reads_their_writes_from_the_primary(self):
+        self.serve(self.factory.post('/api/v2/post/', **self.auth), status=201)
+
+        request = self.factory.get('/api/v2/post/', **self.auth)
+        self.assertIsNone(self.serve(request))
+        self.assertTrue(is_pinned_request(request))
+        # Other users still read from a replica
+        self.assertIsNotNone(self.serve(self.factory.get('/api/v2/post/')))
+
+    def test_failed_writes_dont_pin(self):
+        self.serve(self.factory.post('/api/v2/post/', **self.auth), status=400)
+        self.assertIsNotNone(self.serve(self.factory.get('/api/v2/post/', **self.auth)))
+
+    def test_lagging_replicas_are_skipped(self):
+        self.lags['replica_1'] = 60
+        self.assertEqual(pick_replica(), 'replica_2')
+        self.lags['replica_2'] = None
+        self.assertIsNone(pick_replica())
+        self.assertIsNone(self.serve(self.factory.get('/api/v2/posts/')))
+
+    def test_context_managers(self):
+        with replica_reads() as database:
+            self.assertIn(database, ['replica_1', 'replica_2'])
+            self.assertEqual(read_database(), database)
+            self.assertEqual(response_cache_timeout(300), 30)
+            with primary_reads():
+                self.assertIsNone(read_database())
+                self.assertEqual(response_cache_timeout(300), 300)
+        self.assertIsNone(read_database())
+
+    def test_router(self):
+        router = ReplicaRouter()
+        with replica_reads() as database:
+            self.assertEqual(router.db_for_read(Post), database)
+            self.assertIsNone(router.db_for_read(Request))
+            self.assertIsNone(router.db_for_write(Post))
+        self.assertIsNone(router.db_for_read(Post))
+        self.assertFalse(router.allow_migrate('replica_1', 'posts'))
+        self.assertIsNone(router.allow_migrate('default', 'posts'))
+
+
+class ReplicaLagTest(TestCase):
+    def setUp(self):
+        replicas._lag_checks.clear()
+        self.addCleanup(replicas._lag_checks.clear)
+
+    def test_a_primary_has_no_lag(self):
+        self.assertEqual(replica_lag('default'), 0)
+
+    def test_a_replica_not_streaming_is_too_far_behind(self):
+        # What LAG_SQL returns on a replica whose WAL receiver is gone
+        with mock.patch('posts.replicas.LAG_SQL', 'SELECT %s < 0, 0'):
+            self.assertEqual(replica_lag('default'), float('inf'))
+        with self.settings(DATABASE_REPLICAS=['default']):
+            self.assertIsNone(replicas.pick_replica())
+
+    def test_lag_is_checked_once_per_interval(self):
+        with mock.patch('posts.replicas._measure_lag', return_value=1.5) as measure:
+            self.assertEqual(replica_lag('replica_1'), 1.5)
+            self.assertEqual(replica_lag('replica_1'), 1.5)
+        self.assertEqual(measure.call_count, 1)
@@ -1,8 +1,20 @@
+import json
+from functools import partial
+from unittest import mock
 from rest_framework.test import APITestCase
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.test import override_settings
 from django.urls import reverse
 from rest_framework import status
+from rest_framework_simplejwt.tokens import AccessToken
+from redis.exceptions import RedisError
 from authentication.models import User
-from posts.models import Post, Category, Comment
+from posts.models import RECENT_COMMENTS_LIMIT, Post, Category, Comment
+from posts.partitioning import is_partitioned
+from posts.streaming import stream_ndjson
+from posts.tests.helpers import QueryCountAssertionsMixin, app_queries
 
 class PostsAPIViewTest(APITestCase):
     def setUp(self):
@@ -244,4 +256,573 @@ class UserPostsAPIViewTest(APITestCase):
         self.url = reverse('post-retrieve-update-destroy', kwargs={'post_id': self.post.id})
         response = self.client.delete(self.url)
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
-        self.assertEqual(response.data['detail'], "You are not allowed to modify this post.")  
\ No newline at end of file
+        self.assertEqual(response.data['detail'], "You are not allowed to modify this post.")  
+
+class PostsCursorPaginationTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='cursor@test.com',
+            first_name='Cursor',
+            last_name='Doe',
+            username='cursor',
+            password='password123',
+        )
+        self.posts = [
+            Post.objects.create(title=f'Post {index}', body='Body', author=self.user)
+            for index in range(5)
+        ]
+
+    def test_cursor_pages_forward_and_backward(self):
+        url = reverse('post-list')
+        response = self.client.get(url, {'pagination': 'cursor', 'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('count', response.data)
+        self.assertIsNone(response.data['previous'])
+        titles = [post['title'] for post in response.data['results']]
+
+        next_url = response.data['next']
+        while next_url:
+            response = self.client.get(next_url)
+            titles += [post['title'] for post in response.data['results']]
+            next_url = response.data['next']
+        self.assertEqual(titles, ['Post 4', 'Post 3', 'Post 2', 'Post 1', 'Post 0'])
+
+        response = self.client.get(response.data['previous'])
+        self.assertEqual([post['title'] for post in response.data['results']], ['Post 2', 'Post 1'])
+
+    def test_cursor_pagination_skips_count_query(self):
+        url = reverse('post-list')
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(url, {'pagination': 'cursor'})
+        self.assertFalse(any('COUNT(' in sql for sql in app_queries(context.captured_queries)))
+
+    def test_invalid_cursor(self):
+        url = reverse('post-list')
+        response = self.client.get(url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_user_posts_cursor_pagination(self):
+        url = reverse('user-post-list-create')
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(url, {'pagination': 'cursor', 'page_size': 3})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertIsNotNone(response.data['next'])
+
+
+class PostsV1ListTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='stream@test.com',
+            first_name='Stream',
+            last_name='Doe',
+            username='stream',
+            password='password123',
+        )
+        for index in range(4):
+            Post.objects.create(title=f'Post {index}', body='Body', author=self.user)
+        self.client.force_authenticate(user=self.user)
+
+    def test_list_posts_is_paginated(self):
+        response = self.client.get('/api/v1/posts/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 4)
+        self.assertEqual(len(response.data['results']), 3)
+
+    def test_list_posts_streams_ndjson(self):
+        response = self.client.get('/api/v1/posts/', {'stream': 'ndjson'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['title'] for row in rows], ['Post 3', 'Post 2', 'Post 1', 'Post 0'])
+        self.assertEqual(rows[0]['author'], 'stream')
+
+    def test_my_posts_streams_ndjson(self):
+        url = reverse('post-user')
+        response = self.client.get(url, {'stream': 'ndjson'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 4)
+
+    async def test_asgi_streams_ndjson_a_chunk_at_a_time(self):
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+        with mock.patch('posts.views.stream_ndjson', partial(stream_ndjson, chunk_size=3)):
+            response = await self.async_client.get('/api/v1/posts/', {'stream': 'ndjson'}, headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.is_async)
+
+        chunks = aiter(response.streaming_content)
+        first = await anext(chunks)
+        self.assertEqual([json.loads(line)['title'] for line in first.splitlines()], ['Post 3', 'Post 2', 'Post 1'])
+        rest = [chunk async for chunk in chunks]
+        self.assertEqual([json.loads(line)['title'] for line in rest[0].splitlines()], ['Post 0'])
+        self.assertEqual(len(rest), 1)
+
+
+class PostsQueryCountTest(QueryCountAssertionsMixin, APITestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name='django')
+        for index in range(20):
+            author = User.objects.create_user(
+                email=f'author{index}@test.com',
+                first_name='Author',
+                last_name=str(index),
+                username=f'author{index}',
+                password='password123',
+            )
+            post = Post.objects.create(title=f'Post {index}', body='Body', author=author)
+            post.categories.add(self.category)
+            Comment.objects.create(post=post, author=author, content='Comment')
+        self.user = author
+        self.post = post
+
+    def test_feed_query_count(self):
+        # COUNT(*) and the page itself
+        self.assertConstantQueries(reverse('post-list'), 2)
+
+    def test_feed_cursor_query_count(self):
+        self.assertConstantQueries(reverse('post-list'), 1, data={'pagination': 'cursor'})
+
+    def test_search_by_category_query_count(self):
+        url = reverse('search-posts-by-category')
+        # Resolving the term to category ids is cached after the first request
+        self.client.get(url, {'category': 'djan', 'page_size': 2})
+        self.assertConstantQueries(url, 1, data={'category': 'djan'})
+
+    def test_search_by_category_has_no_duplicates(self):
+        self.post.categories.add(Category.objects.create(name='djangorest'))
+        response = self.client.get(reverse('search-posts-by-category'), {'category': 'django'})
+        titles = [post['title'] for post in response.data]
+        self.assertEqual(len(titles), len(set(titles)))
+
+    def test_search_by_exact_category(self):
+        self.post.categories.add(Category.objects.create(name='djangorest'))
+        url = reverse('search-posts-by-category')
+        response = self.client.get(url, {'category_exact': 'DjangoRest'})
+        self.assertEqual([post['title'] for post in response.data], [self.post.title])
+        response = self.client.get(url, {'category_exact': 'djan'})
+        self.assertEqual(response.data, [])
+
+    def test_author_filter_is_case_insensitive(self):
+        response = self.client.get(reverse('post-list'), {'author': 'AUTHOR3'})
+        self.assertEqual([post['title'] for post in response.data['results']], ['Post 3'])
+        # The author's existence check, COUNT(*) and the page
+        self.assertConstantQueries(reverse('post-list'), 3, data={'author': 'Author3'})
+
+    def test_v1_feed_query_count(self):
+        self.client.force_authenticate(user=self.user)
+        # session user lookup is skipped by force_authenticate
+        self.assertConstantQueries('/api/v1/posts/', 2)
+
+    def test_post_comments_query_count(self):
+        self.client.force_authenticate(user=self.user)
+        url = reverse('post-comment-list-create', kwargs={'post_id': self.post.id})
+        # post, categories, comments with authors
+        self.assertConstantQueries(url, 3)
+
+
+class PostDetailCommentsTest(QueryCountAssertionsMixin, APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='detail@test.com',
+            first_name='Detail',
+            last_name='Doe',
+            username='detail',
+            password='password123',
+        )
+        self.post = Post.objects.create(title='Popular', body='Body', author=self.user)
+        self.comments = [
+            Comment.objects.create(post=self.post, author=self.user, content=f'Comment {index}')
+            for index in range(RECENT_COMMENTS_LIMIT + 3)
+        ]
+        # Comments created through the ORM aren't counted on the post
+        Post.objects.reconcile_comment_counters()
+        self.client.force_authenticate(user=self.user)
+
+    def test_detail_embeds_newest_comments_only(self):
+        url = reverse('post-comment-list-create', kwargs={'post_id': self.post.id})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['comments_count'], RECENT_COMMENTS_LIMIT + 3)
+        self.assertEqual(len(response.data['comments']), RECENT_COMMENTS_LIMIT)
+        self.assertEqual(response.data['comments'][0]['content'], self.comments[-1].content)
+        self.assertTrue(response.data['comments_url'].endswith(
+            reverse('post-comment-create-list', kwargs={'post_id': self.post.id}) + '?pagination=cursor'
+        ))
+
+    def test_detail_query_count_does_not_grow_with_comments(self):
+        url = reverse('post-retrieve-update-destroy', kwargs={'post_id': self.post.id})
+        # post with count, categories, recent comments with authors
+        self.assertConstantQueries(url, 3)
+        for index in range(20):
+            Comment.objects.create(post=self.post, author=self.user, content=f'More {index}')
+        self.assertConstantQueries(url, 3)
+
+
+class PostCategoriesBulkTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='bulk@test.com',
+            first_name='Bulk',
+            last_name='Doe',
+            username='bulk',
+            password='password123',
+        )
+        self.existing = Category.objects.create(name='Python')
+        self.client.force_authenticate(user=self.user)
+
+    def test_create_reuses_existing_categories(self):
+        data = {
+            'title': 'Bulk',
+            'body': 'Body',
+            'categories': [{'name': 'PYTHON'}, {'name': 'Django'}, {'name': 'django'}],
+        }
+        response = self.client.post(reverse('user-post-list-create'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Category.objects.count(), 2)
+        post = Post.objects.get(id=response.data['id'])
+        self.assertEqual(sorted(post.categories.values_list('name', flat=True)), ['django', 'python'])
+        self.assertIn(self.existing, post.categories.all())
+
+    def test_update_only_touches_changed_links(self):
+        post = Post.objects.create(title='Bulk', body='Body', author=self.user)
+        post.categories.add(self.existing)
+        through = Post.categories.through
+        link = through.objects.get(post=post, category=self.existing)
+
+        url = reverse('post-retrieve-update-destroy', kwargs={'post_id': post.id})
+        data = {'title': 'Bulk', 'body': 'Body', 'categories': [{'name': 'python'}, {'name': 'rust'}]}
+        response = self.client.put(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(through.objects.filter(pk=link.pk).exists())
+        self.assertEqual(sorted(post.categories.values_list('name', flat=True)), ['python', 'rust'])
+
+
+class PostBulkImportTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='importer@test.com',
+            first_name='Import',
+            last_name='Doe',
+            username='importer',
+            password='password123',
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def test_bulk_import_reports_bad_rows(self):
+        body = "\n".join([
+            json.dumps({'title': 'First', 'body': 'Body', 'categories': ['Django', 'python']}),
+            '{not json',
+            json.dumps({'title': 'Missing body'}),
+            '',
+            json.dumps({'title': 'Second', 'body': 'Body', 'categories': ['django'], 'author': 'someone-else'}),
+        ])
+        with mock.patch('posts.bulk.enqueue_posts') as enqueue_posts:
+            response = self.client.post(
+                reverse('post-bulk-import'), body, content_type='application/x-ndjson'
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Indexing is queued, never done in the request
+        enqueue_posts.assert_called_once_with(list(Post.objects.order_by('id').values_list('id', flat=True)))
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(response.data['failed'], 2)
+        self.assertEqual([error['line'] for error in response.data['errors']], [2, 3])
+        self.assertIn('body', response.data['errors'][1]['errors'])
+
+        # The requesting user owns every imported post
+        self.assertEqual(self.user.user_posts.count(), 2)
+        self.assertEqual(sorted(Category.objects.values_list('name', flat=True)), ['django', 'python'])
+        self.assertEqual(Post.objects.get(title='First').categories.count(), 2)
+
+    def test_bulk_import_keeps_valid_timestamps(self):
+        body = "\n".join(json.dumps(row) for row in [
+            {'title': 'Dated', 'body': 'Body', 'created_on': '2024-01-02T03:04:05Z'},
+            {'title': 'Edited', 'body': 'Body', 'created_on': '2024-01-02T00:00:00Z', 'updated_on': '2024-03-01T00:00:00Z'},
+            {'title': 'Backwards', 'body': 'Body', 'created_on': '2024-01-02T00:00:00Z', 'updated_on': '2023-01-01T00:00:00Z'},
+            {'title': 'Future', 'body': 'Body', 'created_on': '2999-01-01T00:00:00Z'},
+            {'title': 'Undated', 'body': 'Body', 'updated_on': '2024-01-02T00:00:00Z'},
+        ])
+        with mock.patch('posts.bulk.enqueue_posts'):
+            response = self.client.post(reverse('post-bulk-import'), body, content_type='application/x-ndjson')
+        lines = [error['line'] for error in response.data['errors']]
+        if is_partitioned('posts_post'):
+            # No partition holds January 2024
+            self.assertEqual(lines, [1, 2, 3, 4, 5])
+            self.assertEqual(response.data['errors'][0]['errors'], {'created_on': ["No partition holds 2024-01."]})
+            return
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(lines, [3, 4, 5])
+
+        dated = Post.objects.get(title='Dated')
+        self.assertEqual(dated.created_on.isoformat(), '2024-01-02T03:04:05+00:00')
+        self.assertEqual(dated.updated_on, dated.created_on)
+        self.assertEqual(Post.objects.get(title='Edited').updated_on.isoformat(), '2024-03-01T00:00:00+00:00')
+
+    def test_bulk_export_streams_own_posts(self):
+        post = Post.objects.create(title='Mine', body='Body', author=self.user)
+        post.categories.add(Category.objects.create(name='go'))
+        other = User.objects.create_user(
+            email='exporter@test.com', first_name='Other', last_name='Doe', username='exporter', password='password123',
+        )
+        Post.objects.create(title='Theirs', body='Body', author=other)
+
+        response = self.client.get(reverse('post-bulk-import'))
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([(row['title'], row['author'], row['categories']) for row in rows], [('Mine', 'importer', ['go'])])
+
+
+class PostsResponseCacheTest(APITestCase):
+    def setUp(self):
+        try:
+            cache.get('ping')
+        except RedisError:
+            self.skipTest("Redis is not available")
+
+        self.author = User.objects.create_user(
+            email='cached@test.com',
+            first_name='Cached',
+            last_name='Doe',
+            username='cached',
+            password='password123',
+        )
+        self.other = User.objects.create_user(
+            email='uncached@test.com',
+            first_name='Other',
+            last_name='Doe',
+            username='uncached',
+            password='password123',
+        )
+        Post.objects.create(title='Cached post', body='Body', author=self.author)
+        Post.objects.create(title='Other post', body='Body', author=self.other)
+
+    def get_with_queries(self, url, data=None, **extra):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, data, **extra)
+        return response, app_queries(context.captured_queries)
+
+    def test_second_request_is_served_from_cache(self):
+        url = reverse('post-list')
+        self.client.get(url)
+        response, queries = self.get_with_queries(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(queries, [])
+        self.assertEqual(response.data['count'], 2)
+
+    def test_new_post_invalidates_feed(self):
+        url = reverse('post-list')
+        self.client.get(url)
+        Post.objects.create(title='Fresh post', body='Body', author=self.author)
+        response = self.client.get(url)
+        self.assertEqual(response.data['count'], 3)
+
+    def test_other_authors_feed_stays_cached(self):
+        url = reverse('post-list')
+        self.client.get(url, {'author': 'cached'})
+        Post.objects.create(title='Fresh post', body='Body', author=self.other)
+        response, queries = self.get_with_queries(url, {'author': 'cached'})
+        self.assertEqual(queries, [])
+
+        Post.objects.create(title='Fresh post', body='Body', author=self.author)
+        response = self.client.get(url, {'author': 'cached'})
+        self.assertEqual(response.data['count'], 2)
+
+    def test_matching_etag_returns_not_modified(self):
+        url = reverse('search-posts-by-category')
+        etag = self.client.get(url)['ETag']
+        response, queries = self.get_with_queries(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(queries, [])
+
+        Category.objects.create(name='renamed').posts.add(Post.objects.first())
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_if_none_match_is_parsed(self):
+        url = reverse('search-posts-by-category')
+        etag = self.client.get(url)['ETag']
+        for header, expected in [
+            (f'"other", W/{etag}', status.HTTP_304_NOT_MODIFIED),
+            ('*', status.HTTP_304_NOT_MODIFIED),
+            # Tags only containing ours, or mangled, don't match
+            (f'"x{etag[1:-1]}x"', status.HTTP_200_OK),
+            (etag[1:-1], status.HTTP_200_OK),
+            (f'{etag[1:-1]}, "other"', status.HTTP_200_OK),
+        ]:
+            with self.subTest(header=header):
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=header).status_code, expected)
+
+
+class PostFragmentCacheTest(APITestCase):
+    def setUp(self):
+        try:
+            cache.get('ping')
+        except RedisError:
+            self.skipTest("Redis is not available")
+
+        self.author = User.objects.create_user(
+            email='fragment@test.com',
+            first_name='Fragment',
+            last_name='Doe',
+            username='fragment',
+            password='password123',
+        )
+        self.category = Category.objects.create(name='fragments')
+        self.post = Post.objects.create(title='Fragment post', body='Body', author=self.author)
+        self.post.categories.add(self.category)
+        Comment.objects.create(post=self.post, author=self.author, content='First')
+
+    def test_cached_fragments_match_fresh_output(self):
+        url = reverse('post-retrieve-update-destroy', args=[self.post.id])
+        self.client.force_authenticate(user=self.author)
+        first = self.client.get(url)
+        second = self.client.get(url)
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(list(second.data), list(first.data))
+        self.assertEqual(second.data['comments'][0]['content'], 'First')
+
+    def test_edit_changes_fragment_key(self):
+        from posts.serializers import HomePostSerializer
+
+        serializer = HomePostSerializer()
+        key = serializer.get_fragment_key(self.post)
+        self.post.title = 'Edited'
+        self.post.save()
+        self.assertNotEqual(serializer.get_fragment_key(self.post), key)
+
+        response = self.client.get(reverse('post-list'))
+        self.assertEqual(response.data['results'][0]['title'], 'Edited')
+
+    def test_category_rename_changes_post_fragment(self):
+        from posts.serializers import PostSerializer
+
+        serializer = PostSerializer()
+        post = Post.objects.for_detail().get(id=self.post.id)
+        key = serializer.get_fragment_key(post)
+        self.category.name = 'renamed'
+        self.category.save()
+        post = Post.objects.for_detail().get(id=self.post.id)
+        self.assertNotEqual(serializer.get_fragment_key(post), key)
+
+
+class PostCommentCountersTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='counter@test.com',
+            first_name='Counter',
+            last_name='Doe',
+            username='counter',
+            password='password123',
+        )
+        self.post = Post.objects.create(title='Counted', body='Body', author=self.user)
+        self.client.force_authenticate(user=self.user)
+
+    def test_comment_views_keep_counters(self):
+        url = reverse('post-comment-create-list', kwargs={'post_id': self.post.id})
+        first = self.client.post(url, {'content': 'First'})
+        second = self.client.post(f'/api/v1/posts/{self.post.id}/comments/', {'content': 'Second'})
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 2)
+        latest = Comment.objects.get(id=second.data['id'])
+        self.assertEqual(self.post.last_commented_on, latest.created_on)
+
+        self.client.delete(reverse('post-comment-retrieve-update-delete', kwargs={
+            'post_id': self.post.id, 'comment_id': second.data['id'],
+        }))
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+        self.assertEqual(self.post.last_commented_on, Comment.objects.get(id=first.data['id']).created_on)
+
+        self.client.delete(f'/api/v1/posts/{self.post.id}/comments/{first.data["id"]}/')
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 0)
+        self.assertIsNone(self.post.last_commented_on)
+
+    def test_feed_exposes_counters(self):
+        self.client.post(reverse('post-comment-create-list', kwargs={'post_id': self.post.id}), {'content': 'Hi'})
+        response = self.client.get(reverse('post-list'))
+        self.assertEqual(response.data['results'][0]['comment_count'], 1)
+        self.assertIsNotNone(response.data['results'][0]['last_commented_on'])
+
+    def test_reconcile_repairs_drift(self):
+        # A post without comments has NULL on both sides and hasn't drifted
+        self.assertFalse(Post.objects.with_comment_counter_drift().exists())
+        Comment.objects.create(post=self.post, author=self.user, content='Unseen')
+        self.assertEqual(Post.objects.with_comment_counter_drift().count(), 1)
+        self.assertEqual(Post.objects.reconcile_comment_counters(), 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+        self.assertFalse(Post.objects.with_comment_counter_drift().exists())
+
+
+class PostTextSearchTest(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(
+            email='searcher@test.com',
+            first_name='Search',
+            last_name='Doe',
+            username='searcher',
+            password='password123',
+        )
+        self.in_title = Post.objects.create(title='Tuning Postgres', body='Indexes and plans', author=self.author)
+        self.in_body = Post.objects.create(title='Weekend notes', body='Mostly about postgres', author=self.author)
+        Post.objects.create(title='Unrelated', body='Nothing to see', author=self.author)
+
+    def test_title_matches_rank_first(self):
+        response = self.client.get(reverse('post-text-search'), {'search': 'postgres'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        ids = [post['id'] for post in response.data['results']]
+        self.assertEqual(ids, [self.in_title.id, self.in_body.id])
+
+    def test_results_are_keyset_paginated(self):
+        url = reverse('post-text-search')
+        first = self.client.get(url, {'search': 'postgres', 'page_size': 1})
+        self.assertEqual(first.data['results'][0]['id'], self.in_title.id)
+        second = self.client.get(first.data['next'])
+        self.assertEqual([post['id'] for post in second.data['results']], [self.in_body.id])
+        self.assertIsNone(second.data['next'])
+
+    def test_search_is_required(self):
+        response = self.client.get(reverse('post-text-search'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_document_view_falls_back_when_elasticsearch_is_unhealthy(self):
+        with mock.patch('posts.views.search_backend_healthy', return_value=False):
+            response = self.client.get('/post-search', {'search': 'postgres'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['X-Search-Backend'], 'postgres')
+        self.assertEqual([post['title'] for post in response.data], [self.in_title.title, self.in_body.title])
+
+    def test_document_view_fallback_matches_the_elasticsearch_response(self):
+        category = Category.objects.create(name='databases')
+        self.in_body.categories.add(category)
+        with mock.patch('posts.views.search_backend_healthy', return_value=False):
+            everything = self.client.get('/post-search')
+            filtered = self.client.get('/post-search', {'categories': category.id})
+            searched = self.client.get('/post-search', {'search': 'postgres', 'categories__in': f'{category.id}__0'})
+            invalid = self.client.get('/post-search', {'categories': 'databases'})
+
+        # Without a search every post is listed, newest first
+        self.assertEqual(everything.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(everything.data), 3)
+        expected = [{'title': self.in_body.title, 'categories': [{'id': category.id, 'category': 'databases'}]}]
+        self.assertEqual(filtered.data, expected)
+        self.assertEqual(searched.data, expected)
+        self.assertEqual(invalid.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(QUERY_COUNT_HEADER=True)
+class QueryCountMiddlewareTest(APITestCase):
+    def test_query_count_header(self):
+        user = User.objects.create_user(
+            email='counted@test.com',
+            first_name='Counted',
+            last_name='Doe',
+            username='counted',
+            password='password123',
+        )
+        self.client.force_authenticate(user=user)
+        response = self.client.get(reverse('user-post-list-create'))
+        # The user's posts with their categories and recent comments
+        self.assertEqual(response['X-Query-Count'], '1')
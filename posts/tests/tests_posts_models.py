@@ -1,6 +1,8 @@
+from django.db import connection
 from django.test import TestCase
 from authentication.models import User
-from posts.models import Post, Comment
+from posts.checks import DROP_TRIGRAM_INDEX_SQL, check_trigram_index, create_trigram_index
+from posts.models import Category, Post, Comment
 
 # Tests for the Post model
 class TestPostModel(TestCase):
@@ -102,3 +104,32 @@ class TestCommentModel(TestCase):
             content='Thanks for the feedback!',
         )
         self.assertEqual(Comment.objects.filter(post=self.post).count(), 2)
+
+
+# Tests for the Category model
+class TestCategoryModel(TestCase):
+    def test_name_is_lowercased(self):
+        """Test that category names are stored in lowercase"""
+        category = Category.objects.create(name='Django')
+        self.assertEqual(category.name, 'django')
+
+    def test_resolve_creates_only_missing(self):
+        """Test that resolve reuses existing categories and creates the rest"""
+        existing = Category.objects.create(name='python')
+        categories = Category.objects.resolve(['Python', 'Rust', 'rust'])
+        self.assertEqual(sorted(category.name for category in categories), ['python', 'rust'])
+        self.assertIn(existing, categories)
+        self.assertEqual(Category.objects.count(), 2)
+
+    def test_missing_trigram_index_is_reported(self):
+        """Test that the system check warns while the trigram index is missing"""
+        with connection.cursor() as cursor:
+            cursor.execute(DROP_TRIGRAM_INDEX_SQL)
+            self.assertEqual([warning.id for warning in check_trigram_index(None, databases=['default'])], ['posts.W001'])
+
+            # Migrating again creates it once pg_trgm is available
+            create_trigram_index()
+            cursor.execute("SELECT EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm')")
+            available = cursor.fetchone()[0]
+        expected = [] if available else ['posts.W001']
+        self.assertEqual([warning.id for warning in check_trigram_index(None, databases=['default'])], expected)
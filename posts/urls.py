@@ -1,11 +1,13 @@
 from django.urls import path
 
-from posts.views import PostCommentAPIView, PostCommentUpdateRetrieveDestroyView, PostCommentView, PostsListView, SearchPostsByCategoryView, UserPostCreateListView, UserPostRetrieveUpdateDestroyView, UserPosts, UserPostsMine
+from posts.async_views import AsyncPostCommentListView, AsyncPostDetailView, AsyncPostSearchView, AsyncPostsListView, AsyncPostTextSearchView
+from posts.views import PostBulkImportView, PostCommentAPIView, PostCommentUpdateRetrieveDestroyView, PostCommentView, PostsListView, PostTextSearchView, SearchPostsByCategoryView, UserPostCreateListView, UserPostRetrieveUpdateDestroyView, UserPosts, UserPostsMine
 
 urlpatterns = [
     # APIVIEW
     path('v1/posts/', UserPostCreateListView.as_view(), name='user-post-list-create'),
     path('v1/post/', UserPostsMine.as_view(), name='post-user'),
+    path('v1/posts/bulk/', PostBulkImportView.as_view(), name='post-bulk-import'),
     path('v1/posts/<int:id>/', UserPostCreateListView.as_view(), name='user-post-update-delete'),
     path('v1/posts/<int:post_id>/comments/', PostCommentAPIView.as_view(), name='post-comment-list-create'),
     path('v1/posts/<int:post_id>/comments/<int:comment_id>/', PostCommentAPIView.as_view(), name='post-comment-update-delete'),
@@ -17,4 +19,12 @@ urlpatterns = [
     path('v2/post/<int:post_id>/comment/', PostCommentView.as_view(), name='post-comment-create-list'),
     path('v2/post/<int:post_id>/comments/<int:comment_id>/', PostCommentUpdateRetrieveDestroyView.as_view(), name='post-comment-retrieve-update-delete'),
     path('v2/search/', SearchPostsByCategoryView.as_view(), name='search-posts-by-category'),
+    path('v2/search/text/', PostTextSearchView.as_view(), name='post-text-search'),
+
+    # ASYNC VIEWS
+    path('v3/posts/', AsyncPostsListView.as_view(), name='async-post-list'),
+    path('v3/post/<int:post_id>', AsyncPostDetailView.as_view(), name='async-post-detail'),
+    path('v3/post/<int:post_id>/comment/', AsyncPostCommentListView.as_view(), name='async-post-comment-list'),
+    path('v3/search/', AsyncPostSearchView.as_view(), name='async-post-search'),
+    path('v3/search/text/', AsyncPostTextSearchView.as_view(), name='async-post-text-search'),
 ]
\ No newline at end of file
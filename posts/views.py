@@ -1,15 +1,23 @@
+from django.conf import settings
 from rest_framework import generics
 from rest_framework.permissions import IsAuthenticated
 from posts.filters import PostFilter
 from posts.models import Category, Comment, Post
 from rest_framework import status
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from posts.pagination import SmallResultSetPagination
-from posts.serializers import CommentSerializer, HomePostSerializer, PostSerializer
+from posts.pagination import CursorPaginationMixin, SearchRankCursorPagination, SmallResultSetPagination
+from posts.serializers import (
+    CommentSerializer, HomePostSerializer, PostExportSerializer, PostSearchSerializer, PostSerializer,
+)
+from posts.streaming import NDJSONParser, stream_ndjson, wants_ndjson
+from posts.bulk import import_posts
+from posts.caching import CATEGORIES, POSTS, USERS, ResponseCacheMixin, author_generation, invalidate
+from posts.lookups import usernames
 from django.core.exceptions import PermissionDenied
-from rest_framework.exceptions import NotFound
+from rest_framework.exceptions import NotFound, ValidationError
 from django_filters.rest_framework import DjangoFilterBackend
 from silk.profiling.profiler import silk_profile
 from django_elasticsearch_dsl_drf.constants import SUGGESTER_COMPLETION
@@ -20,27 +28,83 @@ from django_elasticsearch_dsl_drf.filter_backends import (
 )
 from django_elasticsearch_dsl_drf.viewsets import DocumentViewSet
 from posts.documents import PostDocument
-from posts.serializers import PostDocumentSerializer
+from posts.indexing import search_backend_healthy
+from posts.metrics import SEARCH_SECONDS
+from posts.serializers import PostDocumentFallbackSerializer, PostDocumentSerializer
 
 # Create your views here.
 
+def _save_comment(serializer, post, author):
+    """
+    Create a comment and count it on its post in the same transaction.
+    """
+    with transaction.atomic():
+        comment = serializer.save(author=author, post=post)
+        Post.objects.filter(id=post.id).record_comment(comment.created_on)
+        _invalidate_post_feeds(post)
+    return comment
+
+
+def _delete_comment(comment):
+    with transaction.atomic():
+        comment.delete()
+        Post.objects.filter(id=comment.post_id).forget_comment()
+        _invalidate_post_feeds(comment.post)
+
+
+def _invalidate_post_feeds(post):
+    # Counter updates bypass Post.save(), so its signal doesn't fire
+    invalidate(POSTS, author_generation(usernames.get(post.author_id)))
+
+
+def feed_cache_generations(request):
+    author_username = request.query_params.get('author')
+    if author_username:
+        # Only this author's posts (or a rename) can change the result
+        return [author_generation(author_username), USERS]
+    return [POSTS, USERS]
+
+
+def document_category_ids(params):
+    """
+    The category ids of PostDocumentView's ``categories`` filter: repeated
+    ``categories`` or ``categories__in`` ids joined with ``__``. Posts in
+    any of them match.
+    """
+    try:
+        return [
+            int(category_id)
+            for category_id in params.getlist('categories') + params.get('categories__in', '').split('__')
+            if category_id
+        ]
+    except ValueError:
+        raise ValidationError({'categories': 'Category ids must be integers.'})
+
+
 # API VIEWS
 class UserPostCreateListView(APIView):
     permission_classes = [IsAuthenticated]
+    pagination_class = SmallResultSetPagination
 
     def get(self, request):
         """
         Retrieve all posts created by all authenticated user/users.
+        Results are paginated, or streamed as NDJSON with ?stream=ndjson.
         """
-        posts = Post.objects.all()
-        serializer = HomePostSerializer(posts, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        posts = Post.objects.for_feed()
+        if wants_ndjson(request):
+            return stream_ndjson(request, posts, HomePostSerializer, context={'request': request})
+
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(posts, request, view=self)
+        serializer = HomePostSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
     def post(self, request):
         """
         Create a new post for the authenticated user.
         """
-        serializer = PostSerializer(data=request.data)
+        serializer = PostSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
             serializer.save(author=request.user)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -51,7 +115,7 @@ class UserPostCreateListView(APIView):
         Update a specific post created by the authenticated user.
         """
         post = get_object_or_404(Post, id=id, author=request.user)
-        serializer = PostSerializer(post, data=request.data)
+        serializer = PostSerializer(post, data=request.data, context={'request': request})
 
         if serializer.is_valid():
             serializer.save()
@@ -67,6 +131,27 @@ class UserPostCreateListView(APIView):
         return Response({"message": "Post deleted successfully"}, status=status.HTTP_204_NO_CONTENT)
 
 
+class PostBulkImportView(APIView):
+    permission_classes = [IsAuthenticated]
+    parser_classes = [NDJSONParser]
+
+    def get(self, request):
+        """
+        Export the authenticated user's posts as NDJSON, in the format post()
+        imports.
+        """
+        posts = Post.objects.filter(author=request.user).select_related('author').prefetch_related('categories')
+        return stream_ndjson(request, posts.order_by('id'), PostExportSerializer)
+
+    def post(self, request):
+        """
+        Import posts for the authenticated user from an NDJSON body, one post
+        per line. Invalid rows are reported by line number and skipped.
+        """
+        report = import_posts(request.data, author=request.user)
+        return Response(report, status=status.HTTP_200_OK)
+
+
 class PostCommentAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -74,8 +159,8 @@ class PostCommentAPIView(APIView):
         """
         Retrieve a post by its ID with all comments.
         """
-        post = get_object_or_404(Post, id=post_id)
-        serializer = PostSerializer(post)
+        post = get_object_or_404(Post.objects.for_detail(), id=post_id)
+        serializer = PostSerializer(post, context={'request': request})
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     def post(self, request, post_id):
@@ -85,7 +170,7 @@ class PostCommentAPIView(APIView):
         post = get_object_or_404(Post, id=post_id)
         serializer = CommentSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save(author=request.user, post=post)  # Link the post and the author
+            _save_comment(serializer, post, request.user)  # Link the post and the author
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -94,7 +179,7 @@ class PostCommentAPIView(APIView):
         Update a user's comment on a specific post.
         """
         post = get_object_or_404(Post, id=post_id)
-        comment = get_object_or_404(Comment, id=comment_id, post=post)
+        comment = get_object_or_404(Comment.objects.of_post(post), id=comment_id)
 
         # Ensure the comment belongs to the authenticated user
         if comment.author != request.user:
@@ -112,54 +197,68 @@ class PostCommentAPIView(APIView):
         Delete a user's comment on a specific post.
         """
         post = get_object_or_404(Post, id=post_id)
-        comment = get_object_or_404(Comment, id=comment_id, post=post)
+        comment = get_object_or_404(Comment.objects.of_post(post), id=comment_id)
 
         # Ensure the comment belongs to the authenticated user
         if comment.author != request.user:
             return Response({"error": "You are not allowed to delete this comment."}, status=status.HTTP_403_FORBIDDEN)
 
         # Delete the comment
-        comment.delete()
+        _delete_comment(comment)
         return Response({"message": "Comment deleted successfully"}, status=status.HTTP_204_NO_CONTENT)
     
     
 class UserPostsMine(APIView):
     permission_classes = [IsAuthenticated]
+    pagination_class = SmallResultSetPagination
     
     def get(self, request):
+        """
+        Retrieve the authenticated user's posts, paginated or streamed as NDJSON.
+        """
         user = self.request.user
         
         # posts = user.user_posts.select_related('author').prefetch_related('categories')
-        posts = Post.objects.filter(author=user).select_related('author').prefetch_related('categories')
-        serializer = PostSerializer(posts, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        posts = Post.objects.for_owner(user)
+        if wants_ndjson(request):
+            return stream_ndjson(request, posts, PostSerializer, context={'request': request})
+
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(posts, request, view=self)
+        serializer = PostSerializer(page, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
 
 
  
 # GENERIC VIEWS
-class PostsListView(generics.ListAPIView):
+class PostsListView(ResponseCacheMixin, CursorPaginationMixin, generics.ListAPIView):
     serializer_class = HomePostSerializer
     pagination_class = SmallResultSetPagination
+    cache_query_params = ('author', 'page', 'page_size', 'pagination', 'cursor')
+
+    def get_cache_generations(self, request):
+        return feed_cache_generations(request)
 
     def get_queryset(self):
-        queryset = Post.objects.all()
+        queryset = Post.objects.for_feed()
         author_username = self.request.query_params.get('author')
         if author_username:
-            queryset = queryset.filter(author__username__iexact=author_username)
-            if not queryset:
+            queryset = queryset.by_author(author_username)
+            if not queryset.exists():
                 raise NotFound(f"No posts found for author {author_username}")
         return queryset 
 
 
-class UserPosts(generics.ListCreateAPIView):
+class UserPosts(CursorPaginationMixin, generics.ListCreateAPIView):
     serializer_class = PostSerializer
     permission_classes = [IsAuthenticated]
     
     @silk_profile(name="User's Post") 
     def get_queryset(self):
         user = self.request.user
-        # Using select_related for author and prefetch_related for categories
-        return user.user_posts.select_related('author').prefetch_related('categories')
+        # Categories and recent comments are prefetched; usernames come from
+        # the lookup cache, so no author rows are joined
+        return Post.objects.for_owner(user)
     
     def perform_create(self, serializer):
         return serializer.save(author=self.request.user)
@@ -174,26 +273,26 @@ class UserPostRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
         return Post.objects.filter(author=self.request.user)
     
     def get_object(self):
-        post = get_object_or_404(Post, id=self.kwargs['post_id'])
+        post = get_object_or_404(Post.objects.for_detail(), id=self.kwargs['post_id'])
         
-        if post.author != self.request.user:
+        if post.author_id != self.request.user.id:
             raise PermissionDenied("You are not allowed to modify this post.")
                 
         return post
      
 
-class PostCommentView(generics.ListCreateAPIView):
+class PostCommentView(CursorPaginationMixin, generics.ListCreateAPIView):
     queryset = Comment.objects.all()
     serializer_class = CommentSerializer
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        post = get_object_or_404(Post, pk=self.kwargs['post_id'])
-        return Comment.objects.filter(post=post)
+        post = get_object_or_404(Post.objects.only('created_on'), pk=self.kwargs['post_id'])
+        return Comment.objects.of_post(post)
     
     def perform_create(self, serializer):
         post = get_object_or_404(Post, pk=self.kwargs['post_id'])
-        serializer.save(author=self.request.user, post=post)
+        _save_comment(serializer, post, self.request.user)
         
         
 class PostCommentUpdateRetrieveDestroyView(generics.RetrieveUpdateDestroyAPIView):
@@ -204,20 +303,48 @@ class PostCommentUpdateRetrieveDestroyView(generics.RetrieveUpdateDestroyAPIView
     def get_object(self):
         post = get_object_or_404(Post, id=self.kwargs['post_id'])
         
-        comment = get_object_or_404(Comment, post=post, id=self.kwargs['comment_id'])
+        comment = get_object_or_404(Comment.objects.of_post(post), id=self.kwargs['comment_id'])
                 
-        if comment.author != self.request.user:
+        if comment.author_id != self.request.user.id:
             raise PermissionDenied("You are not allowed to modify this comment.")
         
         return comment
+
+    def perform_destroy(self, instance):
+        _delete_comment(instance)
     
 
-class SearchPostsByCategoryView(generics.ListAPIView):
-    queryset = Post.objects.all()
+class SearchPostsByCategoryView(ResponseCacheMixin, CursorPaginationMixin, generics.ListAPIView):
+    queryset = Post.objects.for_feed()
     serializer_class = HomePostSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_class = PostFilter
     permission_classes = []
+    cache_query_params = ('category', 'category_exact', 'page', 'page_size', 'pagination', 'cursor')
+
+    def get_cache_generations(self, request):
+        return [POSTS, CATEGORIES, USERS]
+
+
+class PostTextSearchView(ResponseCacheMixin, generics.ListAPIView):
+    """
+    Full-text search over post titles and bodies with ``?search=``, most
+    relevant first. Served by Postgres, so it keeps working while
+    Elasticsearch is down.
+    """
+    serializer_class = PostSearchSerializer
+    pagination_class = SearchRankCursorPagination
+    permission_classes = []
+    cache_query_params = ('search', 'page_size', 'cursor')
+
+    def get_cache_generations(self, request):
+        return [POSTS, USERS]
+
+    def get_queryset(self):
+        text = self.request.query_params.get('search', '').strip()
+        if not text:
+            raise ValidationError({'search': 'This query parameter is required.'})
+        return Post.objects.for_feed().search(text)
     
 
 class PostDocumentView(DocumentViewSet):
@@ -245,4 +372,28 @@ class PostDocumentView(DocumentViewSet):
                 SUGGESTER_COMPLETION,
             ],
         },
-    }
\ No newline at end of file
+    }
+
+    # Elasticsearch returns this many hits when the list isn't paginated
+    UNPAGINATED_SIZE = 10
+
+    def list(self, request, *args, **kwargs):
+        if settings.SEARCH_FALLBACK_ENABLED and not search_backend_healthy():
+            response = self.list_from_database(request)
+            response['X-Search-Backend'] = 'postgres'
+            return response
+        with SEARCH_SECONDS.labels('search').time():
+            return super().list(request, *args, **kwargs)
+
+    def list_from_database(self, request):
+        """
+        Answer list() from Postgres with the same filters and fields.
+        ``search`` is matched against titles and bodies; without it every
+        post is listed, newest first.
+        """
+        params = request.query_params
+        queryset = Post.objects.search_documents(params.get('search', '').strip(), document_category_ids(params))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(PostDocumentFallbackSerializer(page, many=True).data)
+        return Response(PostDocumentFallbackSerializer(queryset[:self.UNPAGINATED_SIZE], many=True).data)
@@ -0,0 +1,15 @@
+#!/bin/sh
+# One-off release tasks, run once per deploy before the new app starts
+# rather than on every boot of every container.
+set -e
+
+python manage.py migrate --noinput
+if [ -n "$PROFILING_DATABASE_URL" ]; then
+    python manage.py migrate --database profiling --noinput
+fi
+# Queues a build of the search index for the first release only; a Celery
+# worker runs it once Elasticsearch is up. Search falls back to Postgres
+# meanwhile, so a failure here doesn't fail the release. Use
+# `manage.py rebuild_search_index` for a zero-downtime rebuild later.
+python manage.py rebuild_search_index --if-missing --queue \
+    || echo "Failed to queue the search index build" >&2